@@ -1,16 +1,49 @@
+import hashlib
+import os
+import time
 from typing import Any, Dict, Optional
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from firebase_admin import auth as fb_auth
 
-from app.deps.firebase import get_firestore_client
+from app.deps.firebase import get_repository
+from app.services.cache import TTLCache
+from app.services.metrics import phase
+from app.services.repository import Repository
 
 
 security = HTTPBearer(auto_error=False)
 
+token_cache = TTLCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")), ttl=3600)
+user_cache = TTLCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")), ttl=float(os.getenv("USER_CACHE_TTL", "60")))
+
+
+def invalidate_user(uid: str) -> None:
+    user_cache.invalidate(uid)
+
+
+def faculty_id_of(user: Dict[str, Any]) -> str:
+    """The id a faculty member's slots, views, leave and notifications are filed under: the
+    profile's ``facultyId``, else their uid."""
+    return user.get("facultyId") or user["uid"]
+
+
+async def cached_claims(id_token: str) -> Dict[str, Any]:
+    key = hashlib.sha256(id_token.encode()).hexdigest()
+    claims = token_cache.get(key)
+    if claims is None:
+        # verification may fetch Google's public keys, so keep it off the event loop
+        with phase("auth.verify"):
+            claims = await run_in_threadpool(verify_firebase_token, id_token)
+        # never serve claims past the token's own expiry
+        token_cache.set(key, claims, ttl=float(claims.get("exp", 0)) - time.time())
+    return claims
+
 
 def verify_firebase_token(id_token: str) -> Dict[str, Any]:
+    from firebase_admin import auth as fb_auth
+
     try:
         claims = fb_auth.verify_id_token(id_token)
         if not claims.get("email_verified"):
@@ -26,19 +59,32 @@ def verify_firebase_token(id_token: str) -> Dict[str, Any]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token verification failed")
 
 
-def get_current_user_dict(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Dict[str, Any]:
+def preload_verifier() -> None:
+    """Import the Firebase auth SDK ahead of the first login. Google's signing certificates are
+    fetched, and HTTP-cached, by the first verification itself."""
+    import firebase_admin.auth  # noqa: F401
+
+
+async def get_current_user_dict(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    repo: Repository = Depends(get_repository),
+) -> Dict[str, Any]:
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization required")
-    claims = verify_firebase_token(credentials.credentials)
+    claims = await cached_claims(credentials.credentials)
+    return await user_for_claims(claims, repo)
+
+
+async def user_for_claims(claims: Dict[str, Any], repo: Repository) -> Dict[str, Any]:
     uid = claims.get("uid")
     if not uid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    return await user_cache.get_or_load_async(uid, lambda: _load_user(repo, uid, claims))
+
 
-    db = get_firestore_client()
-    user_doc = db.collection("users").document(uid).get()
-    if user_doc.exists:
-        user_data = user_doc.to_dict() or {}
-    else:
+async def _load_user(repo: Repository, uid: str, claims: Dict[str, Any]) -> Dict[str, Any]:
+    user_data = await repo.get("users", uid)
+    if user_data is None:
         user_data = {
             "uid": uid,
             "email": claims.get("email"),
@@ -46,12 +92,12 @@ def get_current_user_dict(credentials: Optional[HTTPAuthorizationCredentials] =
             "displayName": claims.get("name"),
             "photoURL": claims.get("picture"),
         }
-        db.collection("users").document(uid).set(user_data)
+        await repo.set("users", uid, user_data)
     return user_data
 
 
 def require_role(*allowed_roles: str):
-    def _dep(user: Dict[str, Any] = Depends(get_current_user_dict)) -> Dict[str, Any]:
+    async def _dep(user: Dict[str, Any] = Depends(get_current_user_dict)) -> Dict[str, Any]:
         role = (user or {}).get("role")
         if role not in allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
@@ -3,11 +3,14 @@ import json
 from functools import lru_cache
 from typing import Optional
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from app.services.repository import Repository
 
 
+# the Firebase and Firestore SDKs are imported here, at startup, not when the app module loads
 def init_firebase() -> None:
+    import firebase_admin
+    from firebase_admin import credentials
+
     if firebase_admin._apps:
         return
     cred: Optional[credentials.Base] = None
@@ -23,6 +26,23 @@ def init_firebase() -> None:
 
 
 @lru_cache(maxsize=1)
-def get_firestore_client():
-    return firestore.client()
+def get_async_firestore_client():
+    from firebase_admin import firestore_async
+
+    return firestore_async.client()
+
+
+_repository: Optional[Repository] = None
+
+
+def get_repository() -> Repository:
+    global _repository
+    if _repository is None:
+        _repository = Repository(get_async_firestore_client())
+    return _repository
+
 
+def set_repository(repository: Optional[Repository]) -> None:
+    # lets tests and benchmarks point the app at the emulator or a FakeFirestore
+    global _repository
+    _repository = repository
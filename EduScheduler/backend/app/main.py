@@ -1,10 +1,25 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 
-from app.deps.firebase import init_firebase
-from app.deps.auth import verify_firebase_token
-from app.services.notifications import connection_manager
+from app.deps.firebase import get_repository, init_firebase
+from app.deps.auth import cached_claims, preload_verifier, user_for_claims
+from app.services.bus import make_bus
+from app.services.encoding import JSONBytesResponse
+from app.services.instrument import MetricsMiddleware
+from app.services.jobs import job_manager
+from app.services import metrics
+from app.services.notifications import connection_manager, user_topics
+from app.services.outbox import outbox
+from app.services.scheduler.pool import shutdown_pool
+from app.services.scheduler.registry import get_generator
+from app.services.settings import load_settings
 from app.routers import auth as auth_router
 from app.routers import profiles as profiles_router
 from app.routers import timetable as timetable_router
@@ -14,9 +29,49 @@ from app.routers import feedback as feedback_router
 from app.routers import leave as leave_router
 
 
-init_firebase()
+logger = logging.getLogger(__name__)
+
+PREWARM = os.getenv("PREWARM", "1") != "0"
+
+
+async def prewarm(app: FastAPI) -> None:
+    """Pay the first-request costs while the worker is idle: the Firestore channel (and the
+    settings read through it), the token verifier and the default solver."""
+    steps = [
+        lambda: load_settings(get_repository()),
+        lambda: asyncio.to_thread(preload_verifier),
+        lambda: asyncio.to_thread(get_generator, "constraint"),
+    ]
+    for step in steps:
+        try:
+            await step()
+        except Exception as exc:
+            # only a head start; the same work happens on first use anyway
+            logger.warning("Pre-warm failed: %r", exc)
+    app.state.warm = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = app.state.warm = False
+    init_firebase()
+    await connection_manager.start(make_bus())
+    await outbox.start(get_repository())
+    await job_manager.start(get_repository())
+    # runs once startup returns and the server starts accepting connections
+    warming = asyncio.create_task(prewarm(app)) if PREWARM else None
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    if warming is not None:
+        warming.cancel()
+    await job_manager.stop()
+    await outbox.stop()
+    await connection_manager.stop()
+    await asyncio.to_thread(shutdown_pool)
 
-app = FastAPI(title="EduScheduler API", version="0.2.0")
+
+app = FastAPI(title="EduScheduler API", version="0.2.0", lifespan=lifespan, default_response_class=JSONBytesResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +80,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+metrics.registry.register(metrics.Gauge(
+    "eduscheduler_websocket_connections",
+    "Open notification WebSockets in this worker.",
+    lambda: {(): len(connection_manager.connections)},
+))
 
 app.include_router(auth_router.router, prefix="/auth", tags=["auth"])  # /auth/me
 app.include_router(profiles_router.router, prefix="/users", tags=["users"])  # /users/profile
@@ -40,25 +103,39 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["meta"])
+def readiness_check():
+    # /health says the process is up; /ready that startup finished and traffic can be routed here
+    ready = getattr(app.state, "ready", False)
+    return JSONResponse(
+        {"status": "ready" if ready else "starting", "warm": getattr(app.state, "warm", False)},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics", tags=["meta"], include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.websocket("/ws/notifications")
 async def websocket_notifications(websocket: WebSocket, token: Optional[str] = None):
     if not token:
         await websocket.close(code=4401)
         return
     try:
-        claims = verify_firebase_token(token)
-        user_id = claims.get("uid")
-        if not user_id:
-            raise ValueError("uid missing in token")
+        claims = await cached_claims(token)
+        user = await user_for_claims(claims, get_repository())
+        user_id = user["uid"]
     except Exception:
         await websocket.close(code=4401)
         return
 
-    await connection_manager.connect(user_id, websocket)
+    await connection_manager.connect(user_id, websocket, user_topics(user))
     try:
         while True:
             message = await websocket.receive_text()
-            await websocket.send_text(message)
+            await connection_manager.send_to_socket(websocket, message)
     except WebSocketDisconnect:
         connection_manager.disconnect(user_id, websocket)
     except Exception:
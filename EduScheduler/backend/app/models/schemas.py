@@ -38,6 +38,7 @@ class Timetable(BaseModel):
     slots: List[TimetableSlot] = []
     facultyIndex: List[str] = []
     batchIndex: List[str] = []
+    facultyDayIndex: List[str] = []
     metadata: Dict[str, Any] = {}
 
 
@@ -51,19 +52,50 @@ class ScheduleRequest(BaseModel):
     faculty: List[Dict[str, Any]] = []
     batches: List[Dict[str, Any]] = []
     use_gemini: bool = True
+    solver: str = Field(default="auto", pattern="^(auto|constraint|ilp|evolution)$")
+    options: int = Field(default=2, ge=1, le=10)
+    seed: Optional[int] = None
+    time_limit: Optional[float] = Field(default=None, gt=0)
+    budget: Optional[float] = Field(default=None, gt=0)
+    solver_options: Dict[str, Any] = {}
+    # kind ("faculty" | "room" | "batch") -> id -> day -> hex bitmap of 5-minute buckets already taken
+    occupied: Dict[str, Dict[str, Dict[str, str]]] = {}
+
+
+class PublishRequest(BaseModel):
+    timetables: List[Timetable] = []
+    # publish every option a finished generation job produced
+    jobId: Optional[str] = None
 
 
 class ScheduleResult(BaseModel):
     options: List[Timetable]
 
 
+class CampusRequest(BaseModel):
+    departments: List[ScheduleRequest] = Field(min_length=1)
+    solver: str = Field(default="constraint", pattern="^(constraint|ilp|evolution)$")
+    workers: Optional[int] = Field(default=None, ge=1, le=32)
+    seed: Optional[int] = None
+    time_limit: Optional[float] = Field(default=None, gt=0)
+
+
+class CampusResult(BaseModel):
+    timetables: List[Timetable]
+    components: List[List[str]]
+    metadata: Dict[str, Any] = {}
+
+
 class ConflictResolutionRequest(BaseModel):
     timetableId: str
-    conflicts: List[Dict[str, Any]]
+    conflicts: List[Dict[str, Any]] = []
+    rooms: List[Dict[str, Any]] = []
+    batches: List[Dict[str, Any]] = []
 
 
 class ConflictResolutionResult(BaseModel):
     suggestions: List[Dict[str, Any]]
+    conflicts: List[Dict[str, Any]] = []
 
 
 class LeaveRequest(BaseModel):
@@ -6,6 +6,5 @@ router = APIRouter()
 
 
 @router.get("/me")
-def me(user=Depends(get_current_user_dict)):
+async def me(user=Depends(get_current_user_dict)):
     return user
-
@@ -1,21 +1,101 @@
-from fastapi import APIRouter, Depends
-from app.deps.auth import require_role
-from app.deps.firebase import get_firestore_client
+from typing import Any, Dict, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException
+from app.deps.auth import faculty_id_of, require_role
+from app.deps.firebase import get_repository
 from app.models.schemas import LeaveRequest
+from app.services.encoding import encoded_cache
 from app.services.notifications import connection_manager
+from app.services.occupancy import dated_clash, load_occupancy, refresh_occupancy_many, slot_resources, timetable_entries
+from app.services.repair import faculty_day_keys, repair_timetable, weekday_dates
+from app.services.repository import Repository, field_path
+from app.services.settings import load_settings
+from app.services.timetables import COLLECTION, load_slots
+from app.services.views import refresh_views_many
 
 
 router = APIRouter()
 
 
 @router.post("")
-async def request_leave(req: LeaveRequest, faculty=Depends(require_role("faculty", "admin"))):
-    db = get_firestore_client()
-    doc = db.collection("leaves").document()
+async def request_leave(req: LeaveRequest, faculty=Depends(require_role("faculty", "admin")), repo: Repository = Depends(get_repository)):
+    own_id = faculty_id_of(faculty)
+    faculty_id = own_id if req.facultyId in ("", "SELF") else req.facultyId
+    # only admins may file leave for somebody else
+    if faculty_id != own_id and faculty.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Cannot request leave for another faculty")
+    try:
+        by_day = weekday_dates(req.dates)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Leave dates must be YYYY-MM-DD")
+
+    doc = repo.collection("leaves").document()
+    changes: List[Dict[str, Any]] = []
+    # timetable -> date -> slot id -> override: the changed slots, kept next to the weekly ones
+    repaired: List[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]] = []
+    if by_day:
+        # only timetables where this faculty teaches on one of the leave weekdays
+        keys = faculty_day_keys(faculty_id, sorted(by_day))
+        found = await repo.query(COLLECTION, [("facultyDayIndex", "array_contains_any", keys)], id_field="id")
+        # sharded timetables: only the leave weekdays' slots are fetched
+        found = await load_slots(repo, found, days=by_day)
+        # bookings elsewhere on the campus, so a substitute or a moved session is not double-booked
+        loaded = await load_occupancy(repo, [k for tt in found for s in tt.get("slots") or [] for k in slot_resources(s)])
+        docs = {k: {**d, "timetables": dict(d.get("timetables") or {})} for k, d in loaded.items()}
+        for tt in found:
+            fixes = repair_timetable(tt, faculty_id, req.dates, clash=dated_clash(docs, tt["id"]))
+            if not fixes:
+                continue
+            changes.extend(fixes)
+            overrides: Dict[str, Dict[str, Any]] = {}
+            for c in fixes:
+                overrides.setdefault(c["date"], {})[c["slotId"]] = {"action": c["action"], "slot": c["after"], "before": c["before"], "leaveId": doc.id}
+            repaired.append((tt, overrides))
+            # later timetables of this leave see the dated bookings just made
+            for k, entry in timetable_entries({"adjustments": overrides}).items():
+                if k in docs:
+                    mine = docs[k]["timetables"].get(tt["id"]) or {"days": {}}
+                    docs[k]["timetables"][tt["id"]] = {**mine, "dates": {**(mine.get("dates") or {}), **entry["dates"]}}
+
     payload = req.model_dump()
+    payload["facultyId"] = faculty_id
     payload["uid"] = faculty["uid"]
-    doc.set(payload)
-    # naive: broadcast a notification; in real use, re-run scheduling for affected slots
-    await connection_manager.broadcast(f"Faculty {faculty['uid']} requested leave on {', '.join(req.dates)}")
-    return {"submitted": True}
+    payload["adjustments"] = {
+        action: sum(1 for c in changes if c["action"] == action)
+        for action in ("substitute", "move", "unresolved")
+    }
+    batch = repo.batch()
+    batch.set(doc, payload)
+    written = []
+    for tt, overrides in repaired:
+        # views and occupancy are derived from the whole timetable, not just the leave weekdays
+        old = (await load_slots(repo, [tt]))[0] if tt.get("shards") else tt
+        adjustments = {d: dict(o) for d, o in (old.get("adjustments") or {}).items()}
+        for d, slots in overrides.items():
+            adjustments.setdefault(d, {}).update(slots)
+        # only the changed overrides are written, by field path, so concurrent leaves merge
+        fields = [field_path("adjustments", d, slot_id) for d, slots in overrides.items() for slot_id in slots]
+        batch.set(repo.document(f"{COLLECTION}/{tt['id']}"), {"adjustments": overrides}, merge=fields)
+        written.append((tt["id"], old, {**old, "adjustments": adjustments}))
+    await batch.commit()
+    for tt_id, _, _ in written:
+        encoded_cache.invalidate((COLLECTION, tt_id))
+    if written:
+        await refresh_views_many(repo, written)
+        await refresh_occupancy_many(repo, written)
+
+    if not (await load_settings(repo)).get("enableInstantNotify", True):
+        return {"submitted": True, "leaveId": doc.id, "adjustments": changes}
 
+    summary = ", ".join(f"{n} {a}" for a, n in payload["adjustments"].items() if n)
+    # only the people whose week changes: the faculty, substitutes, affected batches, admins
+    topics = {f"faculty:{faculty_id}", "role:admin"}
+    for c in changes:
+        if c["before"].get("batch"):
+            topics.add(f"batch:{c['before']['batch']}")
+        if c["action"] == "substitute":
+            topics.add(f"faculty:{c['after']['facultyId']}")
+    await connection_manager.publish(
+        topics,
+        f"Faculty {faculty_id} requested leave on {', '.join(req.dates)}" + (f" ({summary})" if summary else ""),
+    )
+    return {"submitted": True, "leaveId": doc.id, "adjustments": changes}
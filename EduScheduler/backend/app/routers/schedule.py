@@ -1,20 +1,72 @@
-from fastapi import APIRouter, Depends
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from app.deps.auth import require_role
-from app.models.schemas import ScheduleRequest, ScheduleResult, ConflictResolutionRequest, ConflictResolutionResult
-from app.services.scheduler.engine import generate_timetables
+from app.deps.firebase import get_repository
+from app.models.schemas import CampusRequest, CampusResult, ScheduleRequest, ScheduleResult, ConflictResolutionRequest, ConflictResolutionResult
+from app.services.scheduler.engine import generate_timetables_async
+from app.services.scheduler.registry import get_generator
 from app.services.conflicts import resolve_conflicts
+from app.services.encoding import model_response
+from app.services.jobs import job_manager
+from app.services.occupancy import request_occupancy, timetable_occupancy_for
+from app.services.repository import Repository
+from app.services.settings import load_settings
+from app.services.timetables import read_timetable
 
 
 router = APIRouter()
 
 
 @router.post("/schedule/generate", response_model=ScheduleResult)
-def schedule_generate(req: ScheduleRequest, admin=Depends(require_role("admin"))):
-    options = generate_timetables(req)
-    return {"options": options}
+async def schedule_generate(req: ScheduleRequest, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    settings = await load_settings(repo)
+    req.occupied = await request_occupancy(repo, req)
+    options = await generate_timetables_async(req, settings)
+    # the options are already validated models: serialize them once, skip response_model
+    return model_response(ScheduleResult.model_construct(options=options))
+
+
+@router.post("/schedule/campus", response_model=CampusResult)
+async def schedule_campus(req: CampusRequest, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    # every listed department is being regenerated, so none of their old timetables block
+    replacing = {(d.department, d.semester) for d in req.departments}
+    for d in req.departments:
+        d.occupied = await request_occupancy(repo, d, replacing)
+    try:
+        result = await asyncio.to_thread(get_generator("campus"), req)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return model_response(CampusResult.model_construct(**result))
+
+
+@router.post("/schedule/jobs")
+async def schedule_job_submit(req: ScheduleRequest, priority: int = Query(0, ge=-10, le=10), admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    settings = await load_settings(repo)
+    req.occupied = await request_occupancy(repo, req)
+    job = await job_manager.submit(repo, req, settings, admin["uid"], priority)
+    return {"jobId": job["id"], "status": job["status"]}
+
+
+@router.get("/schedule/jobs/{job_id}")
+async def schedule_job_get(job_id: str, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    job = await job_manager.get(repo, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.delete("/schedule/jobs/{job_id}")
+async def schedule_job_cancel(job_id: str, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    return {"cancelled": await job_manager.cancel(repo, job_id)}
 
 
 @router.post("/conflicts/resolve", response_model=ConflictResolutionResult)
-def conflicts_resolve(req: ConflictResolutionRequest, admin=Depends(require_role("admin"))):
-    return resolve_conflicts(req)
+async def conflicts_resolve(req: ConflictResolutionRequest, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    # sharded timetables keep their slots in day sub-documents, not on the header
+    timetable = await read_timetable(repo, req.timetableId)
+    if timetable is None:
+        raise HTTPException(status_code=404, detail="Timetable not found")
+    occupied = await timetable_occupancy_for(repo, req.timetableId, timetable.get("slots") or [])
+    return resolve_conflicts(req, timetable, occupied)
 
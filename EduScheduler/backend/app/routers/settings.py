@@ -1,24 +1,21 @@
 from fastapi import APIRouter, Depends
 from app.deps.auth import require_role
-from app.deps.firebase import get_firestore_client
+from app.deps.firebase import get_repository
 from app.models.schemas import Settings
+from app.services.repository import Repository
+from app.services.settings import invalidate_settings, load_settings
 
 
 router = APIRouter()
 
 
-def _doc():
-    return get_firestore_client().collection("meta").document("settings")
-
-
 @router.get("")
-def get_settings(admin=Depends(require_role("admin"))):
-    d = _doc().get()
-    return d.to_dict() if d.exists else {}
+async def get_settings(admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    return await load_settings(repo)
 
 
 @router.put("")
-def put_settings(s: Settings, admin=Depends(require_role("admin"))):
-    _doc().set(s.model_dump(), merge=True)
+async def put_settings(s: Settings, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    await repo.set("meta", "settings", s.model_dump(), merge=True)
+    invalidate_settings()
     return {"updated": True}
-
@@ -1,76 +1,186 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.deps.auth import get_current_user_dict, require_role
-from app.deps.firebase import get_firestore_client
-from app.models.schemas import Timetable
+import asyncio
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.deps.auth import faculty_id_of, get_current_user_dict, require_role
+from app.deps.firebase import get_repository
+from app.models.schemas import PublishRequest, Timetable
+from app.services.conflicts import detect_conflicts
+from app.services.encoding import JSONBytesResponse, cached_document, dumps, encoded, encoded_cache
+from app.services.occupancy import Key, external_conflicts, pending_occupancy, rebuild_occupancy, refresh_occupancy, refresh_occupancy_many
+from app.services.repository import DOCUMENT_ID, Repository
+from app.services.timetables import COLLECTION, commit, deletes_for, load_slots, read_day, read_timetable, with_indexes, writes_for
+from app.services.views import get_view, refresh_views, refresh_views_many
 
 
 router = APIRouter()
 
+MAX_PAGE = 500
+SUMMARY_FIELDS = ["name", "department", "semester", "year", "metadata"]
+# storage-only header fields that an update must not carry over from the old document
+SHARD_FIELDS = ("shards", "slotCount")
 
-def _collection():
-    return get_firestore_client().collection("timetables")
+
+async def _check(repo: Repository, tt_id: str, data: dict, pending: Optional[Dict[Key, dict]] = None) -> list:
+    conflicts = detect_conflicts(data["slots"])
+    # bookings already held by other stored timetables (and by the rest of a publish payload)
+    external = await external_conflicts(repo, tt_id, data["slots"], pending)
+    data["metadata"] = {**(data.get("metadata") or {}), "conflicts": len(conflicts), "externalConflicts": len(external)}
+    return conflicts + external
+
+
+async def _validate(repo: Repository, tt_id: str, data: dict, strict: bool) -> None:
+    clashes = await _check(repo, tt_id, data)
+    if clashes and strict:
+        raise HTTPException(status_code=409, detail={"message": "Timetable has clashes", "conflicts": clashes})
+
+
+def _view_response(request: Request, view: dict) -> Response:
+    etag = f'"{view["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONBytesResponse(encoded(("view", view["version"]), view["timetables"]), headers=headers)
 
 
 @router.post("/admin/timetable")
-def create_timetable(tt: Timetable, admin=Depends(require_role("admin"))):
-    doc = _collection().document()
-    # Build indexes for fast queries
-    faculty_ids = sorted({s.facultyId for s in tt.slots})
-    batches = sorted({s.batch for s in tt.slots if s.batch})
-    tt.id = doc.id
-    data = tt.model_dump()
-    data["facultyIndex"] = faculty_ids
-    data["batchIndex"] = batches
-    doc.set(data)
-    return tt
+async def create_timetable(tt: Timetable, strict: bool = False, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    tt.id = repo.new_id(COLLECTION)
+    data = with_indexes(tt)
+    await _validate(repo, tt.id, data, strict)
+    await commit(repo, [writes_for(tt.id, data)])
+    await refresh_views(repo, tt.id, None, data)
+    await refresh_occupancy(repo, tt.id, None, data)
+    return JSONBytesResponse(data)
 
 
 @router.get("/admin/timetable")
-def list_timetables(department: str | None = None, admin=Depends(require_role("admin"))):
-    q = _collection()
-    if department:
-        q = q.where("department", "==", department)
-    return [d.to_dict() for d in q.stream()]
+async def list_timetables(
+    department: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE),
+    start_after: str | None = None,
+    fields: str = Query("full", pattern="^(full|summary)$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    admin=Depends(require_role("admin")),
+    repo: Repository = Depends(get_repository),
+):
+    filters = [("department", "==", department)] if department else []
+    docs = repo.stream(
+        COLLECTION,
+        filters,
+        order_by=DOCUMENT_ID,
+        limit=limit,
+        start_after={DOCUMENT_ID: start_after} if start_after else None,
+        select=SUMMARY_FIELDS if fields == "summary" else None,
+        id_field="id",
+    )
+    if format == "ndjson":
+        # one document per line, written as Firestore yields it
+        async def lines():
+            async for d in docs:
+                if d.get("shards"):
+                    await load_slots(repo, [d])
+                yield dumps(d) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    items = await load_slots(repo, [d async for d in docs])
+    headers = {"X-Next-Cursor": items[-1]["id"]} if limit and len(items) == limit else None
+    return JSONBytesResponse(items, headers=headers)
 
 
 @router.get("/admin/timetable/{tt_id}")
-def get_timetable(tt_id: str, admin=Depends(require_role("admin"))):
-    doc = _collection().document(tt_id).get()
-    if not doc.exists:
+async def get_timetable(tt_id: str, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    body = await cached_document((COLLECTION, tt_id), lambda: read_timetable(repo, tt_id))
+    if body is None:
         raise HTTPException(status_code=404, detail="Not found")
-    return doc.to_dict()
+    return JSONBytesResponse(body)
+
+
+@router.get("/admin/timetable/{tt_id}/days/{day}")
+async def get_timetable_day(tt_id: str, day: str, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    slots = await read_day(repo, tt_id, day)
+    if slots is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return JSONBytesResponse({"id": tt_id, "day": day, "slots": slots})
 
 
 @router.put("/admin/timetable/{tt_id}")
-def update_timetable(tt_id: str, tt: Timetable, admin=Depends(require_role("admin"))):
-    faculty_ids = sorted({s.facultyId for s in tt.slots})
-    batches = sorted({s.batch for s in tt.slots if s.batch})
-    data = tt.model_dump()
-    data["facultyIndex"] = faculty_ids
-    data["batchIndex"] = batches
-    _collection().document(tt_id).set(data, merge=True)
+async def update_timetable(tt_id: str, tt: Timetable, strict: bool = False, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    tt.id = tt_id
+    data = with_indexes(tt)
+    await _validate(repo, tt_id, data, strict)
+    old = await read_timetable(repo, tt_id)
+    merged = {**{k: v for k, v in (old or {}).items() if k not in SHARD_FIELDS}, **data}
+    await commit(repo, [writes_for(tt_id, merged, old)])
+    encoded_cache.invalidate((COLLECTION, tt_id))
+    await refresh_views(repo, tt_id, old, merged)
+    await refresh_occupancy(repo, tt_id, old, merged)
     return {"updated": True}
 
 
 @router.delete("/admin/timetable/{tt_id}")
-def delete_timetable(tt_id: str, admin=Depends(require_role("admin"))):
-    _collection().document(tt_id).delete()
+async def delete_timetable(tt_id: str, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    old = await read_timetable(repo, tt_id)
+    await commit(repo, [deletes_for(tt_id, old)])
+    encoded_cache.invalidate((COLLECTION, tt_id))
+    await refresh_views(repo, tt_id, old, None)
+    await refresh_occupancy(repo, tt_id, old, None)
     return {"deleted": True}
 
 
+@router.post("/admin/timetable/publish")
+async def publish_timetables(body: PublishRequest, strict: bool = False, admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    """Create many timetables at once: the given ones plus every option of ``jobId``."""
+    items = list(body.timetables)
+    if body.jobId:
+        job = await repo.get("jobs", body.jobId)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.get("status") != "done":
+            raise HTTPException(status_code=409, detail="Job has not finished")
+        options = await repo.query(f"jobs/{body.jobId}/options", order_by="index")
+        items += [Timetable(**{k: v for k, v in o.items() if k != "index"}) for o in options]
+    if not items:
+        raise HTTPException(status_code=400, detail="Nothing to publish")
+
+    datas = []
+    for tt in items:
+        tt.id = repo.new_id(COLLECTION)
+        datas.append(with_indexes(tt))
+    # nothing in the payload is in the stored index yet, so check its timetables against each other too
+    pending = pending_occupancy(datas)
+    clashes = await asyncio.gather(*(_check(repo, d["id"], d, pending) for d in datas))
+    if strict and any(clashes):
+        raise HTTPException(status_code=409, detail={
+            "message": "Timetables have clashes",
+            "conflicts": {d["id"]: c for d, c in zip(datas, clashes) if c},
+        })
+    batches = await commit(repo, [writes_for(d["id"], d) for d in datas])
+    changes = [(d["id"], None, d) for d in datas]
+    await refresh_views_many(repo, changes)
+    await refresh_occupancy_many(repo, changes)
+    return {
+        "published": [d["id"] for d in datas],
+        "batches": batches,
+        "conflicts": {d["id"]: len(c) for d, c in zip(datas, clashes)},
+    }
+
+
+@router.post("/admin/occupancy/rebuild")
+async def occupancy_rebuild(admin=Depends(require_role("admin")), repo: Repository = Depends(get_repository)):
+    return {"resources": await rebuild_occupancy(repo)}
+
+
 @router.get("/faculty/timetable")
-def faculty_timetable(user=Depends(require_role("faculty", "admin"))):
-    uid = user["uid"]
-    # Query via index
-    docs = _collection().where("facultyIndex", "array_contains", uid).stream()
-    return [d.to_dict() for d in docs]
+async def faculty_timetable(request: Request, user=Depends(require_role("faculty", "admin")), repo: Repository = Depends(get_repository)):
+    # only this faculty's slots, from the materialized view
+    return _view_response(request, await get_view(repo, "faculty", faculty_id_of(user)))
 
 
 @router.get("/student/timetable")
-def student_timetable(user=Depends(require_role("student", "admin"))):
+async def student_timetable(request: Request, user=Depends(require_role("student", "admin")), repo: Repository = Depends(get_repository)):
     batch = user.get("batch")
     if not batch:
         return []
-    docs = _collection().where("batchIndex", "array_contains", batch).stream()
-    return [d.to_dict() for d in docs]
+    return _view_response(request, await get_view(repo, "batch", batch))
 
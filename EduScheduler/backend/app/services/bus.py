@@ -0,0 +1,183 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = os.getenv("NOTIFY_CHANNEL", "eduscheduler:notify")
+PRESENCE_PREFIX = CHANNEL + ":presence:"
+FLUSH_DELAY = float(os.getenv("NOTIFY_FLUSH_MS", "5")) / 1000
+MAX_BATCH = int(os.getenv("NOTIFY_MAX_BATCH", "256"))
+
+Envelope = Dict[str, Any]
+Handler = Callable[[List[Envelope]], Awaitable[None]]
+
+
+def node_id() -> str:
+    return os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class Bus(abc.ABC):
+    """Pub/sub transport between workers. Publishes are buffered for a few milliseconds and
+    sent as one batch; every node, including the sender, receives each batch once."""
+
+    def __init__(self) -> None:
+        self.node = node_id()
+        self._handler: Optional[Handler] = None
+        self._buffer: List[Envelope] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.published = 0
+
+    async def start(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def close(self) -> None:
+        await self.flush()
+
+    async def publish(self, envelope: Envelope) -> None:
+        self._buffer.append(envelope)
+        self.published += 1
+        if len(self._buffer) >= MAX_BATCH:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(FLUSH_DELAY)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            # the broker is unreachable; notifications are best effort
+            logger.exception("Notification flush failed")
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self.batches += 1
+        await self._send(batch)
+
+    @abc.abstractmethod
+    async def _send(self, batch: List[Envelope]) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def set_presence(self, counts: Dict[str, int], ttl: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def clear_presence(self) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def presence(self) -> Dict[str, Dict[str, int]]:
+        ...
+
+
+class InMemoryBus(Bus):
+    """Single-process bus: batches are handed straight back to this node's handler."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._presence: Dict[str, Dict[str, int]] = {}
+
+    async def _send(self, batch: List[Envelope]) -> None:
+        if self._handler is not None:
+            await self._handler(batch)
+
+    async def set_presence(self, counts: Dict[str, int], ttl: float) -> None:
+        self._presence[self.node] = dict(counts)
+
+    async def clear_presence(self) -> None:
+        self._presence.pop(self.node, None)
+
+    async def presence(self) -> Dict[str, Dict[str, int]]:
+        return {node: dict(counts) for node, counts in self._presence.items()}
+
+
+class RedisBus(Bus):
+    """Redis pub/sub: one JSON array per batch on ``CHANNEL``; presence is a hash per node
+    (uid -> open sockets) that expires unless the node keeps refreshing it."""
+
+    def __init__(self, url: str, client: Any = None) -> None:
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.redis = client
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler) -> None:
+        await super().start(handler)
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(CHANNEL)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub: Any) -> None:
+        while True:
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # broker hiccup: back off and resubscribe
+                logger.exception("Notification bus read failed")
+                await asyncio.sleep(1.0)
+                try:
+                    await pubsub.subscribe(CHANNEL)
+                except Exception:
+                    logger.exception("Notification bus resubscribe failed")
+                continue
+            if message and self._handler is not None:
+                try:
+                    await self._handler(json.loads(message["data"]))
+                except Exception:
+                    # one bad batch must not stop the listener
+                    logger.exception("Notification batch handler failed")
+
+    async def close(self) -> None:
+        await super().close()
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.redis.aclose()
+
+    async def _send(self, batch: List[Envelope]) -> None:
+        await self.redis.publish(CHANNEL, json.dumps(batch, separators=(",", ":")))
+
+    async def set_presence(self, counts: Dict[str, int], ttl: float) -> None:
+        key = PRESENCE_PREFIX + self.node
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        if counts:
+            pipe.hset(key, mapping=counts)
+            pipe.expire(key, max(1, int(ttl)))
+        await pipe.execute()
+
+    async def clear_presence(self) -> None:
+        await self.redis.delete(PRESENCE_PREFIX + self.node)
+
+    async def presence(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        async for key in self.redis.scan_iter(match=PRESENCE_PREFIX + "*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            raw = await self.redis.hgetall(key)
+            out[key[len(PRESENCE_PREFIX):]] = {
+                (k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()
+            }
+        return out
+
+
+def make_bus() -> Bus:
+    url = os.getenv("REDIS_URL")
+    if os.getenv("NOTIFY_BUS", "redis" if url else "memory") == "redis":
+        return RedisBus(url or "redis://localhost:6379/0")
+    return InMemoryBus()
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL.
+
+    ``get_or_load`` (threads) and ``get_or_load_async`` (coroutines) coalesce concurrent misses
+    for the same key so only one caller runs the loader; the others wait for its result.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires, value = entry
+        if expires <= self._clock():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            # a load already in flight must not repopulate the entry with stale data
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._inflight.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            future = self._inflight.get(key)
+            owner = not isinstance(future, Future)
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as exc:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                ttl = self.ttl if ttl is None else ttl
+                if ttl > 0:
+                    self._store(key, value, ttl)
+        future.set_result(value)
+        return value
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            future = self._inflight.get(key)
+            owner = not isinstance(future, asyncio.Future)
+            if owner:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not owner:
+            return await asyncio.shield(future)
+        try:
+            value = await loader()
+        except BaseException as exc:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            future.set_exception(exc)
+            # mark retrieved so an unobserved failure does not log a warning
+            future.exception()
+            raise
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                ttl = self.ttl if ttl is None else ttl
+                if ttl > 0:
+                    self._store(key, value, ttl)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
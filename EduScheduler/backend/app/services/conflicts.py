@@ -1,18 +1,191 @@
-from typing import Dict, Any, List
+import heapq
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 from app.models.schemas import ConflictResolutionRequest
+from app.services.scheduler.model import TimeGrid, iter_bits, parse_hhmm
 
 
-def resolve_conflicts(req: ConflictResolutionRequest) -> Dict[str, Any]:
+RESOURCES = (("faculty", "facultyId"), ("room", "roomId"), ("batch", "batch"))
+
+
+def slot_key(slot: Dict[str, Any], position: int) -> str:
+    return slot.get("id") or str(position)
+
+
+def detect_conflicts(slots: List[Dict[str, Any]], kinds: Iterable[str] = ("faculty", "room", "batch")) -> List[Dict[str, Any]]:
+    wanted = set(kinds)
+    groups: Dict[Tuple[str, str, str], List[Tuple[int, int, int]]] = {}
+    for i, s in enumerate(slots):
+        start, end = parse_hhmm(s["startTime"]), parse_hhmm(s["endTime"])
+        for kind, field in RESOURCES:
+            value = s.get(field)
+            if kind in wanted and value and value != "AUTO":
+                groups.setdefault((kind, value, s["day"]), []).append((start, end, i))
+
+    out: List[Dict[str, Any]] = []
+    for (kind, value, day), intervals in groups.items():
+        if len(intervals) < 2:
+            continue
+        # sweep line: intervals sorted by start, min-heap of the ends still open
+        intervals.sort()
+        active: List[Tuple[int, int, int]] = []
+        for start, end, i in intervals:
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for other_end, other_start, j in active:
+                out.append({
+                    "type": kind,
+                    "resource": value,
+                    "day": day,
+                    "slotIds": [slot_key(slots[j], j), slot_key(slots[i], i)],
+                    "startTime": slots[i]["startTime"],
+                    "endTime": slots[i]["endTime"] if end <= other_end else slots[j]["endTime"],
+                })
+            heapq.heappush(active, (end, start, i))
+    return out
+
+
+class Availability:
+    """Free-period index over one timetable: occupancy bitsets per faculty, batch and room."""
+
+    def __init__(
+        self,
+        slots: List[Dict[str, Any]],
+        rooms: Optional[List[Dict[str, Any]]] = None,
+        grid: Optional[TimeGrid] = None,
+        occupied: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None,
+    ) -> None:
+        self.grid = grid or TimeGrid()
+        self.slots = list(slots)
+        # capacity held by other timetables; never released
+        self.blocked: Dict[Tuple[str, str], int] = {
+            (kind, key): self.grid.bucket_mask(days) for kind, keys in (occupied or {}).items() for key, days in keys.items()
+        }
+        self.faculty: Dict[str, int] = {k: m for (kind, k), m in self.blocked.items() if kind == "faculty"}
+        self.batch: Dict[str, int] = {k: m for (kind, k), m in self.blocked.items() if kind == "batch"}
+        self.room: Dict[str, int] = {k: m for (kind, k), m in self.blocked.items() if kind == "room"}
+        self.faculty_courses: Dict[str, Set[str]] = {}
+        self.members: Dict[Tuple[str, str], Set[int]] = {}
+        self.masks: List[int] = []
+        self.rooms: Dict[str, Dict[str, Any]] = {r["id"]: r for r in rooms or [] if r.get("id")}
+        for i, s in enumerate(self.slots):
+            self.masks.append(self.grid.interval_mask(s["day"], s["startTime"], s["endTime"]))
+            self._occupy(i)
+            if s.get("roomId") and s["roomId"] != "AUTO":
+                self.rooms.setdefault(s["roomId"], {"id": s["roomId"]})
+
+    def _keys(self, s: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, int]]]:
+        keys = [("faculty", s["facultyId"], self.faculty)]
+        if s.get("batch"):
+            keys.append(("batch", s["batch"], self.batch))
+        if s.get("roomId") and s["roomId"] != "AUTO":
+            keys.append(("room", s["roomId"], self.room))
+        return keys
+
+    def _occupy(self, i: int) -> None:
+        s, mask = self.slots[i], self.masks[i]
+        self.faculty_courses.setdefault(s["facultyId"], set()).add(s.get("courseCode"))
+        for kind, value, table in self._keys(s):
+            table[value] = table.get(value, 0) | mask
+            self.members.setdefault((kind, value), set()).add(i)
+
+    def release(self, i: int) -> None:
+        s = self.slots[i]
+        for kind, value, table in self._keys(s):
+            members = self.members[(kind, value)]
+            members.discard(i)
+            # rebuild from the remaining members so clashing neighbours keep their bits
+            mask = self.blocked.get((kind, value), 0)
+            for j in members:
+                mask |= self.masks[j]
+            table[value] = mask
+
+    def place(self, i: int, slot: Dict[str, Any]) -> None:
+        self.slots[i] = slot
+        self.masks[i] = self.grid.interval_mask(slot["day"], slot["startTime"], slot["endTime"])
+        self._occupy(i)
+
+    def busy(self, s: Dict[str, Any]) -> int:
+        mask = self.faculty.get(s["facultyId"], 0)
+        if s.get("batch"):
+            mask |= self.batch.get(s["batch"], 0)
+        return mask
+
+    def free_rooms(self, mask: int, size: Optional[int] = None, resources: Optional[List[str]] = None) -> List[str]:
+        need = set(resources or [])
+        out = []
+        for rid, room in self.rooms.items():
+            if self.room.get(rid, 0) & mask:
+                continue
+            capacity = room.get("capacity")
+            if size is not None and capacity is not None and int(capacity) < size:
+                continue
+            # rooms only known from the timetable itself have no resource list to check
+            if room.get("resources") is not None and not need <= set(room["resources"]):
+                continue
+            out.append((capacity is None, capacity or 0, rid))
+        # tightest fit first; rooms with unknown capacity last
+        return [rid for _, _, rid in sorted(out)]
+
+    def suggest(self, s: Dict[str, Any], mask: int, size: Optional[int] = None, keep_time: bool = False) -> Optional[Dict[str, Any]]:
+        grid = self.grid
+        resources = s.get("resources") or []
+        if keep_time and not self.busy(s) & mask:
+            rooms = self.free_rooms(mask, size, resources)
+            if rooms:
+                return {"day": s["day"], "newStart": s["startTime"], "newEnd": s["endTime"], "alternativeRoomId": rooms[0]}
+        start = grid.period_at(s["day"], s["startTime"])
+        length = bin(mask).count("1")
+        if not length:
+            return None
+        free = grid.free_starts(~self.busy(s) & grid.full_mask, length)
+        home = start % grid.periods_per_day if start is not None else 0
+        home_day = grid.day_index(s["day"]) or 0
+        for p in sorted(iter_bits(free), key=lambda p: (abs(p % grid.periods_per_day - home), abs(grid.day_of(p) - home_day), p)):
+            span = grid.span_mask(p, length)
+            room = s.get("roomId")
+            if room in self.rooms and not self.room.get(room, 0) & span:
+                chosen = room
+            else:
+                rooms = self.free_rooms(span, size, resources)
+                if not rooms:
+                    continue
+                chosen = rooms[0]
+            new_start, new_end = grid.times(p, length)
+            return {"day": grid.days[grid.day_of(p)], "newStart": new_start, "newEnd": new_end, "alternativeRoomId": chosen}
+        return None
+
+
+def resolve_conflicts(
+    req: ConflictResolutionRequest,
+    timetable: Dict[str, Any],
+    occupied: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None,
+) -> Dict[str, Any]:
+    slots: List[Dict[str, Any]] = timetable.get("slots") or []
+    conflicts = detect_conflicts(slots)
+    requested = {c.get("slotId") for c in req.conflicts if c.get("slotId")}
+    sizes = {b.get("id") or b.get("name"): b.get("size") for b in req.batches}
+    index = Availability(slots, req.rooms, occupied=occupied)
+    positions = {slot_key(s, i): i for i, s in enumerate(slots)}
+
     out: List[Dict[str, Any]] = []
-    for c in req.conflicts:
+    handled: Set[str] = set()
+    for c in conflicts:
+        # move the later of the two clashing slots; the earlier one stays put
+        slot_id = c["slotIds"][1]
+        if slot_id in handled or (requested and slot_id not in requested):
+            continue
+        handled.add(slot_id)
+        i = positions[slot_id]
+        slot, mask = index.slots[i], index.masks[i]
+        index.release(i)
+        suggested = index.suggest(slot, mask, sizes.get(slot.get("batch")), keep_time=c["type"] == "room")
         out.append({
-            "type": c.get("type", "overlap"),
-            "slotId": c.get("slotId"),
-            "suggested": {
-                "newStart": c.get("startTime", "10:00"),
-                "newEnd": c.get("endTime", "10:50"),
-                "alternativeRoomId": "R-ALT-101",
-            }
+            "type": c["type"],
+            "slotId": slot_id,
+            "conflictsWith": c["slotIds"][0],
+            "suggested": suggested,
         })
-    return {"suggestions": out}
-
+        if suggested:
+            slot = {**slot, "day": suggested["day"], "startTime": suggested["newStart"], "endTime": suggested["newEnd"], "roomId": suggested["alternativeRoomId"]}
+        index.place(i, slot)
+    return {"suggestions": out, "conflicts": conflicts}
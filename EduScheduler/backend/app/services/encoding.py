@@ -0,0 +1,60 @@
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from fastapi.responses import Response
+
+from app.services.cache import TTLCache
+
+
+# read-mostly timetable documents kept as ready-to-send JSON; invalidated by the write endpoints
+encoded_cache = TTLCache(maxsize=int(os.getenv("ENCODED_CACHE_SIZE", "2000")), ttl=float(os.getenv("ENCODED_CACHE_TTL", "30")))
+
+
+def _default(value: Any) -> Any:
+    # Firestore hands back datetime subclasses; match what jsonable_encoder would send
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    # anything else would go out as an arbitrary repr; fail loudly instead
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class JSONBytesResponse(Response):
+    """JSON response rendered with orjson; ``bytes`` content is sent as already-encoded JSON."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+def model_response(model: Any, **kwargs: Any) -> JSONBytesResponse:
+    """Send a Pydantic model serialized once, without FastAPI validating it again."""
+    return JSONBytesResponse(model.model_dump_json().encode(), **kwargs)
+
+
+async def cached_document(key: Any, load: Callable[[], Awaitable[Optional[Any]]]) -> Optional[bytes]:
+    """The encoded form of a document, loading and encoding it on a miss; ``None`` if absent."""
+
+    async def encode() -> Optional[bytes]:
+        data = await load()
+        return None if data is None else dumps(data)
+
+    return await encoded_cache.get_or_load_async(key, encode)
+
+
+def encoded(key: Any, data: Any) -> bytes:
+    """Encoded bytes for immutable content, e.g. a view at a given version."""
+    return encoded_cache.get_or_load(key, lambda: dumps(data))
@@ -0,0 +1,106 @@
+import hmac
+import io
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app.services.metrics import FIRESTORE_OPS, REQUEST_SECONDS, end_span, start_span
+
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = b"x-profile"
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _route(scope: Scope) -> str:
+    # the route template, never the raw path: one series per endpoint, not per document id
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _profile_requested(scope: Scope) -> bool:
+    if not PROFILE_TOKEN:
+        return False
+    for name, value in scope.get("headers") or []:
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+    return False
+
+
+class MetricsMiddleware:
+    """Per-route latency histograms, Firestore read/write counts and a ``Server-Timing`` header
+    for every HTTP request.
+
+    With ``PROFILE_TOKEN`` set, a request carrying ``X-Profile: <token>`` is run under a
+    sampling profiler (pyinstrument, else cProfile) and answered with the profile instead."""
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if _profile_requested(scope):
+            await self._profiled(scope, receive, send)
+            return
+        span, token = start_span()
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings = [f"app;dur={(time.perf_counter() - started) * 1000:.1f}"]
+                timings += [f"{name};dur={secs * 1000:.1f}" for name, secs in span.phases.items()]
+                timings.append(f'firestore;desc="{span.reads}r/{span.writes}w"')
+                message.setdefault("headers", []).append((b"server-timing", ", ".join(timings).encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_span(token)
+            route = _route(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, str(status))
+            if span.reads:
+                FIRESTORE_OPS.inc(span.reads, route, "read")
+            if span.writes:
+                FIRESTORE_OPS.inc(span.writes, route, "write")
+
+    async def _profiled(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def discard(message: Dict[str, Any]) -> None:
+            pass
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler is not None:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profiler.stop()
+            body, media_type = profiler.output_html().encode(), b"text/html; charset=utf-8"
+        else:
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+            body, media_type = out.getvalue().encode(), b"text/plain; charset=utf-8"
+        headers: List[Any] = [(b"content-type", media_type), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
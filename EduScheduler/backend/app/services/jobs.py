@@ -0,0 +1,278 @@
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.bus import node_id
+from app.services.notifications import connection_manager
+from app.services.repository import Repository
+
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "jobs"
+WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+PROGRESS_WRITE_INTERVAL = 1.0
+ACTIVE = ("queued", "running")
+# a job belongs to the node holding its lease; running jobs renew it, expired ones are taken over
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# how often a running job's document is checked for a cancel from another node
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def run_job(job_id: str, payload: Dict[str, Any], settings: Dict[str, Any], channel: Any, cancelled: Any) -> List[Dict[str, Any]]:
+    """Runs in a pool process; reports progress and best-so-far options through ``channel``."""
+    from app.services.scheduler.engine import generate_timetables
+
+    sent = [0]
+
+    def progress(fraction: float, options: List[Timetable]) -> None:
+        if cancelled.get(job_id):
+            raise JobCancelled()
+        # new options are appended; a report with no new ones replaces the last (a changing best)
+        start = sent[0] if len(options) > sent[0] else max(0, len(options) - 1)
+        sent[0] = len(options)
+        channel.put((job_id, fraction, start, [o.model_dump() for o in options[start:]]))
+
+    if cancelled.get(job_id):
+        raise JobCancelled()
+    options = generate_timetables(ScheduleRequest(**payload), settings, progress=progress)
+    return [o.model_dump() for o in options]
+
+
+class JobManager:
+    """Background schedule generation: a priority queue drained by ``WORKERS`` dispatchers, each
+    running one job at a time in a process pool. Job state lives in ``jobs/{id}`` with options
+    under ``jobs/{id}/options``; progress and best-so-far options go to the submitter's socket.
+
+    Several nodes may serve the same jobs: a dispatcher claims a job in a transaction, and only a
+    job whose lease has expired is taken over from another node. Cancels are written to the job
+    document, which the running node polls."""
+
+    def __init__(self, workers: int = WORKERS) -> None:
+        self.workers = workers
+        self.node = node_id()
+        self.repo: Optional[Repository] = None
+        self._queue: "asyncio.PriorityQueue[Tuple[int, int, str]]" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._running: Set[str] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager: Any = None
+        self._channel: Any = None
+        self._cancelled: Any = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_pool(self) -> None:
+        if self._pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._manager = ctx.Manager()
+            self._channel = self._manager.Queue()
+            self._cancelled = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            self._tasks.append(asyncio.create_task(self._relay()))
+
+    async def start(self, repo: Repository) -> None:
+        self.repo = repo
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        # also picks up, right away, jobs left behind by a node that stopped
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._pool = None
+
+    def _enqueue(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+        self._queue.put_nowait((-int(job.get("priority", 0)), next(self._seq), job["id"]))
+
+    async def _sweep(self) -> None:
+        """Queue active jobs whose lease ran out, every half lease."""
+        while True:
+            try:
+                now = time.time()
+                for job in await self.repo.query(COLLECTION, [("status", "in", list(ACTIVE))], id_field="id"):
+                    if job["id"] not in self._jobs and job.get("leaseUntil", 0) < now:
+                        self._enqueue(job)
+            except Exception:
+                logger.exception("Job sweep failed")
+            await asyncio.sleep(LEASE_SECONDS / 2)
+
+    async def submit(self, repo: Repository, req: ScheduleRequest, settings: Dict[str, Any], owner: str, priority: int = 0) -> Dict[str, Any]:
+        job = {
+            "id": repo.new_id(COLLECTION),
+            "status": "queued",
+            "priority": priority,
+            "owner": owner,
+            "department": req.department,
+            "solver": req.solver,
+            "progress": 0.0,
+            "createdAt": time.time(),
+            "request": req.model_dump(),
+            "settings": settings,
+            "node": self.node,
+            "leaseUntil": time.time() + LEASE_SECONDS,
+        }
+        await repo.set(COLLECTION, job["id"], job)
+        self._enqueue(job)
+        return job
+
+    async def cancel(self, repo: Repository, job_id: str) -> bool:
+        now = time.time()
+        cancelled = await repo.update_if(
+            COLLECTION, job_id,
+            lambda job: {"status": "cancelled", "finishedAt": now} if job and job.get("status") in ACTIVE else None,
+        )
+        if cancelled is None:
+            return False
+        local = self._jobs.get(job_id)
+        if local is not None:
+            # running here: stop at the solver's next progress report rather than the next poll
+            local["status"] = "cancelled"
+            if self._cancelled is not None:
+                self._cancelled[job_id] = True
+        await self._notify({"id": job_id, "owner": cancelled.get("owner")}, {"status": "cancelled", "finishedAt": now})
+        return True
+
+    async def get(self, repo: Repository, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await repo.get(COLLECTION, job_id)
+        if job is None:
+            return None
+        job.pop("request", None)
+        job.pop("settings", None)
+        job["options"] = await repo.query(f"{COLLECTION}/{job_id}/options", order_by="index")
+        return job
+
+    def _owned(self, job: Optional[Dict[str, Any]]) -> bool:
+        return bool(job) and job.get("status") == "running" and job.get("node") == self.node
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+
+        def take(job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if not job or job.get("status") not in ACTIVE:
+                return None
+            if job.get("node") != self.node and job.get("leaseUntil", 0) >= now:
+                return None
+            return {"status": "running", "node": self.node, "leaseUntil": now + LEASE_SECONDS, "startedAt": now}
+
+        job = await self.repo.update_if(COLLECTION, job_id, take)
+        if job is not None:
+            job["id"] = job_id
+        return job
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+        """Record the outcome, unless the job was cancelled or taken over meanwhile."""
+        job.update(fields)
+        written = await self.repo.update_if(COLLECTION, job["id"], lambda cur: fields if self._owned(cur) else None)
+        return written is not None
+
+    async def _watch(self, job: Dict[str, Any]) -> None:
+        """Renew the lease of a running job and stop it when its document says it was cancelled."""
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            try:
+                current = await self.repo.get(COLLECTION, job["id"])
+                if self._owned(current) and current.get("leaseUntil", 0) - time.time() < LEASE_SECONDS / 2:
+                    until = time.time() + LEASE_SECONDS
+                    current = await self.repo.update_if(COLLECTION, job["id"], lambda cur: {"leaseUntil": until} if self._owned(cur) else None)
+                if not self._owned(current):
+                    job["status"] = (current or {}).get("status") or "cancelled"
+                    self._cancelled[job["id"]] = True
+                    return
+            except Exception:
+                logger.exception("Could not check job %s", job["id"])
+
+    async def _notify(self, job: Dict[str, Any], fields: Dict[str, Any], options: Optional[List[Dict[str, Any]]] = None) -> None:
+        message = {"type": "job", "jobId": job["id"], **fields}
+        if options:
+            message["options"] = options
+        # progress-only updates replace each other while queued; options always get through
+        key = None if options else f"job:{job['id']}"
+        await connection_manager.publish([f"user:{job['owner']}"], json.dumps(message, default=str), key=key)
+
+    async def _save_options(self, job: Dict[str, Any], options: List[Dict[str, Any]], start: int) -> None:
+        batch = self.repo.batch()
+        for i, option in enumerate(options, start):
+            ref = self.repo.collection(COLLECTION).document(job["id"]).collection("options").document(str(i))
+            batch.set(ref, {**option, "index": i})
+        await batch.commit()
+
+    async def _relay(self) -> None:
+        last_write: Dict[str, float] = {}
+        while True:
+            job_id, fraction, start, options = await asyncio.to_thread(self._channel.get)
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "running":
+                continue
+            now = time.monotonic()
+            if options:
+                await self._save_options(job, options, start)
+            if options or now - last_write.get(job_id, 0) >= PROGRESS_WRITE_INTERVAL:
+                last_write[job_id] = now
+                await self.repo.set(COLLECTION, job_id, {"progress": fraction}, merge=True)
+            job["progress"] = fraction
+            await self._notify(job, {"status": "running", "progress": round(fraction, 3)}, options)
+
+    async def _dispatch(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            if job_id in self._running:
+                continue
+            try:
+                job = await self._claim(job_id)
+            except Exception:
+                logger.exception("Could not claim job %s", job_id)
+                job = None
+            if job is None:
+                # finished, cancelled, or leased by another node
+                self._jobs.pop(job_id, None)
+                continue
+            self._jobs[job_id] = job
+            self._running.add(job_id)
+            self._ensure_pool()
+            await self._notify(job, {"status": "running", "startedAt": job["startedAt"]})
+            watch = asyncio.create_task(self._watch(job))
+            loop = asyncio.get_running_loop()
+            try:
+                options = await loop.run_in_executor(
+                    self._pool, run_job, job_id, job["request"], job.get("settings") or {}, self._channel, self._cancelled
+                )
+                if job["status"] == "running":
+                    # options first, so a job is never ``done`` without them; the status flip
+                    # also makes the relay ignore late progress reports
+                    await self._save_options(job, options, 0)
+                    fields = {"status": "done", "progress": 1.0, "optionCount": len(options), "finishedAt": time.time()}
+                    if await self._finish(job, fields):
+                        await self._notify(job, fields, options)
+            except JobCancelled:
+                pass
+            except Exception as exc:
+                logger.exception("Job %s failed", job_id)
+                if job["status"] == "running":
+                    fields = {"status": "failed", "error": f"{type(exc).__name__}: {exc}"[:500], "finishedAt": time.time()}
+                    if await self._finish(job, fields):
+                        await self._notify(job, fields)
+            finally:
+                watch.cancel()
+                self._cancelled.pop(job_id, None)
+                self._jobs.pop(job_id, None)
+                self._running.discard(job_id)
+
+
+job_manager = JobManager()
@@ -0,0 +1,189 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Labels) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, value
+
+
+class Gauge:
+    """A value read when ``/metrics`` is scraped: ``collect`` returns ``{labels: value}``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Dict[Labels, float]], labels: Sequence[str] = ()) -> None:
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.collect = collect
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, value in self.collect().items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        with self._lock:
+            items = [(labels, list(counts), total, s) for labels, (counts, total, s) in self._values.items()]
+        for labels, counts, total, s in items:
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                yield f"{self.name}_bucket", labels + (repr(bound),), running
+            yield f"{self.name}_bucket", labels + ("+Inf",), total
+            yield f"{self.name}_count", labels, total
+            yield f"{self.name}_sum", labels, s
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                names = metric.labels + ("le",) if name.endswith("_bucket") else metric.labels
+                lines.append(f"{name}{_labels(names, labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram("eduscheduler_request_seconds", "HTTP request latency by route.", ("method", "route", "status")))
+FIRESTORE_OPS = registry.register(Counter("eduscheduler_firestore_operations_total", "Firestore document reads and writes by route.", ("route", "op")))
+PHASE_SECONDS = registry.register(Histogram("eduscheduler_phase_seconds", "Time spent in instrumented phases (solvers, auth, fan-out).", ("phase",)))
+
+
+class Span:
+    """Per-request tally of Firestore operations and phase timings."""
+
+    __slots__ = ("reads", "writes", "phases")
+
+    def __init__(self) -> None:
+        self.reads = 0
+        self.writes = 0
+        self.phases: Dict[str, float] = {}
+
+
+_span: ContextVar[Optional[Span]] = ContextVar("metrics_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _span.get()
+
+
+def start_span() -> Tuple[Span, Any]:
+    span = Span()
+    return span, _span.set(span)
+
+
+def end_span(token: Any) -> None:
+    _span.reset(token)
+
+
+def count_reads(n: int = 1) -> None:
+    span = _span.get()
+    if span is not None:
+        span.reads += n
+
+
+def count_writes(n: int = 1) -> None:
+    span = _span.get()
+    if span is not None:
+        span.writes += n
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block into ``eduscheduler_phase_seconds`` and the current request's span."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, name)
+        span = _span.get()
+        if span is not None:
+            span.phases[name] = span.phases.get(name, 0.0) + elapsed
+
+
+def timed(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator form of ``phase``; a no-op wrapper is never installed when metrics are off."""
+
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            with phase(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
@@ -1,31 +1,239 @@
-from typing import Dict, Set
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
 from fastapi import WebSocket
 
+from app.deps.auth import faculty_id_of
+from app.services.bus import Bus, Envelope
+from app.services.metrics import timed
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "64"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# a socket whose queue is full and that has not accepted a message for this long is closed
+STALL_SECONDS = float(os.getenv("WS_STALL_SECONDS", "10"))
+PRESENCE_INTERVAL = float(os.getenv("WS_PRESENCE_INTERVAL", "10"))
+PRESENCE_DEBOUNCE = 0.5
+ALL = "*"
+
+
+def user_topics(user: Dict[str, Any]) -> List[str]:
+    uid = user["uid"]
+    topics = [f"user:{uid}"]
+    if user.get("role"):
+        topics.append(f"role:{user['role']}")
+    if user.get("batch"):
+        topics.append(f"batch:{user['batch']}")
+    if user.get("department"):
+        topics.append(f"department:{user['department']}")
+    if user.get("role") == "faculty" or user.get("facultyId"):
+        topics.append(f"faculty:{faculty_id_of(user)}")
+    return topics
+
+
+class _Connection:
+    def __init__(self, user_id: str, websocket: WebSocket, topics: Set[str]) -> None:
+        self.user_id = user_id
+        self.websocket = websocket
+        self.topics = topics
+        self.pending: Deque[List[Optional[str]]] = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.waiting_since = 0.0
+
 
 class ConnectionManager:
-    def __init__(self) -> None:
-        self.user_connections: Dict[str, Set[WebSocket]] = {}
+    """Fan-out of notifications to WebSockets by topic (``user:``, ``role:``, ``batch:``,
+    ``faculty:``, ``department:``).
+
+    Publishing never waits on a socket: each connection has a bounded queue drained by its own
+    writer task. A full queue drops its oldest message, messages that share a ``key`` replace
+    each other while still queued, and a socket that stays full is closed.
+
+    Once started with a ``Bus``, publishes go through it so sockets held by other workers are
+    reached too; before that they are delivered locally.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self.connections: Dict[WebSocket, _Connection] = {}
+        self.topics: Dict[str, Set[_Connection]] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.closed_slow = 0
+        self.bus: Optional[Bus] = None
+        self._presence_task: Optional[asyncio.Task] = None
+        self._presence_changed = asyncio.Event()
+
+    async def start(self, bus: Bus) -> None:
+        self.bus = bus
+        await bus.start(self._receive)
+        self._presence_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        if self.bus is None:
+            return
+        if self._presence_task is not None:
+            self._presence_task.cancel()
+        bus, self.bus = self.bus, None
+        try:
+            await bus.clear_presence()
+        finally:
+            await bus.close()
 
-    async def connect(self, user_id: str, websocket: WebSocket) -> None:
+    async def _heartbeat(self) -> None:
+        # refresh this node's presence on every change (debounced) and at least every interval
+        while True:
+            self._presence_changed.clear()
+            try:
+                await self.bus.set_presence(self.user_counts(), ttl=PRESENCE_INTERVAL * 3)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # presence expires on its own; the next beat tries again
+                logger.warning("Presence refresh failed", exc_info=True)
+            try:
+                await asyncio.wait_for(self._presence_changed.wait(), PRESENCE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(PRESENCE_DEBOUNCE)
+
+    async def _receive(self, batch: List[Envelope]) -> None:
+        for envelope in batch:
+            self._deliver(envelope["t"], envelope["m"], envelope.get("k"))
+
+    def user_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for conn in self.connections.values():
+            counts[conn.user_id] = counts.get(conn.user_id, 0) + 1
+        return counts
+
+    async def connect(self, user_id: str, websocket: WebSocket, topics: Iterable[str] = ()) -> None:
         await websocket.accept()
-        self.user_connections.setdefault(user_id, set()).add(websocket)
+        conn = _Connection(user_id, websocket, {f"user:{user_id}", *topics})
+        self.connections[websocket] = conn
+        for topic in conn.topics:
+            self.topics.setdefault(topic, set()).add(conn)
+        conn.task = asyncio.create_task(self._writer(conn))
+        self._presence_changed.set()
 
     def disconnect(self, user_id: str, websocket: WebSocket) -> None:
-        connections = self.user_connections.get(user_id)
-        if connections and websocket in connections:
-            connections.remove(websocket)
-            if not connections:
-                self.user_connections.pop(user_id, None)
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return
+        for topic in conn.topics:
+            members = self.topics.get(topic)
+            if members is not None:
+                members.discard(conn)
+                if not members:
+                    del self.topics[topic]
+        if conn.task is not None and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+        self._presence_changed.set()
+
+    def subscribe(self, websocket: WebSocket, topic: str) -> None:
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            conn.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(conn)
+
+    def _offer(self, conn: _Connection, message: str, key: Optional[str]) -> None:
+        if key is not None:
+            for entry in conn.pending:
+                if entry[0] == key:
+                    entry[1] = message
+                    self.coalesced += 1
+                    return
+        now = asyncio.get_running_loop().time()
+        if not conn.pending:
+            conn.waiting_since = now
+        elif len(conn.pending) >= self.queue_size:
+            conn.pending.popleft()
+            self.dropped += 1
+            if now - conn.waiting_since > STALL_SECONDS:
+                self._close_slow(conn)
+                return
+        conn.pending.append([key, message])
+        conn.ready.set()
+
+    def _close_slow(self, conn: _Connection) -> None:
+        self.closed_slow += 1
+        self.disconnect(conn.user_id, conn.websocket)
+        asyncio.create_task(self._close(conn.websocket, 1013))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _writer(self, conn: _Connection) -> None:
+        try:
+            while True:
+                if not conn.pending:
+                    conn.ready.clear()
+                    await conn.ready.wait()
+                    continue
+                _, message = conn.pending.popleft()
+                await asyncio.wait_for(conn.websocket.send_text(message), SEND_TIMEOUT)
+                self.sent += 1
+                conn.waiting_since = asyncio.get_running_loop().time()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # send failed or timed out: the peer is gone or too slow to keep
+            self.disconnect(conn.user_id, conn.websocket)
+            await self._close(conn.websocket, 1011)
+
+    @timed("notify.fanout")
+    def _deliver(self, topics: Iterable[str], message: str, key: Optional[str]) -> int:
+        if ALL in topics:
+            targets = set(self.connections.values())
+        else:
+            targets = set()
+            for topic in topics:
+                targets |= self.topics.get(topic, set())
+        for conn in targets:
+            self._offer(conn, message, key)
+        return len(targets)
+
+    async def publish(self, topics: Iterable[str], message: str, key: Optional[str] = None) -> None:
+        topics = sorted(set(topics))
+        if self.bus is None:
+            self._deliver(topics, message, key)
+        else:
+            await self.bus.publish({"t": topics, "m": message, "k": key})
+
+    async def send_to_socket(self, websocket: WebSocket, message: str) -> None:
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            self._offer(conn, message, None)
 
     async def send_to_user(self, user_id: str, message: str) -> None:
-        for ws in list(self.user_connections.get(user_id, set())):
-            await ws.send_text(message)
+        await self.publish([f"user:{user_id}"], message)
 
     async def broadcast(self, message: str) -> None:
-        for connections in list(self.user_connections.values()):
-            for ws in list(connections):
-                await ws.send_text(message)
+        await self.publish([ALL], message)
 
+    def stats(self) -> Dict[str, Any]:
+        depths = [len(c.pending) for c in self.connections.values()]
+        return {
+            "connections": len(self.connections),
+            "topics": len(self.topics),
+            "queued": sum(depths),
+            "maxQueueDepth": max(depths, default=0),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closedSlow": self.closed_slow,
+            "node": self.bus.node if self.bus else None,
+        }
 
-connection_manager = ConnectionManager()
 
+connection_manager = ConnectionManager()
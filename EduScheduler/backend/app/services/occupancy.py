@@ -0,0 +1,284 @@
+import os
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models.schemas import ScheduleRequest
+from app.services.cache import TTLCache
+from app.services.conflicts import slot_key
+from app.services.repair import WEEKDAYS, Clash, session_date
+from app.services.repository import Repository, delete_field, field_path
+from app.services.scheduler.model import minute_buckets, parse_hhmm
+from app.services.timetables import load_slots
+
+
+COLLECTION = "occupancy"
+KINDS = {"faculty": "facultyId", "room": "roomId", "batch": "batch"}
+BATCH_LIMIT = 500
+
+# kind -> resource id -> day -> hex bitmap of BUCKET_MINUTES buckets from midnight
+Occupied = Dict[str, Dict[str, Dict[str, str]]]
+Key = Tuple[str, str]
+
+occupancy_cache = TTLCache(maxsize=int(os.getenv("OCCUPANCY_CACHE_SIZE", "20000")), ttl=float(os.getenv("OCCUPANCY_CACHE_TTL", "30")))
+
+
+def doc_id(kind: str, key: str) -> str:
+    return f"{kind}:{key}"
+
+
+def slot_buckets(slot: Dict[str, Any]) -> int:
+    return minute_buckets(parse_hhmm(slot["startTime"]), parse_hhmm(slot["endTime"]))
+
+
+def slot_resources(slot: Dict[str, Any]) -> List[Key]:
+    return [(kind, slot[field]) for kind, field in KINDS.items() if slot.get(field) and slot[field] != "AUTO"]
+
+
+def timetable_occupancy(tt: Optional[Dict[str, Any]]) -> Dict[Key, Dict[str, str]]:
+    """What one timetable occupies: ``(kind, id) -> {day: hex buckets}``."""
+    bits: Dict[Key, Dict[str, int]] = {}
+    for s in (tt or {}).get("slots") or []:
+        buckets = slot_buckets(s)
+        for key in slot_resources(s):
+            days = bits.setdefault(key, {})
+            days[s["day"]] = days.get(s["day"], 0) | buckets
+    return {key: {day: format(b, "x") for day, b in sorted(days.items()) if b} for key, days in bits.items()}
+
+
+def dated_occupancy(tt: Optional[Dict[str, Any]]) -> Dict[Key, Dict[str, str]]:
+    """What a timetable's leave adjustments book on single dates: ``(kind, id) -> {date: hex buckets}``."""
+    bits: Dict[Key, Dict[str, int]] = {}
+    for on, overrides in ((tt or {}).get("adjustments") or {}).items():
+        for o in overrides.values():
+            slot = o.get("slot")
+            if not slot:
+                continue
+            # a moved session takes place on its new weekday of the same week
+            when = session_date(on, slot["day"]) if o.get("action") == "move" else on
+            for key in slot_resources(slot):
+                dates = bits.setdefault(key, {})
+                dates[when] = dates.get(when, 0) | slot_buckets(slot)
+    return {key: {d: format(b, "x") for d, b in sorted(dates.items()) if b} for key, dates in bits.items()}
+
+
+def _entry(tt: Dict[str, Any], days: Dict[str, str]) -> Dict[str, Any]:
+    return {"department": tt.get("department"), "semester": tt.get("semester"), "days": days}
+
+
+def timetable_entries(tt: Optional[Dict[str, Any]]) -> Dict[Key, Dict[str, Any]]:
+    """A timetable's entry on each resource it books: weekly ``days`` plus dated ``dates``."""
+    weekly, dated = timetable_occupancy(tt), dated_occupancy(tt)
+    out: Dict[Key, Dict[str, Any]] = {}
+    for key in set(weekly) | set(dated):
+        out[key] = _entry(tt or {}, weekly.get(key, {}))
+        if key in dated:
+            out[key]["dates"] = dated[key]
+    return out
+
+
+def _held(entry: Dict[str, Any], day: str, dates: Iterable[str] = ()) -> int:
+    """Buckets an entry holds every ``day``, plus its dated bookings on ``dates``."""
+    bits = int((entry.get("days") or {}).get(day) or "0", 16)
+    for d in dates:
+        bits |= int((entry.get("dates") or {}).get(d) or "0", 16)
+    return bits
+
+
+async def refresh_occupancy(repo: Repository, tt_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+    """Patch the occupancy documents touched by a timetable write; ``None`` means absent."""
+    await refresh_occupancy_many(repo, [(tt_id, old, new)])
+
+
+async def refresh_occupancy_many(repo: Repository, changes: List[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    """``refresh_occupancy`` for many timetable writes, each resource document written once.
+
+    Only the ``timetables.<id>`` entries that changed are replaced (a merge on those field
+    paths, no read), so concurrent writers on other workers keep each other's bookings."""
+    # resource -> timetable id -> its new entry (``None`` when it no longer books it)
+    touched: Dict[Key, Dict[str, Optional[Dict[str, Any]]]] = {}
+    for tt_id, old, new in changes:
+        # entries carry department and semester, so a timetable that moved is rewritten too
+        before, after = timetable_entries(old), timetable_entries(new)
+        for k in set(before) | set(after):
+            if before.get(k) != after.get(k):
+                touched.setdefault(k, {})[tt_id] = after.get(k)
+    keys = sorted(touched)
+    for i in range(0, len(keys), BATCH_LIMIT):
+        batch = repo.batch()
+        for kind, key in keys[i:i + BATCH_LIMIT]:
+            _merge_bookings(batch, repo, kind, key, touched[(kind, key)])
+        await batch.commit()
+    for key in keys:
+        occupancy_cache.invalidate(key)
+
+
+def _merge_bookings(batch: Any, repo: Repository, kind: str, key: str, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+    # every merged path must be in the data; released bookings are deleted
+    data = {"kind": kind, "key": key, "timetables": {t: delete_field() if e is None else e for t, e in entries.items()}}
+    fields = ["kind", "key"] + [field_path("timetables", t) for t in entries]
+    batch.set(repo.collection(COLLECTION).document(doc_id(kind, key)), data, merge=fields)
+
+
+async def rebuild_occupancy(repo: Repository) -> int:
+    """One full scan to backfill the index for timetables written before it existed."""
+    docs: Dict[Key, Dict[str, Any]] = {}
+    async for tt in repo.stream("timetables", id_field="id"):
+        if tt.get("shards"):
+            await load_slots(repo, [tt])
+        for (kind, key), entry in timetable_entries(tt).items():
+            doc = docs.setdefault((kind, key), {"kind": kind, "key": key, "timetables": {}})
+            doc["timetables"][tt["id"]] = entry
+    stale = [d["id"] async for d in repo.stream(COLLECTION, select=["kind"], id_field="id")]
+    ops = [("delete", i, None) for i in stale if tuple(i.split(":", 1)) not in docs]
+    ops += [("set", doc_id(*k), doc) for k, doc in docs.items()]
+    for i in range(0, len(ops), BATCH_LIMIT):
+        batch = repo.batch()
+        for op, ref_id, doc in ops[i:i + BATCH_LIMIT]:
+            ref = repo.collection(COLLECTION).document(ref_id)
+            if op == "delete":
+                batch.delete(ref)
+            else:
+                batch.set(ref, doc)
+        await batch.commit()
+    occupancy_cache.clear()
+    return len(docs)
+
+
+async def load_occupancy(repo: Repository, keys: Iterable[Key]) -> Dict[Key, Dict[str, Any]]:
+    out: Dict[Key, Dict[str, Any]] = {}
+    missing: List[Key] = []
+    for key in set(keys):
+        doc = occupancy_cache.get(key)
+        if doc is None:
+            missing.append(key)
+        else:
+            out[key] = doc
+    if missing:
+        found = await repo.get_many(COLLECTION, [doc_id(*k) for k in missing])
+        for key in missing:
+            # absent documents are cached too: a resource nobody has booked yet
+            doc = found.get(doc_id(*key)) or {"kind": key[0], "key": key[1], "timetables": {}}
+            occupancy_cache.set(key, doc)
+            out[key] = doc
+    return out
+
+
+def occupied(docs: Dict[Key, Dict[str, Any]], skip: Callable[[str, Dict[str, Any]], bool]) -> Occupied:
+    """Union of the weekly bookings in ``docs`` except the timetables ``skip`` rejects; dated
+    leave adjustments do not block a whole weekly pattern."""
+    out: Occupied = {}
+    for (kind, key), doc in docs.items():
+        bits: Dict[str, int] = {}
+        for tt_id, entry in (doc.get("timetables") or {}).items():
+            if skip(tt_id, entry):
+                continue
+            for day, hexbits in (entry.get("days") or {}).items():
+                bits[day] = bits.get(day, 0) | int(hexbits, 16)
+        if any(bits.values()):
+            out.setdefault(kind, {})[key] = {day: format(b, "x") for day, b in bits.items() if b}
+    return out
+
+
+def merge_occupied(a: Occupied, b: Occupied) -> Occupied:
+    out: Occupied = {kind: {key: dict(days) for key, days in keys.items()} for kind, keys in a.items()}
+    for kind, keys in b.items():
+        for key, days in keys.items():
+            mine = out.setdefault(kind, {}).setdefault(key, {})
+            for day, hexbits in days.items():
+                mine[day] = format(int(mine.get(day) or "0", 16) | int(hexbits, 16), "x")
+    return out
+
+
+async def request_occupancy(
+    repo: Repository,
+    req: ScheduleRequest,
+    replacing: Optional[Set[Tuple[str, Optional[str]]]] = None,
+) -> Occupied:
+    """Capacity other timetables already hold on the resources a request may use.
+
+    Timetables of the request's own department and semester (or of every pair in
+    ``replacing``) are left out: a new generation replaces them rather than competing
+    with them."""
+    keys: List[Key] = []
+    for c in req.courses:
+        keys.append(("faculty", c["facultyId"]))
+        if c.get("batch"):
+            keys.append(("batch", c["batch"]))
+        if c.get("preferredRoomId"):
+            keys.append(("room", c["preferredRoomId"]))
+    keys += [("room", r["id"]) for r in req.rooms if r.get("id")]
+    docs = await load_occupancy(repo, keys)
+    own = replacing or {(req.department, req.semester)}
+    return merge_occupied(req.occupied, occupied(docs, lambda _, e: (e.get("department"), e.get("semester")) in own))
+
+
+async def timetable_occupancy_for(repo: Repository, tt_id: Optional[str], slots: List[Dict[str, Any]]) -> Occupied:
+    """Capacity held by every other timetable on the resources ``slots`` use."""
+    docs = await load_occupancy(repo, [k for s in slots for k in slot_resources(s)])
+    return occupied(docs, lambda other, _: other == tt_id)
+
+
+def pending_occupancy(timetables: Iterable[Dict[str, Any]]) -> Dict[Key, Dict[str, Any]]:
+    """Occupancy documents for timetables that are not stored yet, e.g. one publish payload."""
+    docs: Dict[Key, Dict[str, Any]] = {}
+    for tt in timetables:
+        for (kind, key), entry in timetable_entries(tt).items():
+            doc = docs.setdefault((kind, key), {"kind": kind, "key": key, "timetables": {}})
+            doc["timetables"][tt["id"]] = entry
+    return docs
+
+
+async def external_conflicts(
+    repo: Repository,
+    tt_id: Optional[str],
+    slots: List[Dict[str, Any]],
+    pending: Optional[Dict[Key, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """Slots that collide with bookings held by other stored timetables, or by the
+    other timetables in ``pending`` (see ``pending_occupancy``)."""
+    docs = await load_occupancy(repo, [k for s in slots for k in slot_resources(s)])
+    if pending:
+        docs = {
+            k: {**doc, "timetables": {**(doc.get("timetables") or {}), **(pending.get(k) or {}).get("timetables", {})}}
+            for k, doc in docs.items()
+        }
+    today = date.today().isoformat()
+
+    def upcoming(entry: Dict[str, Any], day: str) -> List[str]:
+        # dated bookings (leave substitutions) still ahead that fall on this weekday
+        return [d for d in entry.get("dates") or {} if d >= today and WEEKDAYS[date.fromisoformat(d).weekday()] == day]
+
+    out: List[Dict[str, Any]] = []
+    for i, s in enumerate(slots):
+        buckets = slot_buckets(s)
+        for kind, key in slot_resources(s):
+            others = sorted(
+                other for other, entry in (docs[(kind, key)].get("timetables") or {}).items()
+                if other != tt_id and _held(entry, s["day"], upcoming(entry, s["day"])) & buckets
+            )
+            if others:
+                out.append({
+                    "type": kind,
+                    "resource": key,
+                    "day": s["day"],
+                    "slotIds": [slot_key(s, i)],
+                    "startTime": s["startTime"],
+                    "endTime": s["endTime"],
+                    "timetableIds": others,
+                })
+    return out
+
+
+def dated_clash(docs: Dict[Key, Dict[str, Any]], tt_id: Optional[str]) -> Clash:
+    """A leave-repair ``clash`` check over loaded occupancy ``docs``: whether a timetable other
+    than ``tt_id`` holds one of the slot's resources at its time, weekly or on one of the dates."""
+
+    def clash(slot: Dict[str, Any], dates: List[str]) -> bool:
+        buckets = slot_buckets(slot)
+        for key in slot_resources(slot):
+            for other, entry in ((docs.get(key) or {}).get("timetables") or {}).items():
+                if other != tt_id and _held(entry, slot["day"], dates) & buckets:
+                    return True
+        return False
+
+    return clash
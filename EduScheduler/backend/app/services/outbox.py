@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import os
+import time
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiosmtplib
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from app.services.bus import node_id
+from app.services.repository import Repository
+
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "outbox"
+POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+ATTEMPTS = int(os.getenv("SMTP_ATTEMPTS", "5"))
+LEASE_SECONDS = float(os.getenv("SMTP_LEASE_SECONDS", "300"))
+# how often pending mail whose lease ran out (its node stopped) is looked for
+SWEEP_SECONDS = float(os.getenv("SMTP_SWEEP_SECONDS", str(LEASE_SECONDS / 2)))
+STATUS_ATTEMPTS = 5
+RETRYABLE = (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError)
+
+
+def smtp_config() -> Optional[Dict[str, Any]]:
+    host, user, password = os.getenv("SMTP_HOST"), os.getenv("SMTP_USER"), os.getenv("SMTP_PASS")
+    if not host or not user or not password:
+        return None
+    port = int(os.getenv("SMTP_PORT", "587"))
+    return {
+        "hostname": host,
+        "port": port,
+        "username": user,
+        "password": password,
+        "use_tls": port == 465,
+        "start_tls": port != 465 and os.getenv("SMTP_STARTTLS", "1") != "0",
+        "sender": os.getenv("SMTP_FROM", user),
+    }
+
+
+class SMTPPool:
+    """A few long-lived, authenticated SMTP connections shared by the outbox worker."""
+
+    def __init__(self, config: Dict[str, Any], size: int = POOL_SIZE) -> None:
+        self.config = config
+        self.size = size
+        self._idle: List[aiosmtplib.SMTP] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _open(self) -> aiosmtplib.SMTP:
+        c = self.config
+        client = aiosmtplib.SMTP(hostname=c["hostname"], port=c["port"], use_tls=c["use_tls"], start_tls=c["start_tls"])
+        await client.connect()
+        await client.login(c["username"], c["password"])
+        return client
+
+    async def send(self, message: EmailMessage) -> None:
+        async with self._slots:
+            client = self._idle.pop() if self._idle else None
+            try:
+                if client is None or not client.is_connected:
+                    client = await self._open()
+                await client.send_message(message)
+            except BaseException:
+                # never hand a connection in an unknown state back to the pool
+                if client is not None:
+                    client.close()
+                raise
+            self._idle.append(client)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for client in idle:
+            try:
+                await client.quit()
+            except Exception:
+                logger.warning("SMTP connection did not close cleanly", exc_info=True)
+                client.close()
+
+
+class Outbox:
+    """Persistent mail queue: ``enqueue`` writes an ``outbox`` document and returns; a background
+    worker sends queued mail over an ``SMTPPool`` with retries. Documents stay ``pending`` until
+    sent and are leased to one node at a time; a periodic sweep takes over pending mail whose
+    lease ran out, so mail left behind by a node that stopped is still sent."""
+
+    def __init__(self) -> None:
+        self.node = node_id()
+        self.repo: Optional[Repository] = None
+        self.pool: Optional[SMTPPool] = None
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        # ids in the local queue, so a sweep does not queue them twice
+        self._queued: Set[str] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def start(self, repo: Repository) -> None:
+        self.repo = repo
+        config = smtp_config()
+        if config is None:
+            return
+        self.pool = SMTPPool(config)
+        self._worker = asyncio.create_task(self._run())
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        for task in (self._worker, self._sweeper):
+            if task is not None:
+                task.cancel()
+        self._worker = self._sweeper = None
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                await self._recover()
+            except Exception:
+                # Firestore unavailable: new mail still flows, old mail waits for the next sweep
+                logger.exception("Outbox sweep failed")
+            await asyncio.sleep(SWEEP_SECONDS)
+
+    async def _recover(self) -> None:
+        now = time.time()
+        for doc in await self.repo.query(COLLECTION, [("status", "==", "pending")], id_field="id"):
+            if doc.get("leaseUntil", 0) < now and doc["id"] not in self._queued:
+                self._push(doc)
+
+    def _push(self, doc: Dict[str, Any]) -> None:
+        self._queued.add(doc["id"])
+        self._queue.put_nowait(doc)
+
+    async def _lease(self, doc: Dict[str, Any]) -> bool:
+        """Take (or renew) the lease on a pending document; ``False`` if another node holds it."""
+        now = time.time()
+
+        def take(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if not current or current.get("status") != "pending":
+                return None
+            if current.get("node") != self.node and current.get("leaseUntil", 0) >= now:
+                return None
+            return {"node": self.node, "leaseUntil": now + LEASE_SECONDS}
+
+        leased = await self.repo.update_if(COLLECTION, doc["id"], take)
+        if leased is not None:
+            doc.update(node=leased["node"], leaseUntil=leased["leaseUntil"], attempts=leased.get("attempts", 0))
+        return leased is not None
+
+    async def enqueue(self, repo: Repository, to: str, subject: str, body: str) -> str:
+        doc = {
+            "id": repo.new_id(COLLECTION),
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "createdAt": time.time(),
+            "node": self.node,
+            "leaseUntil": time.time() + LEASE_SECONDS,
+        }
+        await repo.set(COLLECTION, doc["id"], doc)
+        if self._worker is not None:
+            self._push(doc)
+        return doc["id"]
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for doc in batch:
+                self._queued.discard(doc["id"])
+            # the lease is renewed (or taken) right before sending, so two nodes never send one mail
+            leased = await asyncio.gather(*(self._lease(doc) for doc in batch), return_exceptions=True)
+            for doc, ok in zip(batch, leased):
+                if isinstance(ok, BaseException):
+                    logger.error("Could not lease outbox %s", doc["id"], exc_info=ok)
+            batch = [doc for doc, ok in zip(batch, leased) if ok is True]
+            if not batch:
+                continue
+            results = await asyncio.gather(*(self._deliver(doc) for doc in batch), return_exceptions=True)
+            statuses = []
+            for doc, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    self.failed += 1
+                    logger.warning("Could not send outbox %s: %r", doc["id"], result)
+                    statuses.append((doc["id"], {"status": "failed", "error": str(result)[:500], "attempts": doc["attempts"]}))
+                else:
+                    self.sent += 1
+                    statuses.append((doc["id"], {"status": "sent", "sentAt": time.time(), "attempts": doc["attempts"]}))
+            await self._record(statuses)
+
+    async def _record(self, statuses: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Write delivery results, retrying: mail left ``pending`` is sent again once its lease
+        runs out."""
+        try:
+            async for attempt in AsyncRetrying(stop=stop_after_attempt(STATUS_ATTEMPTS), wait=wait_exponential(multiplier=0.5, max=10), reraise=True):
+                with attempt:
+                    writer = self.repo.batch()
+                    for doc_id, fields in statuses:
+                        writer.set(self.repo.collection(COLLECTION).document(doc_id), fields, merge=True)
+                    await writer.commit()
+        except Exception:
+            logger.exception("Could not record delivery of %d outbox messages; they may be sent again", len(statuses))
+
+    def _message(self, doc: Dict[str, Any]) -> EmailMessage:
+        msg = EmailMessage()
+        msg["From"] = self.pool.config["sender"]
+        msg["To"] = doc["to"]
+        msg["Subject"] = doc["subject"]
+        msg.set_content(doc["body"])
+        return msg
+
+    async def _deliver(self, doc: Dict[str, Any]) -> None:
+        message = self._message(doc)
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(ATTEMPTS),
+            wait=wait_exponential(multiplier=1, max=60),
+            retry=retry_if_exception_type(RETRYABLE),
+            reraise=True,
+        ):
+            with attempt:
+                doc["attempts"] = doc.get("attempts", 0) + 1
+                if doc["attempts"] > 1:
+                    self.retries += 1
+                await self.pool.send(message)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "failed": self.failed, "retries": self.retries}
+
+
+outbox = Outbox()
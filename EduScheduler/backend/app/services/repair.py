@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.conflicts import Availability, slot_key
+from app.services.scheduler.model import TimeGrid, iter_bits
+
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def weekday_dates(dates: List[str], grid: Optional[TimeGrid] = None) -> Dict[str, List[str]]:
+    grid = grid or TimeGrid()
+    out: Dict[str, List[str]] = {}
+    for d in dates:
+        day = date.fromisoformat(d).strftime("%a")
+        if grid.day_index(day) is not None:
+            out.setdefault(day, []).append(d)
+    return out
+
+
+def faculty_day_keys(faculty_id: str, days: List[str]) -> List[str]:
+    return [f"{faculty_id}|{day}" for day in days]
+
+
+def session_date(leave_date: str, day: str) -> str:
+    """The date of ``day`` in the week of ``leave_date`` (where a moved session lands)."""
+    d = date.fromisoformat(leave_date)
+    return (d + timedelta(days=WEEKDAYS.index(day) - d.weekday())).isoformat()
+
+
+# clash(slot, dates): whether another timetable holds one of the slot's resources at its time
+Clash = Callable[[Dict[str, Any], List[str]], bool]
+
+
+def _periods_of(grid: TimeGrid, slot: Dict[str, Any]) -> Tuple[Optional[int], int]:
+    start = grid.period_at(slot["day"], slot["startTime"])
+    mask = grid.interval_mask(slot["day"], slot["startTime"], slot["endTime"])
+    return start, bin(mask).count("1")
+
+
+def repair_timetable(
+    tt: Dict[str, Any],
+    faculty_id: str,
+    dates: List[str],
+    unavailable: Optional[Set[str]] = None,
+    clash: Optional[Clash] = None,
+) -> List[Dict[str, Any]]:
+    """Substitute or move each of ``faculty_id``'s sessions on ``dates``, keeping every other
+    slot fixed. ``clash`` checks candidates against bookings outside this timetable."""
+    grid = TimeGrid()
+    clash = clash or (lambda slot, dates: False)
+    slots: List[Dict[str, Any]] = tt.get("slots") or []
+    by_day = weekday_dates(dates, grid)
+    affected = [
+        i for i, s in enumerate(slots)
+        if s.get("facultyId") == faculty_id and s.get("day") in by_day
+    ]
+    if not affected:
+        return []
+    occ = Availability(slots, grid=grid)
+    away = {faculty_id} | (unavailable or set())
+    leave_days = 0
+    for day in by_day:
+        leave_days |= grid.day_masks[grid.day_index(day)]
+    changes: List[Dict[str, Any]] = []
+    for i in affected:
+        slot = slots[i]
+        mask = occ.masks[i]
+        change = {
+            "timetableId": tt.get("id"),
+            "slotId": slot_key(slot, i),
+            "before": slot,
+        }
+        occ.release(i)
+
+        # 1. substitute: a colleague from the same timetable who is free, preferring one who
+        #    already teaches the course, and not booked by another timetable at that time
+        candidates = [
+            f for f in occ.faculty
+            if f not in away and not occ.faculty[f] & mask
+        ]
+        day_mask = grid.day_masks[grid.day_index(slot["day"])]
+        candidates.sort(key=lambda f: (
+            slot.get("courseCode") not in occ.faculty_courses.get(f, set()),
+            bin(occ.faculty[f] & day_mask).count("1"),
+            f,
+        ))
+        on = by_day[slot["day"]]
+        substitute = next((f for f in candidates if not clash({**slot, "facultyId": f, "roomId": None, "batch": None}, on)), None)
+        if substitute is not None:
+            after = {**slot, "facultyId": substitute, "substituteFor": faculty_id}
+            occ.place(i, after)
+            for d in on:
+                changes.append({**change, "date": d, "action": "substitute", "after": after})
+            continue
+
+        # 2. move: same faculty, batch and room on a day the faculty is not away
+        start, length = _periods_of(grid, slot)
+        moved = None
+        if start is not None and length:
+            busy = occ.faculty.get(slot["facultyId"], 0) | leave_days
+            if slot.get("batch"):
+                busy |= occ.batch.get(slot["batch"], 0)
+            if slot.get("roomId") in occ.room:
+                busy |= occ.room[slot["roomId"]]
+            free = grid.free_starts(~busy & grid.full_mask, length)
+            # stay as close as possible to the original time of day
+            for target in sorted(iter_bits(free), key=lambda p: (abs(p % grid.periods_per_day - start % grid.periods_per_day), p)):
+                new_start, new_end = grid.times(target, length)
+                day = grid.days[grid.day_of(target)]
+                candidate = {**slot, "day": day, "startTime": new_start, "endTime": new_end, "movedFrom": slot["day"]}
+                if not clash(candidate, [session_date(d, day) for d in on]):
+                    moved = candidate
+                    occ.place(i, moved)
+                    break
+        if moved is not None:
+            for d in on:
+                changes.append({**change, "date": d, "action": "move", "after": moved})
+            continue
+
+        occ.place(i, slot)
+        for d in on:
+            changes.append({**change, "date": d, "action": "unresolved", "after": None})
+    return changes
@@ -0,0 +1,181 @@
+import asyncio
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.services.metrics import count_reads, count_writes
+
+
+GET_ALL_CHUNK = 100
+# FieldPath.document_id(), spelled out so importing this module does not load the Firestore SDK
+DOCUMENT_ID = "__name__"
+
+Filter = Tuple[str, str, Any]
+# ``True`` merges every given field; a list of field paths replaces just those fields
+Merge = Union[bool, List[str]]
+
+_SIMPLE_FIELD = re.compile(r"^[_a-zA-Z][_a-zA-Z0-9]*$")
+
+
+def field_path(*parts: str) -> str:
+    """A dotted path to a nested field, quoting parts such as ids that start with a digit."""
+    return ".".join(p if _SIMPLE_FIELD.match(p) else "`" + p.replace("\\", "\\\\").replace("`", "\\`") + "`" for p in parts)
+
+
+def delete_field() -> Any:
+    """Firestore's sentinel that removes a field in ``update`` or a merging ``set``."""
+    from google.cloud.firestore_v1 import DELETE_FIELD
+
+    return DELETE_FIELD
+
+
+class _CountingBatch:
+    """A write batch that reports its writes to the current request span on commit."""
+
+    def __init__(self, batch: Any) -> None:
+        self._batch = batch
+        self._ops = 0
+
+    def __len__(self) -> int:
+        return self._ops
+
+    def set(self, reference: Any, document_data: Dict[str, Any], merge: Merge = False) -> None:
+        self._ops += 1
+        self._batch.set(reference, document_data, merge=merge)
+
+    def update(self, reference: Any, field_updates: Dict[str, Any]) -> None:
+        self._ops += 1
+        self._batch.update(reference, field_updates)
+
+    def delete(self, reference: Any) -> None:
+        self._ops += 1
+        self._batch.delete(reference)
+
+    async def commit(self) -> Any:
+        count_writes(self._ops)
+        return await self._batch.commit()
+
+
+class Repository:
+    """Async data access over a Firestore ``AsyncClient`` (or anything with the same surface,
+    such as ``benchmarks.fake_firestore.FakeFirestore``)."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    def collection(self, name: str):
+        return self.client.collection(name)
+
+    def document(self, path: str):
+        return self.client.document(path)
+
+    def batch(self):
+        return _CountingBatch(self.client.batch())
+
+    def new_id(self, collection: str) -> str:
+        return self.client.collection(collection).document().id
+
+    async def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        snap = await self.client.collection(collection).document(doc_id).get()
+        count_reads()
+        return (snap.to_dict() or {}) if snap.exists else None
+
+    async def get_many(self, collection: str, ids: Iterable[str], chunk: int = GET_ALL_CHUNK) -> Dict[str, Dict[str, Any]]:
+        col = self.client.collection(collection)
+        refs = [col.document(i) for i in dict.fromkeys(ids)]
+
+        async def fetch(part):
+            return [s async for s in self.client.get_all(part)]
+
+        parts = await asyncio.gather(*(fetch(refs[i:i + chunk]) for i in range(0, len(refs), chunk)))
+        count_reads(len(refs))
+        return {s.id: s.to_dict() or {} for part in parts for s in part if s.exists}
+
+    async def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: Merge = False) -> None:
+        await self.client.collection(collection).document(doc_id).set(data, merge=merge)
+        count_writes()
+
+    async def update_if(
+        self,
+        collection: str,
+        doc_id: str,
+        change: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        """Read a document and merge ``change(current)`` into it in one transaction; ``change``
+        returns ``None`` to leave it alone. Returns the document as written, else ``None``."""
+        ref = self.client.collection(collection).document(doc_id)
+
+        async def step(transaction: Any) -> Optional[Dict[str, Any]]:
+            snap = await ref.get(transaction=transaction)
+            current = (snap.to_dict() or {}) if snap.exists else None
+            fields = change(current)
+            if fields is None:
+                return None
+            transaction.set(ref, fields, merge=True)
+            return {**(current or {}), **fields}
+
+        # FakeFirestore brings its own; the SDK's retries the step when the document changed
+        transactional = getattr(self.client, "transactional", None)
+        if transactional is None:
+            from google.cloud.firestore_v1.async_transaction import async_transactional as transactional
+        written = await transactional(step)(self.client.transaction())
+        count_reads()
+        if written is not None:
+            count_writes()
+        return written
+
+    async def delete(self, collection: str, doc_id: str) -> None:
+        await self.client.collection(collection).document(doc_id).delete()
+        count_writes()
+
+    def _query(
+        self,
+        collection: str,
+        filters: Sequence[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        select: Optional[List[str]] = None,
+    ):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        q = self.client.collection(collection)
+        for field, op, value in filters:
+            q = q.where(filter=FieldFilter(field, op, value))
+        if select is not None:
+            q = q.select(select)
+        if order_by:
+            q = q.order_by(order_by)
+        if start_after is not None:
+            q = q.start_after(start_after)
+        if limit:
+            q = q.limit(limit)
+        return q
+
+    async def stream(
+        self,
+        collection: str,
+        filters: Sequence[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        select: Optional[List[str]] = None,
+        id_field: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async for snap in self._query(collection, filters, order_by, limit, start_after, select).stream():
+            count_reads()
+            data = snap.to_dict() or {}
+            if id_field:
+                data[id_field] = snap.id
+            yield data
+
+    async def query(
+        self,
+        collection: str,
+        filters: Sequence[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        select: Optional[List[str]] = None,
+        id_field: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        return [d async for d in self.stream(collection, filters, order_by, limit, start_after, select, id_field)]
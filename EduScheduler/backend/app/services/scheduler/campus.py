@@ -0,0 +1,189 @@
+import os
+import time
+from functools import reduce
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+
+from app.models.schemas import CampusRequest, ScheduleRequest, Timetable
+from app.services.occupancy import merge_occupied
+from app.services.scheduler.model import Assignment, Problem, build_problem, iter_bits, to_timetable
+from app.services.scheduler.pool import process_pool
+from app.services.scheduler.rooms import with_rooms
+from app.services.scheduler.score import rank
+
+
+WORKERS = int(os.getenv("CAMPUS_WORKERS", str(os.cpu_count() or 1)))
+GRID_KEYS = ("days", "dayStart", "dayEnd", "periodMinutes", "sessionMinutes")
+# set on every course to its department's position in the request, so that departments
+# sharing a course code (or a code with no batch) keep their own sessions
+OWNER = "campusDepartment"
+
+
+def components(reqs: List[ScheduleRequest]) -> List[List[int]]:
+    """Groups of department requests linked by a shared faculty member or batch, largest first.
+
+    Rooms are deliberately not edges: every department usually lists the same campus rooms,
+    which would fuse everything into one component. Room contention is settled afterwards."""
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(reqs)))
+    owners: Dict[Tuple[str, str], int] = {}
+    for i, req in enumerate(reqs):
+        for c in req.courses:
+            for key in (("faculty", c["facultyId"]), ("batch", c.get("batch"))):
+                if key[1]:
+                    graph.add_edge(i, owners.setdefault(key, i))
+    parts = [sorted(c) for c in nx.connected_components(graph)]
+    return sorted(parts, key=lambda part: (-sum(len(reqs[i].courses) for i in part), part))
+
+
+def _union(lists: List[List[Dict[str, Any]]], field: str = "id") -> List[Dict[str, Any]]:
+    seen: Dict[Any, Dict[str, Any]] = {}
+    out: List[Dict[str, Any]] = []
+    for items in lists:
+        for item in items:
+            key = item.get(field) or item.get("name")
+            if key is None or key not in seen:
+                seen[key] = item
+                out.append(item)
+    return out
+
+
+def merge(reqs: List[ScheduleRequest], name: str, campus: CampusRequest, time_limit: Optional[float] = None) -> ScheduleRequest:
+    """One request covering several departments; the first one's grid and constraints apply."""
+    first = reqs[0]
+    return ScheduleRequest(
+        department=name,
+        semester=first.semester,
+        year=first.year,
+        constraints=first.constraints,
+        courses=[c for r in reqs for c in r.courses],
+        rooms=_union([r.rooms for r in reqs]),
+        faculty=_union([r.faculty for r in reqs]),
+        batches=_union([r.batches for r in reqs]),
+        use_gemini=False,
+        solver=campus.solver,
+        options=1,
+        seed=campus.seed,
+        time_limit=time_limit,
+        solver_options=first.solver_options,
+        occupied=reduce(merge_occupied, (r.occupied for r in reqs), {}),
+    )
+
+
+def solve_component(payload: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float]:
+    """Runs in a pool process: the slots of the best option for one merged component, each
+    tagged with its owning department."""
+    from app.services.scheduler.engine import generate_timetables
+
+    started = time.perf_counter()
+    req = ScheduleRequest(**payload)
+    options = generate_timetables(req)
+    # slot ids are session ids, and building the same request again gives the same sessions
+    owner = {s.slot_id: s.course[OWNER] for s in build_problem(req).sessions}
+    slots = [{**slot.model_dump(), OWNER: owner[slot.id]} for slot in options[0].slots]
+    return slots, round((time.perf_counter() - started) * 1000, 1)
+
+
+def _periods(problem: Problem, placed: List[List[Dict[str, Any]]]) -> List[Optional[int]]:
+    # component slots map back onto campus sessions by department, course and batch, in
+    # occurrence order
+    queues: Dict[Tuple[int, str, Optional[str]], List[int]] = {}
+    for s in problem.sessions:
+        queues.setdefault((s.course[OWNER], s.course["code"], s.course.get("batch")), []).append(s.index)
+    periods: List[Optional[int]] = [None] * len(problem.sessions)
+    for slots in placed:
+        for slot in slots:
+            queue = queues.get((slot[OWNER], slot["courseCode"], slot.get("batch")))
+            if queue:
+                periods[queue.pop(0)] = problem.grid.period_at(slot["day"], slot["startTime"])
+    return periods
+
+
+def reconcile(problem: Problem, periods: List[Optional[int]]) -> Tuple[Assignment, Dict[str, int]]:
+    """Rooms for the whole campus at once; sessions that lose the contest for a room move to
+    the nearest period where their faculty, batch and a compatible room are all free."""
+    grid = problem.grid
+    assignment = with_rooms(problem, periods)
+    faculty = dict(problem.blocked_faculty)
+    batch = dict(problem.blocked_batch)
+    rooms = [0] * grid.n_periods
+    for r, mask in problem.blocked_room.items():
+        for p in iter_bits(mask):
+            rooms[p] |= 1 << r
+
+    def take(s_index: int, p: int, room: Optional[int]) -> None:
+        s = problem.sessions[s_index]
+        span = grid.span_mask(p, s.duration)
+        faculty[s.faculty] = faculty.get(s.faculty, 0) | span
+        if s.batch is not None:
+            batch[s.batch] = batch.get(s.batch, 0) | span
+        if room is not None:
+            for q in range(p, p + s.duration):
+                rooms[q] |= 1 << room
+
+    for s, placed in zip(problem.sessions, assignment):
+        if placed is not None:
+            take(s.index, *placed)
+    lost = [s for s in problem.sessions if periods[s.index] is not None and assignment[s.index] is None]
+    moved = 0
+    for s in lost:
+        busy = faculty.get(s.faculty, 0) | (batch.get(s.batch, 0) if s.batch is not None else 0)
+        starts = grid.free_starts(~busy & grid.full_mask, s.duration) & s.allowed
+        home = periods[s.index]
+        for p in sorted(iter_bits(starts), key=lambda p: (abs(p - home), p)):
+            free = s.compat
+            for q in range(p, p + s.duration):
+                free &= ~rooms[q]
+            if free:
+                room = (free & -free).bit_length() - 1
+                assignment[s.index] = (p, room)
+                take(s.index, p, room)
+                moved += 1
+                break
+    return assignment, {"roomContested": len(lost), "moved": moved, "unplaced": len(lost) - moved}
+
+
+def generate_campus(req: CampusRequest) -> Dict[str, Any]:
+    started = time.perf_counter()
+    deps = [d.model_copy(update={"courses": [{**c, OWNER: i} for c in d.courses]}) for i, d in enumerate(req.departments)]
+    if len({tuple(str(d.constraints.get(k)) for k in GRID_KEYS) for d in deps}) > 1:
+        raise ValueError("All departments must share one time grid")
+    parts = components(deps)
+    workers = min(len(parts), req.workers or WORKERS)
+    sizes = [sum(len(deps[i].courses) for i in part) for part in parts]
+    limits: List[Optional[float]] = [None] * len(parts)
+    if req.time_limit:
+        # ``time_limit`` bounds the whole call: each component gets its share of the worker-time
+        limits = [min(req.time_limit, req.time_limit * workers * size / max(1, sum(sizes))) for size in sizes]
+    payloads = [
+        merge([deps[i] for i in part], f"component-{n + 1}", req, limits[n]).model_dump()
+        for n, part in enumerate(parts)
+    ]
+    if workers > 1:
+        results = list(process_pool(workers).map(solve_component, payloads))
+    else:
+        results = [solve_component(p) for p in payloads]
+    solved_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    campus = merge(deps, "campus", req)
+    problem = build_problem(campus)
+    assignment, reconciled = reconcile(problem, _periods(problem, [slots for slots, _ in results]))
+
+    timetables: List[Timetable] = []
+    for i, d in enumerate(deps):
+        own = [placed if s.course[OWNER] == i else None for s, placed in zip(problem.sessions, assignment)]
+        tt = to_timetable(problem, own, name=f"Campus-{d.department}-{d.semester or 'S'}", metadata={"generator": f"campus/{req.solver}"})
+        tt.department, tt.semester, tt.year = d.department, d.semester, d.year
+        timetables.extend(rank(d, [tt]))
+    return {
+        "timetables": timetables,
+        "components": [[deps[i].department for i in part] for part in parts],
+        "metadata": {
+            "workers": workers,
+            "componentMs": [ms for _, ms in results],
+            "solveMs": solved_ms,
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 1),
+            **reconciled,
+        },
+    }
@@ -0,0 +1,283 @@
+import random
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.metrics import timed
+from app.services.scheduler.model import Assignment, Problem, Progress, Session, build_problem, iter_bits, to_timetable
+from app.services.scheduler.rooms import with_rooms
+
+
+# seconds of backtracking shared by all options of one request
+DEFAULT_TIME_LIMIT = 2.0
+
+
+class _State:
+    def __init__(self, problem: Problem) -> None:
+        grid = problem.grid
+        self.problem = problem
+        self.faculty = [problem.blocked_faculty.get(f, 0) for f in range(len(problem.faculty_ids))]
+        self.batch = [problem.blocked_batch.get(b, 0) for b in range(len(problem.batch_ids))]
+        all_rooms = (1 << len(problem.rooms)) - 1
+        self.room_free = [all_rooms] * grid.n_periods
+        for r, mask in problem.blocked_room.items():
+            for p in iter_bits(mask):
+                self.room_free[p] &= ~(1 << r)
+        self.load = [[0] * len(grid.days) for _ in problem.faculty_ids]
+        self.course_days: Dict[Tuple[int, int], int] = {}
+        self.batch_day_load = [[0] * len(grid.days) for _ in problem.batch_ids]
+        # occupant lookups used to pick eviction victims while backtracking
+        self.by_faculty: Dict[Tuple[int, int], int] = {}
+        self.by_batch: Dict[Tuple[int, int], int] = {}
+        self.by_room: Dict[Tuple[int, int], int] = {}
+        self.assignment: Assignment = [None] * len(problem.sessions)
+
+    def free_rooms(self, s: Session, period: int) -> int:
+        if not s.needs_room:
+            return -1
+        rooms = s.compat
+        for i in range(s.duration):
+            rooms &= self.room_free[period + i]
+        return rooms
+
+    def within_daily_limit(self, s: Session, starts: int) -> int:
+        limit = self.problem.daily_limit(s.faculty)
+        if limit is not None:
+            load = self.load[s.faculty]
+            for d, day_mask in enumerate(self.problem.grid.day_masks):
+                if load[d] + s.duration > limit:
+                    starts &= ~day_mask
+        return starts
+
+    def candidates(self, s: Session) -> int:
+        grid = self.problem.grid
+        busy = self.faculty[s.faculty]
+        if s.batch is not None:
+            busy |= self.batch[s.batch]
+        return self.within_daily_limit(s, grid.free_starts(~busy & grid.full_mask, s.duration) & s.allowed)
+
+    def place(self, s: Session, period: int, room: Optional[int]) -> None:
+        span = self.problem.grid.span_mask(period, s.duration)
+        self.faculty[s.faculty] |= span
+        d = self.problem.grid.day_of(period)
+        self.load[s.faculty][d] += s.duration
+        key = (id(s.course), d)
+        self.course_days[key] = self.course_days.get(key, 0) + 1
+        for i in range(s.duration):
+            self.by_faculty[(s.faculty, period + i)] = s.index
+        if s.batch is not None:
+            self.batch[s.batch] |= span
+            self.batch_day_load[s.batch][d] += s.duration
+            for i in range(s.duration):
+                self.by_batch[(s.batch, period + i)] = s.index
+        if room is not None:
+            for i in range(s.duration):
+                self.room_free[period + i] &= ~(1 << room)
+                self.by_room[(room, period + i)] = s.index
+        self.assignment[s.index] = (period, room)
+
+    def remove(self, s: Session) -> None:
+        placed = self.assignment[s.index]
+        if placed is None:
+            return
+        period, room = placed
+        span = self.problem.grid.span_mask(period, s.duration)
+        self.faculty[s.faculty] &= ~span
+        d = self.problem.grid.day_of(period)
+        self.load[s.faculty][d] -= s.duration
+        for i in range(s.duration):
+            self.by_faculty.pop((s.faculty, period + i), None)
+        if s.batch is not None:
+            self.batch[s.batch] &= ~span
+            self.batch_day_load[s.batch][d] -= s.duration
+            for i in range(s.duration):
+                self.by_batch.pop((s.batch, period + i), None)
+        if room is not None:
+            for i in range(s.duration):
+                self.room_free[period + i] |= 1 << room
+                self.by_room.pop((room, period + i), None)
+        self.course_days[(id(s.course), d)] -= 1
+        self.assignment[s.index] = None
+
+
+def _pick_room(s: Session, rooms: int) -> Optional[int]:
+    if rooms == -1:
+        return None
+    if s.preferred_room is not None and rooms >> s.preferred_room & 1:
+        return s.preferred_room
+    # rooms are sorted by capacity, so the lowest free bit is the tightest fit
+    return (rooms & -rooms).bit_length() - 1
+
+
+def _period_cost(state: _State, s: Session, period: int, rng: random.Random, avoid: Set[int]) -> float:
+    grid = state.problem.grid
+    d = grid.day_of(period)
+    cost = rng.random()
+    if state.course_days.get((id(s.course), d)):
+        cost += 8.0
+    if s.batch is not None:
+        cost += state.batch_day_load[s.batch][d]
+    if period in avoid:
+        cost += 4.0
+    return cost
+
+
+def _conflicts(state: _State, s: Session, period: int) -> Optional[Set[int]]:
+    victims: Set[int] = set()
+    for i in range(s.duration):
+        p = period + i
+        occupant = state.by_faculty.get((s.faculty, p))
+        if occupant is None and state.faculty[s.faculty] >> p & 1:
+            return None  # pre-blocked capacity cannot be evicted
+        if occupant is not None:
+            victims.add(occupant)
+        if s.batch is not None:
+            occupant = state.by_batch.get((s.batch, p))
+            if occupant is None and state.batch[s.batch] >> p & 1:
+                return None
+            if occupant is not None:
+                victims.add(occupant)
+    if s.needs_room and not state.free_rooms(s, period):
+        best: Optional[Set[int]] = None
+        for r in iter_bits(s.compat):
+            holders: Set[int] = set()
+            for i in range(s.duration):
+                occupant = state.by_room.get((r, period + i))
+                if occupant is None and not state.room_free[period + i] >> r & 1:
+                    holders = None
+                    break
+                if occupant is not None and occupant not in victims:
+                    holders.add(occupant)
+            if holders is not None and (best is None or len(holders) < len(best)):
+                best = holders
+                if not best:
+                    break
+        if best is None:
+            return None
+        victims |= best
+    return victims
+
+
+def _order(problem: Problem, rng: random.Random) -> List[int]:
+    faculty_load: Dict[int, int] = {}
+    batch_load: Dict[int, int] = {}
+    for s in problem.sessions:
+        faculty_load[s.faculty] = faculty_load.get(s.faculty, 0) + s.duration
+        if s.batch is not None:
+            batch_load[s.batch] = batch_load.get(s.batch, 0) + s.duration
+
+    def key(s: Session) -> Tuple[float, ...]:
+        periods = bin(s.allowed).count("1")
+        rooms = bin(s.compat).count("1") if s.needs_room else len(problem.rooms) + 1
+        busy = max(faculty_load[s.faculty], batch_load.get(s.batch, 0) if s.batch is not None else 0)
+        return (periods * rooms / (1 + busy), -s.duration, rng.random())
+
+    return [s.index for s in sorted(problem.sessions, key=key)]
+
+
+@timed("constraint.search")
+def solve(
+    problem: Problem,
+    seed: int = 0,
+    avoid: Optional[List[Set[int]]] = None,
+    max_evictions: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Tuple[Assignment, Dict[str, Any]]:
+    rng = random.Random(seed)
+    state = _State(problem)
+    sessions = problem.sessions
+    queue = _order(problem, rng)
+    queue.reverse()  # pop() from the end
+    budget = max_evictions if max_evictions is not None else 2 * len(sessions) + 100
+    evictions = 0
+    tabu: Dict[int, int] = {}
+    unscheduled: List[int] = []
+
+    while queue:
+        s = sessions[queue.pop()]
+        options = state.candidates(s)
+        best = None
+        best_cost = 0.0
+        s_avoid = avoid[s.index] if avoid else set()
+        for period in iter_bits(options):
+            rooms = state.free_rooms(s, period)
+            if rooms == 0:
+                continue
+            cost = _period_cost(state, s, period, rng, s_avoid)
+            if best is None or cost < best_cost:
+                best, best_cost = (period, _pick_room(s, rooms)), cost
+        if best is not None:
+            state.place(s, *best)
+            continue
+
+        out_of_time = deadline is not None and time.perf_counter() > deadline
+        if evictions >= budget or out_of_time or s.compat == 0 and s.needs_room:
+            unscheduled.append(s.index)
+            continue
+        # backtrack: take the period that evicts the fewest placed sessions
+        target = None
+        for period in iter_bits(state.within_daily_limit(s, s.allowed)):
+            victims = _conflicts(state, s, period)
+            if victims is None or tabu.get(s.index) in victims:
+                continue
+            if target is None or len(victims) < len(target[1]) or (len(victims) == len(target[1]) and rng.random() < 0.5):
+                target = (period, victims)
+        if target is None:
+            unscheduled.append(s.index)
+            continue
+        period, victims = target
+        for v in victims:
+            state.remove(sessions[v])
+            tabu[v] = s.index
+            queue.append(v)
+        evictions += len(victims)
+        state.place(s, period, _pick_room(s, state.free_rooms(s, period)))
+
+    stats = {
+        "evictions": evictions,
+        "unscheduled": [sessions[i].slot_id for i in unscheduled if state.assignment[i] is None],
+    }
+    return state.assignment, stats
+
+
+def generate(req: ScheduleRequest, problem: Optional[Problem] = None, progress: Optional[Progress] = None) -> List[Timetable]:
+    problem = problem or build_problem(req)
+    n_options = max(1, req.options)
+    budget = req.time_limit or DEFAULT_TIME_LIMIT
+    base_seed = req.seed if req.seed is not None else 0
+    avoid: List[Set[int]] = [set() for _ in problem.sessions]
+    options: List[Timetable] = []
+    first: Optional[Assignment] = None
+    for variant in range(n_options):
+        started = time.perf_counter()
+        deadline = started + budget / n_options
+        assignment, stats = solve(problem, seed=base_seed + variant, avoid=avoid, deadline=deadline)
+        # the search takes whichever room is free; re-match rooms per period unless that rooms fewer
+        matched = with_rooms(problem, [a[0] if a is not None else None for a in assignment])
+        if sum(a is not None for a in matched) >= sum(a is not None for a in assignment):
+            assignment = matched
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for s, placed in zip(problem.sessions, assignment):
+            if placed is not None:
+                avoid[s.index].add(placed[0])
+        if first is None:
+            first = assignment
+            diversity = 0.0
+        else:
+            moved = sum(1 for a, b in zip(first, assignment) if a != b)
+            diversity = moved / max(1, len(assignment))
+        options.append(to_timetable(
+            problem,
+            assignment,
+            name=f"Auto-{req.department}-{req.semester or 'S'}-opt{variant + 1}",
+            metadata={
+                "generator": "constraint",
+                "seed": base_seed + variant,
+                "elapsedMs": round(elapsed_ms, 2),
+                "diversity": round(diversity, 3),
+                **stats,
+            },
+        ))
+        if progress is not None:
+            progress((variant + 1) / n_options, options)
+    return options
@@ -1,62 +1,129 @@
-from typing import List
-from app.models.schemas import ScheduleRequest, Timetable, TimetableSlot
-from app.services.scheduler.gemini import generate_with_gemini
-
-
-DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
-
-
-def _heuristic(req: ScheduleRequest) -> List[Timetable]:
-    options: List[Timetable] = []
-    for variant in range(2):
-        slots: List[TimetableSlot] = []
-        hour = 9 + variant
-        day_index = 0
-        faculty_index: set[str] = set()
-        batch_index: set[str] = set()
-        for course in req.courses:
-            for _ in range(course.get("perWeek", 2)):
-                day = DAYS[day_index % len(DAYS)]
-                start = f"{hour:02d}:00"
-                end = f"{hour:02d}:50"
-                slots.append(TimetableSlot(
-                    day=day,
-                    startTime=start,
-                    endTime=end,
-                    courseCode=course["code"],
-                    courseName=course["name"],
-                    facultyId=course["facultyId"],
-                    roomId=course.get("preferredRoomId", "AUTO"),
-                    batch=course.get("batch"),
-                    resources=course.get("resources", []),
-                ))
-                faculty_index.add(course["facultyId"])
-                if course.get("batch"):
-                    batch_index.add(course["batch"])
-                hour += 2
-                if hour >= 17:
-                    hour = 9 + variant
-                    day_index += 1
-        options.append(Timetable(
-            name=f"Auto-{req.department}-{req.semester or 'S'}-opt{variant+1}",
-            department=req.department,
-            semester=req.semester,
-            year=req.year,
-            slots=slots,
-            facultyIndex=sorted(list(faculty_index)),
-            batchIndex=sorted(list(batch_index)),
-            metadata={"generator": "heuristic"},
-        ))
-    return options
-
-
-def generate_timetables(req: ScheduleRequest) -> List[Timetable]:
-    if req.use_gemini:
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.metrics import phase
+from app.services.scheduler.model import Progress, build_problem
+from app.services.scheduler.registry import get_generator
+from app.services.scheduler.score import rank
+from app.services.scheduler.validate import hard_violations
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = float(os.getenv("GENERATE_BUDGET", "10"))
+
+# remote calls get their own threads so an abandoned one never holds up loop shutdown
+_remote_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini")
+
+
+def _gemini_enabled(req: ScheduleRequest, settings: Optional[Dict[str, Any]]) -> bool:
+    return req.use_gemini and (settings or {}).get("geminiEnabled", True) and bool(os.getenv("GEMINI_API_KEY"))
+
+
+def generate_timetables(
+    req: ScheduleRequest,
+    settings: Optional[Dict[str, Any]] = None,
+    progress: Optional[Progress] = None,
+) -> List[Timetable]:
+    if req.solver == "auto" and _gemini_enabled(req, settings):
+        with phase("solver.hedged"):
+            options = _run_hedged(req, progress)
+    else:
+        solver = req.solver if req.solver in ("ilp", "evolution") else "constraint"
+        with phase(f"solver.{solver}"):
+            options = get_generator(solver)(req, progress=progress)
+    return rank(req, options)
+
+
+def _run_hedged(req: ScheduleRequest, progress: Optional[Progress]) -> List[Timetable]:
+    # jobs and scripts call in without an event loop; a caller inside one gets a loop of its own
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(generate_hedged(req, progress))
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="hedge") as pool:
+        return pool.submit(asyncio.run, generate_hedged(req, progress)).result()
+
+
+async def generate_timetables_async(req: ScheduleRequest, settings: Optional[Dict[str, Any]] = None) -> List[Timetable]:
+    if req.solver == "auto" and _gemini_enabled(req, settings):
+        with phase("solver.hedged"):
+            options = await generate_hedged(req)
+        return rank(req, options)
+    return await asyncio.to_thread(generate_timetables, req, settings)
+
+
+def _timed(fn, *args) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+async def generate_hedged(req: ScheduleRequest, progress: Optional[Progress] = None) -> List[Timetable]:
+    """Race the constraint engine against Gemini within ``req.budget`` seconds.
+
+    A Gemini answer is taken as soon as it arrives with at least one option free of hard
+    violations; otherwise the local result is used once the budget runs out or Gemini fails.
+    ``progress`` follows the constraint engine.
+    """
+    budget = req.budget or DEFAULT_BUDGET
+    problem = build_problem(req)
+    deadline = time.monotonic() + budget
+    local = asyncio.ensure_future(asyncio.to_thread(_timed, partial(get_generator("constraint"), progress=progress), req, problem))
+    # a cancelled job stops the local engine through ``progress``; that is fine once Gemini won
+    local.add_done_callback(lambda f: f.cancelled() or f.exception())
+    remote = asyncio.get_running_loop().run_in_executor(_remote_pool, _timed, get_generator("gemini"), req, budget)
+    # a call abandoned at the deadline may still fail later; mark that as seen
+    remote.add_done_callback(lambda f: f.cancelled() or f.exception())
+    timings: Dict[str, Optional[float]] = {"constraint": None, "gemini": None}
+    status, violations = "timeout", 0
+    chosen: Optional[List[Timetable]] = None
+
+    pending = {local, remote}
+    while remote in pending:
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        if remote not in done:
+            continue
         try:
-            gemini_options = generate_with_gemini(req)
-            if gemini_options:
-                return gemini_options
-        except Exception:
-            pass
-    return _heuristic(req)
+            options, timings["gemini"] = remote.result()
+        except Exception as exc:
+            logger.warning("Gemini generation failed: %r", exc)
+            status = f"error: {type(exc).__name__}"
+            break
+        if not options:
+            status = "empty"
+            break
+        checked = [(o, hard_violations(problem, o)) for o in options]
+        valid = [o for o, v in checked if not v]
+        violations = sum(len(v) for _, v in checked)
+        if valid:
+            status, chosen = "valid", valid
+        else:
+            status = "invalid"
+        break
 
+    if chosen is None:
+        # the local engine has its own deadline, so waiting past the budget is bounded
+        chosen, timings["constraint"] = await local
+        winner = "constraint"
+    else:
+        winner = "gemini"
+        if local.done() and not local.exception():
+            timings["constraint"] = local.result()[1]
+    hedge = {
+        "winner": winner,
+        "budgetMs": round(budget * 1000),
+        "timings": timings,
+        "gemini": status,
+        "geminiViolations": violations,
+    }
+    for o in chosen:
+        o.metadata = {**o.metadata, "hedge": hedge}
+    return chosen
@@ -0,0 +1,363 @@
+import os
+import random
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from deap import base, creator, tools
+
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.metrics import phase
+from app.services.scheduler import constraint
+from app.services.scheduler.model import Assignment, Problem, Progress, build_problem, iter_bits, to_timetable
+from app.services.scheduler.pool import process_pool
+from app.services.scheduler.rooms import with_rooms
+
+
+DEFAULT_TIME_LIMIT = 10.0
+HARD = 1000.0
+# at most this much of the time limit goes to the constraint-engine seed, capped at SEED_SECONDS
+SEED_SHARE = 0.1
+SEED_SECONDS = 0.5
+SOFT = {"gap": 2.0, "backToBack": 1.0, "sameDay": 3.0, "dailyExcess": 50.0}
+
+if not hasattr(creator, "TimetableFitness"):
+    creator.create("TimetableFitness", base.Fitness, weights=(-1.0,))
+    creator.create("TimetableGenome", list, fitness=creator.TimetableFitness)
+
+
+@dataclass
+class Arrays:
+    # flat NumPy view of a Problem; genomes hold one start period per session
+    n_periods: int
+    periods_per_day: int
+    n_days: int
+    allowed: np.ndarray  # (sessions, periods) bool
+    allowed_lists: List[np.ndarray]
+    rep: np.ndarray  # session index for every occupied period of a session
+    offset: np.ndarray  # period offset inside the session for ``rep``
+    faculty: np.ndarray
+    batch: np.ndarray  # -1 when the session has no batch
+    course: np.ndarray
+    duration: np.ndarray
+    room_class: np.ndarray  # -1 when the session needs no room
+    class_capacity: np.ndarray
+    n_faculty: int
+    n_batches: int
+    n_courses: int
+    daily_limit: np.ndarray  # per faculty, large when unlimited
+
+
+def build_arrays(problem: Problem) -> Arrays:
+    grid = problem.grid
+    sessions = problem.sessions
+    n, P = len(sessions), grid.n_periods
+    allowed = np.zeros((n, P), dtype=bool)
+    for s in sessions:
+        blocked = problem.blocked_faculty.get(s.faculty, 0)
+        if s.batch is not None:
+            blocked |= problem.blocked_batch.get(s.batch, 0)
+        starts = grid.free_starts(~blocked & grid.full_mask, s.duration) & s.allowed
+        for p in iter_bits(starts):
+            allowed[s.index, p] = True
+    allowed_lists = [np.flatnonzero(row) if row.any() else np.arange(P) for row in allowed]
+    durations = np.array([s.duration for s in sessions], dtype=np.int64)
+    rep = np.repeat(np.arange(n), durations)
+    offset = np.concatenate([np.arange(d) for d in durations]) if n else np.zeros(0, dtype=np.int64)
+    # sessions with identical room requirements compete for the same rooms
+    classes: Dict[Tuple[bool, int], int] = {}
+    room_class = np.full(n, -1, dtype=np.int64)
+    capacity: List[int] = []
+    for s in sessions:
+        if not s.needs_room:
+            continue
+        key = (s.needs_room, s.compat)
+        if key not in classes:
+            classes[key] = len(capacity)
+            capacity.append(bin(s.compat).count("1"))
+        room_class[s.index] = classes[key]
+    courses: Dict[int, int] = {}
+    course = np.array([courses.setdefault(id(s.course), len(courses)) for s in sessions], dtype=np.int64)
+    limits = np.array([
+        problem.daily_limit(f) if problem.daily_limit(f) is not None else grid.periods_per_day
+        for f in range(len(problem.faculty_ids))
+    ], dtype=np.int64)
+    return Arrays(
+        n_periods=P,
+        periods_per_day=grid.periods_per_day,
+        n_days=len(grid.days),
+        allowed=allowed,
+        allowed_lists=allowed_lists,
+        rep=rep,
+        offset=offset,
+        faculty=np.array([s.faculty for s in sessions], dtype=np.int64),
+        batch=np.array([-1 if s.batch is None else s.batch for s in sessions], dtype=np.int64),
+        course=course,
+        duration=durations,
+        room_class=room_class,
+        class_capacity=np.array(capacity, dtype=np.int64),
+        n_faculty=len(problem.faculty_ids),
+        n_batches=len(problem.batch_ids),
+        n_courses=len(courses),
+        daily_limit=limits,
+    )
+
+
+def _duplicates(keys: np.ndarray) -> np.ndarray:
+    # number of repeated keys per row, i.e. clashing occupancy entries
+    if keys.shape[1] < 2:
+        return np.zeros(keys.shape[0], dtype=np.int64)
+    ordered = np.sort(keys, axis=1)
+    same = ordered[:, 1:] == ordered[:, :-1]
+    valid = ordered[:, 1:] >= 0
+    return (same & valid).sum(axis=1)
+
+
+def _counts(keys: np.ndarray, size: int) -> np.ndarray:
+    pop = keys.shape[0]
+    flat = keys + (np.arange(pop) * size)[:, None]
+    return np.bincount(flat[keys >= 0].ravel(), minlength=pop * size).reshape(pop, size)
+
+
+def fitness(arrays: Arrays, genomes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    a = arrays
+    pop, n = genomes.shape
+    P, ppd, D = a.n_periods, a.periods_per_day, a.n_days
+    if n == 0:
+        return np.zeros(pop), np.zeros(pop)
+    occupied = genomes[:, a.rep] + a.offset
+    hard = np.zeros(pop)
+    hard += (~a.allowed[np.arange(n), genomes]).sum(axis=1)
+    hard += _duplicates(a.faculty[a.rep] * P + occupied)
+    batch_rep = a.batch[a.rep]
+    batch_keys = np.where(batch_rep >= 0, batch_rep * P + occupied, -1)
+    hard += _duplicates(batch_keys)
+    if len(a.class_capacity):
+        class_rep = a.room_class[a.rep]
+        class_keys = np.where(class_rep >= 0, class_rep * P + occupied, -1)
+        demand = _counts(class_keys, len(a.class_capacity) * P).reshape(pop, -1, P)
+        hard += np.maximum(0, demand - a.class_capacity[None, :, None]).sum(axis=(1, 2))
+
+    days = genomes // ppd
+    load = np.zeros((pop, a.n_faculty * D))
+    np.add.at(load, (np.arange(pop)[:, None], a.faculty * D + days), a.duration)
+    excess = np.maximum(0, load.reshape(pop, a.n_faculty, D) - a.daily_limit[None, :, None]).sum(axis=(1, 2))
+    soft = SOFT["dailyExcess"] * excess
+
+    same_day = _counts(a.course * D + days, a.n_courses * D)
+    soft += SOFT["sameDay"] * np.maximum(0, same_day - 1).sum(axis=1)
+
+    fac_grid = _counts(a.faculty[a.rep] * P + occupied, a.n_faculty * P).reshape(pop, a.n_faculty, D, ppd) > 0
+    soft += SOFT["backToBack"] * (fac_grid[..., 1:] & fac_grid[..., :-1]).sum(axis=(1, 2, 3))
+    if a.n_batches:
+        batch_grid = _counts(batch_keys, a.n_batches * P).reshape(pop, a.n_batches, D, ppd) > 0
+        busy = batch_grid.sum(axis=3)
+        idx = np.arange(ppd)
+        first = np.where(batch_grid, idx, ppd).min(axis=3)
+        last = np.where(batch_grid, idx, -1).max(axis=3)
+        span = np.where(busy > 0, last - first + 1, 0)
+        soft += SOFT["gap"] * (span - busy).sum(axis=(1, 2))
+    return HARD * hard + soft, hard
+
+
+def _mutate(genome: List[int], arrays: Arrays, indpb: float, rng: random.Random) -> None:
+    for i in range(len(genome)):
+        if rng.random() < indpb:
+            choices = arrays.allowed_lists[i]
+            genome[i] = int(choices[rng.randrange(len(choices))])
+
+
+def _local_search(genome: List[int], arrays: Arrays, rng: random.Random, rounds: int, neighbours: int) -> List[int]:
+    # memetic step: evaluate a batch of single-session moves at once and keep the best
+    current = np.array(genome, dtype=np.int64)
+    best_score, _ = fitness(arrays, current[None, :])
+    n = len(current)
+    for _ in range(rounds):
+        cand = np.repeat(current[None, :], neighbours, axis=0)
+        which = [rng.randrange(n) for _ in range(neighbours)]
+        for row, i in enumerate(which):
+            choices = arrays.allowed_lists[i]
+            cand[row, i] = choices[rng.randrange(len(choices))]
+        scores, _ = fitness(arrays, cand)
+        k = int(np.argmin(scores))
+        if scores[k] < best_score[0]:
+            current, best_score = cand[k], scores[k:k + 1]
+    return current.tolist()
+
+
+def _clone(ind: Any) -> Any:
+    copy = creator.TimetableGenome(ind)
+    copy.fitness.values = ind.fitness.values
+    return copy
+
+
+def _evaluate(population: List[Any], arrays: Arrays) -> None:
+    if not population:
+        return
+    scores, _ = fitness(arrays, np.array(population, dtype=np.int64))
+    for ind, score in zip(population, scores):
+        ind.fitness.values = (float(score),)
+
+
+def evolve_island(
+    arrays: Arrays,
+    population: List[List[int]],
+    generations: int,
+    seed: int,
+    params: Dict[str, float],
+    seconds: float,
+) -> List[Tuple[float, List[int]]]:
+    # a duration, not a deadline: perf_counter readings do not carry across processes
+    deadline = time.perf_counter() + seconds
+    rng = random.Random(seed)
+    random.seed(seed)  # deap's operators draw from the global generator
+    pop = [creator.TimetableGenome(g) for g in population]
+    _evaluate(pop, arrays)
+    cxpb, mutpb, indpb = params["crossover"], params["mutation"], params["geneMutation"]
+    for _ in range(generations):
+        if time.perf_counter() > deadline:
+            break
+        elite = [_clone(e) for e in tools.selBest(pop, int(params["elite"]))]
+        offspring = [creator.TimetableGenome(ind) for ind in tools.selTournament(pop, len(pop) - len(elite), tournsize=3)]
+        for a, b in zip(offspring[::2], offspring[1::2]):
+            if rng.random() < cxpb:
+                tools.cxUniform(a, b, 0.5)
+        for ind in offspring:
+            if rng.random() < mutpb:
+                _mutate(ind, arrays, indpb, rng)
+        _evaluate(offspring, arrays)
+        best = tools.selBest(offspring + elite, 1)[0]
+        improved = creator.TimetableGenome(_local_search(best, arrays, rng, int(params["localRounds"]), int(params["neighbours"])))
+        _evaluate([improved], arrays)
+        pop = elite + offspring
+        worst = max(range(len(pop)), key=lambda i: pop[i].fitness.values[0])
+        pop[worst] = improved
+    return sorted(((ind.fitness.values[0], list(ind)) for ind in pop), key=lambda x: x[0])
+
+
+def _decode(problem: Problem, genome: List[int]) -> Assignment:
+    # the genome fixes start periods; rooms come from a matching per start period
+    return with_rooms(problem, genome)
+
+
+def _diverse(ranked: List[Tuple[float, List[int]]], k: int, min_distance: int) -> List[Tuple[float, List[int]]]:
+    chosen: List[Tuple[float, List[int]]] = []
+    for score, genome in ranked:
+        arr = np.array(genome)
+        if all(int((arr != np.array(g)).sum()) >= min_distance for _, g in chosen):
+            chosen.append((score, genome))
+            if len(chosen) == k:
+                break
+    return chosen
+
+
+def generate(
+    req: ScheduleRequest,
+    problem: Optional[Problem] = None,
+    executor: Optional[Executor] = None,
+    progress: Optional[Progress] = None,
+) -> List[Timetable]:
+    started = time.perf_counter()
+    problem = problem or build_problem(req)
+    opts = req.solver_options
+    seed = req.seed if req.seed is not None else 0
+    time_limit = req.time_limit or DEFAULT_TIME_LIMIT
+    deadline = started + time_limit
+    cpus = os.cpu_count() or 1
+    n_islands = max(1, int(opts.get("islands", cpus)))
+    pop_size = max(4, int(opts.get("population", 60)))
+    generations = max(1, int(opts.get("generations", 200)))
+    interval = max(1, int(opts.get("migrationInterval", 20)))
+    migrants = max(0, int(opts.get("migrants", 2)))
+    params = {
+        "crossover": float(opts.get("crossover", 0.7)),
+        "mutation": float(opts.get("mutation", 0.3)),
+        "geneMutation": float(opts.get("geneMutation", 2.0 / max(1, len(problem.sessions)))),
+        "elite": max(1, int(opts.get("elite", 2))),
+        "localRounds": int(opts.get("localRounds", 3)),
+        "neighbours": int(opts.get("neighbours", 16)),
+    }
+    arrays = build_arrays(problem)
+
+    # one constraint-engine solution seeds every island (mutated, past the first) next to random
+    # genomes; solving once keeps the seeding inside the time limit however many islands there are
+    rng = random.Random(seed)
+    warm, _ = constraint.solve(problem, seed=seed, deadline=min(deadline, started + min(SEED_SECONDS, SEED_SHARE * time_limit)))
+    seeded = [placed[0] if placed else int(arrays.allowed_lists[s][0]) for s, placed in enumerate(warm)]
+    islands: List[List[List[int]]] = []
+    for i in range(n_islands):
+        first = list(seeded)
+        if i:
+            _mutate(first, arrays, params["geneMutation"], rng)
+        members = [first]
+        while len(members) < pop_size:
+            members.append([int(c[rng.randrange(len(c))]) for c in arrays.allowed_lists])
+        islands.append(members)
+
+    if executor is None and n_islands > 1 and cpus > 1:
+        executor = process_pool(min(n_islands, cpus))
+    epochs = 0
+    done = 0
+    results: List[List[Tuple[float, List[int]]]] = []
+    while done < generations and time.perf_counter() < deadline:
+        gens = min(interval, generations - done)
+        remaining = deadline - time.perf_counter()
+        args = [(arrays, isl, gens, seed * 7919 + i * 104729 + epochs, params, remaining) for i, isl in enumerate(islands)]
+        with phase("evolution.epoch"):
+            if executor is not None:
+                futures = [executor.submit(evolve_island, *a) for a in args]
+                results = [f.result() for f in futures]
+            else:
+                results = [evolve_island(*a) for a in args]
+        done += gens
+        epochs += 1
+        # ring migration: each island's best replace the next island's worst
+        islands = [[g for _, g in r] for r in results]
+        if n_islands > 1 and migrants:
+            for i, r in enumerate(results):
+                target = islands[(i + 1) % n_islands]
+                target[-migrants:] = [list(g) for _, g in r[:migrants]]
+        if progress is not None:
+            score, genome = min((x for r in results for x in r), key=lambda x: x[0])
+            best = to_timetable(
+                problem,
+                _decode(problem, genome),
+                name=f"GA-{req.department}-{req.semester or 'S'}-best",
+                metadata={"generator": "evolution", "fitness": score, "generations": done},
+            )
+            progress(min(done / generations, 0.99), [best])
+
+    if not results:
+        results = [evolve_island(arrays, isl, 0, seed, params, 0.0) for isl in islands]
+    ranked = sorted((x for r in results for x in r), key=lambda x: x[0])
+    min_distance = max(1, int(float(opts.get("minDiversity", 0.1)) * len(problem.sessions)))
+    chosen = _diverse(ranked, max(1, req.options), min_distance)
+    while len(chosen) < req.options and min_distance > 1:
+        min_distance //= 2
+        chosen = _diverse(ranked, req.options, min_distance)
+    _, hard = fitness(arrays, np.array([g for _, g in chosen], dtype=np.int64).reshape(len(chosen), -1))
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    options: List[Timetable] = []
+    for rank, ((score, genome), violations) in enumerate(zip(chosen, hard)):
+        assignment = _decode(problem, genome)
+        options.append(to_timetable(
+            problem,
+            assignment,
+            name=f"GA-{req.department}-{req.semester or 'S'}-opt{rank + 1}",
+            metadata={
+                "generator": "evolution",
+                "seed": seed,
+                "rank": rank + 1,
+                "fitness": score,
+                "hardViolations": int(violations),
+                "islands": n_islands,
+                "generations": done,
+                "epochs": epochs,
+                "elapsedMs": elapsed_ms,
+                "unscheduled": [s.slot_id for s, placed in zip(problem.sessions, assignment) if placed is None],
+            },
+        ))
+    return options
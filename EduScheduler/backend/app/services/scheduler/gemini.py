@@ -1,7 +1,25 @@
+import hashlib
+import json
 import os
-from typing import List
-import google.generativeai as genai
+import re
+import tempfile
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 from app.models.schemas import ScheduleRequest, Timetable, TimetableSlot
+from app.services.cache import TTLCache
+from app.services.metrics import timed
+
+
+MODEL_NAME = "gemini-1.5-flash"
+CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", "3600"))
+CACHE_DIR = os.getenv("GEMINI_CACHE_DIR")
+
+_cache = TTLCache(maxsize=int(os.getenv("GEMINI_CACHE_SIZE", "128")), ttl=CACHE_TTL)
+
+
+class _NoOptions(Exception):
+    pass
 
 
 def _to_prompt(req: ScheduleRequest) -> str:
@@ -16,14 +34,8 @@ def _to_prompt(req: ScheduleRequest) -> str:
     )
 
 
-def generate_with_gemini(req: ScheduleRequest) -> List[Timetable]:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return []
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    prompt = _to_prompt(req)
-    content = {
+def _content(req: ScheduleRequest) -> Dict[str, Any]:
+    return {
         "department": req.department,
         "semester": req.semester,
         "year": req.year,
@@ -33,17 +45,77 @@ def generate_with_gemini(req: ScheduleRequest) -> List[Timetable]:
         "faculty": req.faculty,
         "batches": req.batches,
     }
-    response = model.generate_content([prompt, {"mime_type": "application/json", "text": str(content)}])
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def request_key(req: ScheduleRequest) -> str:
+    content = _content(req)
+    # list order carries no meaning for the model's answer, so it must not change the key
+    for field in ("courses", "rooms", "faculty", "batches"):
+        content[field] = sorted(content[field] or [], key=_canonical)
+    raw = _canonical({"model": MODEL_NAME, "prompt": _to_prompt(req), "content": content})
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+@lru_cache(maxsize=4)
+def _model(api_key: str) -> Any:
+    # the SDK is slow to import; only pay for it once Gemini is actually called
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(MODEL_NAME)
+
+
+def _disk_path(key: str) -> Optional[str]:
+    return os.path.join(CACHE_DIR, f"{key}.json") if CACHE_DIR else None
+
+
+def _disk_get(key: str) -> Optional[List[Dict[str, Any]]]:
+    path = _disk_path(key)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("expires", 0) <= time.time():
+        return None
+    return entry.get("options")
+
+
+def _disk_put(key: str, options: List[Dict[str, Any]]) -> None:
+    path = _disk_path(key)
+    if not path:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"expires": time.time() + CACHE_TTL, "options": options}, f, default=str)
+    os.replace(tmp, path)
+
+
+@timed("gemini.call")
+def _call(req: ScheduleRequest, api_key: str, timeout: Optional[float]) -> List[Dict[str, Any]]:
+    model = _model(api_key)
+    prompt = _to_prompt(req)
+    request_options = {"timeout": timeout} if timeout else None
+    response = model.generate_content(
+        [prompt, {"mime_type": "application/json", "text": str(_content(req))}],
+        request_options=request_options,
+    )
     text = response.text or ""
     # Robust JSON extraction
-    import json, re
     json_text = text
     m = re.search(r"\{[\s\S]*\}", text)
     if m:
         json_text = m.group(0)
     data = json.loads(json_text)
     options_data = data.get("options", [])
-    options: List[Timetable] = []
+    options: List[Dict[str, Any]] = []
     for opt in options_data:
         slots = [TimetableSlot(**s) for s in opt.get("slots", [])]
         options.append(Timetable(
@@ -55,6 +127,38 @@ def generate_with_gemini(req: ScheduleRequest) -> List[Timetable]:
             facultyIndex=sorted(list({s.facultyId for s in slots})),
             batchIndex=sorted(list({s.batch for s in slots if s.batch})),
             metadata={"generator": "gemini"},
-        ))
+        ).model_dump())
     return options
 
+
+def generate_with_gemini(req: ScheduleRequest, timeout: Optional[float] = None) -> List[Timetable]:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return []
+    key = request_key(req)
+    fresh = False
+
+    def load() -> List[Dict[str, Any]]:
+        nonlocal fresh
+        options = _disk_get(key)
+        if options is None:
+            options = _call(req, api_key, timeout)
+            if not options:
+                # an empty answer is not worth remembering
+                raise _NoOptions()
+            fresh = True
+            try:
+                _disk_put(key, options)
+            except OSError:
+                pass
+        return options
+
+    try:
+        options = _cache.get_or_load(key, load)
+    except _NoOptions:
+        return []
+    # hand out copies: callers are free to mutate what they get back
+    return [
+        Timetable(**{**o, "metadata": {**o.get("metadata", {}), "cacheKey": key, "cacheHit": not fresh}})
+        for o in options
+    ]
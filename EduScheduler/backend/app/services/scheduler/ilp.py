@@ -0,0 +1,360 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pulp
+
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.metrics import phase, timed
+from app.services.scheduler import constraint
+from app.services.scheduler.model import Assignment, Problem, Progress, build_problem, iter_bits, to_timetable
+from app.services.scheduler.rooms import with_rooms
+
+
+DEFAULT_TIME_LIMIT = 10.0
+UNSCHEDULED_PENALTY = 1000.0
+# CBC counts its time limit from the start of branch and bound; this much of each option's budget
+# is left for reading the model and solving the root LP
+ROOT_MARGIN = 1.0
+WEIGHTS = {"backToBack": 1.0, "gap": 2.0, "balance": 1.0, "sameDay": 3.0, "repeat": 0.5}
+
+
+def _room_types(problem: Problem) -> Tuple[List[List[int]], List[int]]:
+    # identical rooms collapse into one type so the model counts rooms instead of naming them;
+    # preferred rooms stay singleton types so the preference survives
+    preferred = {s.preferred_room for s in problem.sessions if s.preferred_room is not None}
+    groups: Dict[Any, List[int]] = {}
+    for r, room in enumerate(problem.rooms):
+        key = ("room", r) if r in preferred else (room.get("capacity"), tuple(sorted(room.get("resources") or [])))
+        groups.setdefault(key, []).append(r)
+    types = list(groups.values())
+    type_of = [0] * len(problem.rooms)
+    for t, members in enumerate(types):
+        for r in members:
+            type_of[r] = t
+    return types, type_of
+
+
+def _candidate_types(problem: Problem, types: List[List[int]], type_of: List[int], per_session: int) -> List[List[int]]:
+    out: List[List[int]] = []
+    for s in problem.sessions:
+        if not s.needs_room:
+            out.append([-1])
+            continue
+        seen: List[int] = []
+        if s.preferred_room is not None:
+            seen.append(type_of[s.preferred_room])
+        # rooms are sorted by capacity, so the first compatible types are the tightest fits
+        for r in iter_bits(s.compat):
+            t = type_of[r]
+            if t not in seen:
+                seen.append(t)
+            if len(seen) >= per_session:
+                break
+        out.append(seen)
+    return out
+
+
+def _parse_cbc_log(path: str) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"result": None, "objective": None, "bound": None, "gap": None}
+    try:
+        with open(path) as fh:
+            text = fh.read()
+    except OSError:
+        return out
+    patterns = {
+        "result": r"Result - (.+)",
+        "objective": r"Objective value:\s+([-\d.eE+]+)",
+        "bound": r"Lower bound:\s+([-\d.eE+]+)",
+        "gap": r"Gap:\s+([-\d.eE+]+)",
+    }
+    for key, pattern in patterns.items():
+        matches = re.findall(pattern, text)
+        if matches:
+            out[key] = matches[-1].strip() if key == "result" else float(matches[-1])
+    return out
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+@timed("ilp.cbc")
+def _run_cbc(prob: pulp.LpProblem, seconds: float, opts: Dict[str, Any]) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="cbc-")
+    log_path = os.path.join(workdir, "cbc.log")
+    solver = pulp.PULP_CBC_CMD(
+        msg=False,
+        warmStart=True,
+        timeLimit=max(1, int(seconds)),
+        gapRel=opts.get("gapRel"),
+        threads=opts.get("threads"),
+        logPath=log_path,
+        # the bundled CBC 2.10.3 crashes preprocessing the warm start on medium campuses
+        # (benchmarks/campus.py), so CBC's preprocessing stays off
+        options=["preprocess off"],
+    )
+    try:
+        status = prob.solve(solver)
+    except pulp.PulpSolverError:
+        return {"status": "Error", "solved": False}
+    finally:
+        out = _parse_cbc_log(log_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"status": pulp.LpStatus[status], "solved": status == pulp.LpStatusOptimal, **out}
+
+
+class _Model:
+    def __init__(
+        self,
+        problem: Problem,
+        per_session: int,
+        weights: Dict[str, float],
+        warm: Assignment,
+        deadline: float,
+    ) -> None:
+        self.problem = problem
+        grid = problem.grid
+        self.types, self.type_of = _room_types(problem)
+        self.cands = _candidate_types(problem, self.types, self.type_of, per_session)
+        for s, placed in zip(problem.sessions, warm):
+            if placed is not None and placed[1] is not None and self.type_of[placed[1]] not in self.cands[s.index]:
+                self.cands[s.index].append(self.type_of[placed[1]])
+        self.weights = weights
+        self.prob = pulp.LpProblem("timetable", pulp.LpMinimize)
+        self.x: Dict[Tuple[int, int, int], pulp.LpVariable] = {}
+        self.u: Dict[int, pulp.LpVariable] = {}
+
+        faculty_cover: Dict[Tuple[int, int], List[pulp.LpVariable]] = {}
+        batch_cover: Dict[Tuple[int, int], List[pulp.LpVariable]] = {}
+        type_cover: Dict[Tuple[int, int], List[pulp.LpVariable]] = {}
+        faculty_day: Dict[Tuple[int, int], List[Tuple[pulp.LpVariable, int]]] = {}
+        course_day: Dict[Tuple[int, int], List[pulp.LpVariable]] = {}
+
+        for s in problem.sessions:
+            blocked = problem.blocked_faculty.get(s.faculty, 0)
+            if s.batch is not None:
+                blocked |= problem.blocked_batch.get(s.batch, 0)
+            starts = grid.free_starts(~blocked & grid.full_mask, s.duration) & s.allowed
+            terms = []
+            for p in iter_bits(starts):
+                d = grid.day_of(p)
+                for t in self.cands[s.index]:
+                    var = pulp.LpVariable(f"x_{s.index}_{p}_{t + 1}", cat="Binary")
+                    self.x[(s.index, p, t)] = var
+                    terms.append(var)
+                    faculty_day.setdefault((s.faculty, d), []).append((var, s.duration))
+                    course_day.setdefault((id(s.course), d), []).append(var)
+                    for q in range(p, p + s.duration):
+                        faculty_cover.setdefault((s.faculty, q), []).append(var)
+                        if s.batch is not None:
+                            batch_cover.setdefault((s.batch, q), []).append(var)
+                        if t >= 0:
+                            type_cover.setdefault((t, q), []).append(var)
+            self.u[s.index] = pulp.LpVariable(f"u_{s.index}", cat="Binary")
+            self.prob += pulp.lpSum(terms) + self.u[s.index] == 1, f"assign_{s.index}"
+            if time.perf_counter() > deadline:
+                raise _BudgetExceeded()
+
+        # hard constraints
+        for (f, q), terms in faculty_cover.items():
+            if len(terms) > 1:
+                self.prob += pulp.lpSum(terms) <= 1, f"fac_{f}_{q}"
+        for (b, q), terms in batch_cover.items():
+            if len(terms) > 1:
+                self.prob += pulp.lpSum(terms) <= 1, f"batch_{b}_{q}"
+        for (t, q), terms in type_cover.items():
+            free = self._free(t, q)
+            if len(terms) > free:
+                self.prob += pulp.lpSum(terms) <= free, f"rooms_{t}_{q}"
+        for (f, d), terms in faculty_day.items():
+            limit = problem.daily_limit(f)
+            if limit is not None:
+                self.prob += pulp.lpSum(v * dur for v, dur in terms) <= limit, f"daily_{f}_{d}"
+
+        # soft constraints
+        objective = [UNSCHEDULED_PENALTY * v for v in self.u.values()]
+        self.aux: List[Tuple[pulp.LpVariable, Any]] = []
+        ppd = grid.periods_per_day
+
+        def occupancy(cover: Dict[Tuple[int, int], List[pulp.LpVariable]], key: int, q: int) -> Any:
+            return pulp.lpSum(cover.get((key, q), []))
+
+        for f in range(len(problem.faculty_ids)):
+            for q in range(grid.n_periods - 1):
+                if (q + 1) % ppd == 0 or (f, q) not in faculty_cover or (f, q + 1) not in faculty_cover:
+                    continue
+                z = pulp.LpVariable(f"b2b_{f}_{q}", lowBound=0)
+                expr = occupancy(faculty_cover, f, q) + occupancy(faculty_cover, f, q + 1) - 1
+                self.prob += z >= expr, f"b2bc_{f}_{q}"
+                self.aux.append((z, expr))
+                objective.append(weights["backToBack"] * z)
+            loads = [pulp.lpSum(v * dur for v, dur in faculty_day.get((f, d), [])) for d in range(len(grid.days))]
+            m = pulp.LpVariable(f"maxload_{f}", lowBound=0)
+            for d, load in enumerate(loads):
+                self.prob += m >= load, f"maxloadc_{f}_{d}"
+            self.aux.append((m, loads))
+            objective.append(weights["balance"] * m)
+        for b in range(len(problem.batch_ids)):
+            for q in range(1, grid.n_periods - 1):
+                if q % ppd == 0 or (q + 1) % ppd == 0:
+                    continue
+                if (b, q - 1) not in batch_cover or (b, q + 1) not in batch_cover:
+                    continue
+                g = pulp.LpVariable(f"gap_{b}_{q}", lowBound=0)
+                expr = occupancy(batch_cover, b, q - 1) + occupancy(batch_cover, b, q + 1) - occupancy(batch_cover, b, q) - 1
+                self.prob += g >= expr, f"gapc_{b}_{q}"
+                self.aux.append((g, expr))
+                objective.append(weights["gap"] * g)
+        for n, ((_, d), terms) in enumerate(course_day.items()):
+            c = pulp.LpVariable(f"sameday_{n}", lowBound=0)
+            expr = pulp.lpSum(terms) - 1
+            self.prob += c >= expr, f"samedayc_{n}"
+            self.aux.append((c, expr))
+            objective.append(weights["sameDay"] * c)
+        self.base_objective = objective
+        self.prob.setObjective(pulp.lpSum(objective))
+
+    def set_repeat_penalty(self, used: List[Set[int]]) -> None:
+        extra = [
+            self.weights["repeat"] * var
+            for (s, p, _), var in self.x.items()
+            if p in used[s]
+        ]
+        self.prob.setObjective(pulp.lpSum(self.base_objective + extra))
+
+    def _free(self, t: int, q: int) -> int:
+        return sum(1 for r in self.types[t] if not self.problem.blocked_room.get(r, 0) >> q & 1)
+
+    def warm_start(self, assignment: Assignment) -> None:
+        used: Dict[Tuple[int, int], int] = {}
+        for var in self.x.values():
+            var.setInitialValue(0)
+        for s, placed in zip(self.problem.sessions, assignment):
+            self.u[s.index].setInitialValue(1 if placed is None else 0)
+            if placed is None:
+                continue
+            period, room = placed
+            t = self.type_of[room] if room is not None else -1
+            var = self.x.get((s.index, period, t))
+            if var is None:
+                # the warm start picked a room type outside the candidate list; swap in a
+                # candidate type that still has a free room over the whole span
+                var = next((
+                    self.x[(s.index, period, c)] for c in self.cands[s.index]
+                    if (s.index, period, c) in self.x
+                    and all(used.get((c, q), 0) < self._free(c, q) for q in range(period, period + s.duration))
+                ), None)
+                if var is None:
+                    self.u[s.index].setInitialValue(1)
+                    continue
+                t = self.cands[s.index][[self.x.get((s.index, period, c)) for c in self.cands[s.index]].index(var)]
+            for q in range(period, period + s.duration):
+                used[(t, q)] = used.get((t, q), 0) + 1
+            var.setInitialValue(1)
+        for var, expr in self.aux:
+            if isinstance(expr, list):
+                var.setInitialValue(max(0.0, max((pulp.value(e) or 0.0) for e in expr)))
+            else:
+                var.setInitialValue(max(0.0, pulp.value(expr) or 0.0))
+
+    def extract(self) -> Assignment:
+        chosen: List[Optional[Tuple[int, int]]] = [None] * len(self.problem.sessions)
+        for (s, p, t), var in self.x.items():
+            if (var.value() or 0) > 0.5:
+                chosen[s] = (p, t)
+        # concrete rooms inside each chosen type, matched per start period
+        type_masks = [sum(1 << r for r in members) for members in self.types]
+        periods = [c[0] if c is not None else None for c in chosen]
+        allowed = [
+            type_masks[c[1]] & s.compat if c is not None and c[1] >= 0 else 0
+            for s, c in zip(self.problem.sessions, chosen)
+        ]
+        return with_rooms(self.problem, periods, allowed)
+
+
+def generate(req: ScheduleRequest, problem: Optional[Problem] = None, progress: Optional[Progress] = None) -> List[Timetable]:
+    started = time.perf_counter()
+    problem = problem or build_problem(req)
+    opts = req.solver_options
+    deadline = started + (req.time_limit or DEFAULT_TIME_LIMIT)
+    weights = {**WEIGHTS, **(opts.get("weights") or {})}
+    n_options = max(1, req.options)
+    base_seed = req.seed if req.seed is not None else 0
+
+    warm_starts: List[Assignment] = []
+    used: List[Set[int]] = [set() for _ in problem.sessions]
+    for variant in range(n_options):
+        warm, _ = constraint.solve(
+            problem,
+            seed=base_seed + variant,
+            avoid=used if variant else None,
+            deadline=time.perf_counter() + 0.5,
+        )
+        warm_starts.append(warm)
+        for s, placed in zip(problem.sessions, warm):
+            if placed is not None:
+                used[s.index].add(placed[0])
+
+    model: Optional[_Model] = None
+    try:
+        with phase("ilp.build"):
+            model = _Model(problem, int(opts.get("roomTypesPerSession", 3)), weights, warm_starts[0], deadline)
+    except _BudgetExceeded:
+        pass
+    build_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    used = [set() for _ in problem.sessions]
+    options: List[Timetable] = []
+    for variant, warm in enumerate(warm_starts):
+        option_started = time.perf_counter()
+        metadata: Dict[str, Any] = {"generator": "ilp", "seed": base_seed + variant, "buildMs": build_ms}
+        assignment = warm
+        if model is None:
+            metadata.update({"status": "ModelTooLarge", "objective": None, "bestBound": None, "gap": None})
+        else:
+            if variant:
+                model.set_repeat_penalty(used)
+            model.warm_start(warm)
+            warm_objective = pulp.value(model.prob.objective)
+            metadata.update({
+                "variables": len(model.x) + len(model.u) + len(model.aux),
+                "constraints": len(model.prob.constraints),
+                "warmStartObjective": warm_objective,
+            })
+            budget = (deadline - option_started) / (n_options - variant)
+            result: Dict[str, Any] = {"status": "NotSolved", "solved": False}
+            if budget >= 1.0:
+                result = _run_cbc(model.prob, budget - ROOT_MARGIN, opts)
+            objective = warm_objective
+            if result.get("objective") is not None and result["objective"] <= warm_objective + 1e-6:
+                assignment = model.extract()
+                objective = result["objective"]
+            bound, gap = result.get("bound"), result.get("gap")
+            if result.get("result") == "Optimal solution found":
+                bound, gap = objective, 0.0
+            elif gap is None and bound is not None and objective:
+                gap = abs(objective - bound) / max(1e-9, abs(bound))
+            metadata.update({
+                "status": result.get("result") or result["status"],
+                "objective": objective,
+                "bestBound": bound,
+                "gap": gap,
+            })
+        for s, placed in zip(problem.sessions, assignment):
+            if placed is not None:
+                used[s.index].add(placed[0])
+        metadata["unscheduled"] = [s.slot_id for s, placed in zip(problem.sessions, assignment) if placed is None]
+        metadata["elapsedMs"] = round((time.perf_counter() - option_started) * 1000, 2)
+        options.append(to_timetable(
+            problem,
+            assignment,
+            name=f"ILP-{req.department}-{req.semester or 'S'}-opt{variant + 1}",
+            metadata=metadata,
+        ))
+        if progress is not None:
+            progress((variant + 1) / n_options, options)
+    return options
@@ -0,0 +1,345 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.models.schemas import ScheduleRequest, Timetable, TimetableSlot
+from app.services.metrics import timed
+
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+MINUTES_PER_DAY = 24 * 60
+# resolution of the grid-independent occupancy bitmaps (see app.services.occupancy)
+BUCKET_MINUTES = 5
+
+
+def parse_hhmm(value: str) -> int:
+    hours, _, minutes = str(value).partition(":")
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def format_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def minute_buckets(start: int, end: int) -> int:
+    first, last = start // BUCKET_MINUTES, -(-end // BUCKET_MINUTES)
+    return ((1 << (last - first)) - 1) << first if last > first else 0
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class TimeGrid:
+    """Discrete weekly grid; period ``p`` starts at ``minute_of_week(p)``."""
+
+    def __init__(
+        self,
+        days: Optional[Sequence[str]] = None,
+        day_start: int = 9 * 60,
+        day_end: int = 17 * 60,
+        period_minutes: int = 60,
+        session_minutes: int = 50,
+    ) -> None:
+        self.days = list(days or DAYS)
+        self.day_start = day_start
+        self.period_minutes = period_minutes
+        self.session_minutes = session_minutes
+        self.starts = list(range(day_start, day_end - session_minutes + 1, period_minutes))
+        self.periods_per_day = len(self.starts)
+        self.n_periods = len(self.days) * self.periods_per_day
+        self.full_mask = (1 << self.n_periods) - 1
+        self._day_index = {d: i for i, d in enumerate(self.days)}
+        day_bits = (1 << self.periods_per_day) - 1
+        self.day_masks = [day_bits << (d * self.periods_per_day) for d in range(len(self.days))]
+        self._start_masks: Dict[int, int] = {}
+        self._period_buckets = [minute_buckets(s, s + session_minutes) for s in self.starts]
+
+    @classmethod
+    def from_constraints(cls, constraints: Dict[str, Any]) -> "TimeGrid":
+        return cls(
+            days=constraints.get("days") or DAYS,
+            day_start=parse_hhmm(constraints.get("dayStart", "09:00")),
+            day_end=parse_hhmm(constraints.get("dayEnd", "17:00")),
+            period_minutes=int(constraints.get("periodMinutes", 60)),
+            session_minutes=int(constraints.get("sessionMinutes", 50)),
+        )
+
+    def day_of(self, period: int) -> int:
+        return period // self.periods_per_day
+
+    def minute_of_week(self, period: int) -> int:
+        return self.day_of(period) * MINUTES_PER_DAY + self.starts[period % self.periods_per_day]
+
+    def times(self, period: int, duration: int = 1) -> Tuple[str, str]:
+        start = self.starts[period % self.periods_per_day]
+        end = start + (duration - 1) * self.period_minutes + self.session_minutes
+        return format_hhmm(start), format_hhmm(end)
+
+    def day_index(self, day: str) -> Optional[int]:
+        return self._day_index.get(day)
+
+    def period_at(self, day: str, start_time: str) -> Optional[int]:
+        d = self._day_index.get(day)
+        if d is None:
+            return None
+        offset = parse_hhmm(start_time) - self.day_start
+        if offset < 0 or offset % self.period_minutes:
+            return None
+        index = offset // self.period_minutes
+        if index >= self.periods_per_day:
+            return None
+        return d * self.periods_per_day + index
+
+    def span_mask(self, period: int, duration: int = 1) -> int:
+        return ((1 << duration) - 1) << period
+
+    def interval_mask(self, day: str, start_time: str, end_time: str) -> int:
+        d = self._day_index.get(day)
+        if d is None:
+            return 0
+        start, end = parse_hhmm(start_time), parse_hhmm(end_time)
+        mask = 0
+        for i, s in enumerate(self.starts):
+            if s < end and start < s + self.session_minutes:
+                mask |= 1 << (d * self.periods_per_day + i)
+        return mask
+
+    def bucket_mask(self, days: Dict[str, str]) -> int:
+        """Periods overlapping an occupancy bitmap given as ``{day: hex buckets}``."""
+        mask = 0
+        for d, day in enumerate(self.days):
+            bits = int(days.get(day) or "0", 16)
+            if not bits:
+                continue
+            for i, buckets in enumerate(self._period_buckets):
+                if bits & buckets:
+                    mask |= 1 << (d * self.periods_per_day + i)
+        return mask
+
+    def start_mask(self, duration: int) -> int:
+        # periods where a ``duration``-long block fits inside a single day
+        mask = self._start_masks.get(duration)
+        if mask is None:
+            mask = 0
+            if 0 < duration <= self.periods_per_day:
+                per_day = (1 << (self.periods_per_day - duration + 1)) - 1
+                for d in range(len(self.days)):
+                    mask |= per_day << (d * self.periods_per_day)
+            self._start_masks[duration] = mask
+        return mask
+
+    def free_starts(self, free: int, duration: int) -> int:
+        starts = free
+        for i in range(1, duration):
+            starts &= free >> i
+        return starts & self.start_mask(duration)
+
+
+@dataclass
+class Session:
+    index: int
+    course: Dict[str, Any]
+    occurrence: int
+    faculty: int
+    batch: Optional[int]
+    duration: int
+    size: Optional[int]
+    resources: List[str]
+    compat: int = 0
+    needs_room: bool = True
+    allowed: int = 0
+    preferred_room: Optional[int] = None
+    slot_id: str = ""
+
+
+@dataclass
+class Problem:
+    req: ScheduleRequest
+    grid: TimeGrid
+    sessions: List[Session]
+    faculty_ids: List[str]
+    batch_ids: List[str]
+    rooms: List[Dict[str, Any]]
+    room_ids: List[str]
+    max_daily: Optional[int] = None
+    faculty_max_daily: Dict[int, int] = field(default_factory=dict)
+    blocked_faculty: Dict[int, int] = field(default_factory=dict)
+    blocked_batch: Dict[int, int] = field(default_factory=dict)
+    blocked_room: Dict[int, int] = field(default_factory=dict)
+
+    def daily_limit(self, faculty: int) -> Optional[int]:
+        return self.faculty_max_daily.get(faculty, self.max_daily)
+
+
+def _room_fits(room: Dict[str, Any], size: Optional[int], resources: List[str]) -> bool:
+    capacity = room.get("capacity")
+    if size is not None and capacity is not None and int(capacity) < size:
+        return False
+    have = set(room.get("resources") or [])
+    return all(r in have for r in resources)
+
+
+def _unavailable_mask(grid: TimeGrid, entries: List[Dict[str, Any]]) -> int:
+    mask = 0
+    for e in entries or []:
+        if "startTime" in e:
+            mask |= grid.interval_mask(e.get("day", ""), e["startTime"], e.get("endTime", e["startTime"]))
+        else:
+            d = grid.day_index(e.get("day", ""))
+            if d is not None:
+                mask |= grid.day_masks[d]
+    return mask
+
+
+@timed("build_problem")
+def build_problem(req: ScheduleRequest) -> Problem:
+    grid = TimeGrid.from_constraints(req.constraints)
+
+    catalogue = req.rooms
+    if not catalogue:
+        # no room catalogue: only keep explicitly requested rooms clash-free
+        catalogue = [{"id": rid} for rid in sorted({c["preferredRoomId"] for c in req.courses if c.get("preferredRoomId")})]
+    rooms = sorted(
+        (r for r in catalogue if r.get("id")),
+        key=lambda r: (r.get("capacity") is None, r.get("capacity") or 0, len(r.get("resources") or [])),
+    )
+    room_ids = [r["id"] for r in rooms]
+    room_index = {rid: i for i, rid in enumerate(room_ids)}
+
+    batch_sizes: Dict[str, int] = {}
+    for b in req.batches:
+        bid = b.get("id") or b.get("name")
+        if bid and b.get("size") is not None:
+            batch_sizes[bid] = int(b["size"])
+
+    faculty_info = {f.get("id"): f for f in req.faculty if f.get("id")}
+    faculty_ids: List[str] = []
+    faculty_index: Dict[str, int] = {}
+    batch_ids: List[str] = []
+    batch_index: Dict[str, int] = {}
+
+    sessions: List[Session] = []
+    seen_ids: set[str] = set()
+    for course in req.courses:
+        fid = course["facultyId"]
+        if fid not in faculty_index:
+            faculty_index[fid] = len(faculty_ids)
+            faculty_ids.append(fid)
+        bid = course.get("batch")
+        if bid and bid not in batch_index:
+            batch_index[bid] = len(batch_ids)
+            batch_ids.append(bid)
+        duration = max(1, int(course.get("duration", 1)))
+        size = course.get("students", batch_sizes.get(bid) if bid else None)
+        resources = list(course.get("resources") or [])
+        preferred = room_index.get(course.get("preferredRoomId"))
+        if req.rooms:
+            compat = 0
+            for i, room in enumerate(rooms):
+                if _room_fits(room, size, resources):
+                    compat |= 1 << i
+            if preferred is not None and not compat >> preferred & 1:
+                preferred = None
+            needs_room = True
+        else:
+            compat = 1 << preferred if preferred is not None else 0
+            needs_room = preferred is not None
+        unavailable = _unavailable_mask(grid, (faculty_info.get(fid) or {}).get("unavailable"))
+        blocked = unavailable
+        for i in range(1, duration):
+            blocked |= unavailable >> i
+        allowed = grid.start_mask(duration) & ~blocked
+        base_id = f"{course['code']}-{bid}" if bid else course["code"]
+        for k in range(int(course.get("perWeek", 2))):
+            slot_id = f"{base_id}-{k + 1}"
+            while slot_id in seen_ids:
+                slot_id += "'"
+            seen_ids.add(slot_id)
+            sessions.append(Session(
+                index=len(sessions),
+                course=course,
+                occurrence=k,
+                faculty=faculty_index[fid],
+                batch=batch_index[bid] if bid else None,
+                duration=duration,
+                size=size,
+                resources=resources,
+                compat=compat,
+                needs_room=needs_room,
+                allowed=allowed,
+                preferred_room=preferred,
+                slot_id=slot_id,
+            ))
+
+    occupied = req.occupied
+    blocked = {
+        kind: {index[key]: grid.bucket_mask(days) for key, days in (occupied.get(kind) or {}).items() if key in index}
+        for kind, index in (("faculty", faculty_index), ("batch", batch_index), ("room", room_index))
+    }
+    max_daily = req.constraints.get("maxDailyHours")
+    faculty_max_daily = {
+        faculty_index[fid]: int(info["maxDailyHours"])
+        for fid, info in faculty_info.items()
+        if fid in faculty_index and info.get("maxDailyHours") is not None
+    }
+    return Problem(
+        req=req,
+        grid=grid,
+        sessions=sessions,
+        faculty_ids=faculty_ids,
+        batch_ids=batch_ids,
+        rooms=rooms,
+        room_ids=room_ids,
+        max_daily=int(max_daily) if max_daily is not None else None,
+        faculty_max_daily=faculty_max_daily,
+        blocked_faculty={k: m for k, m in blocked["faculty"].items() if m},
+        blocked_batch={k: m for k, m in blocked["batch"].items() if m},
+        blocked_room={k: m for k, m in blocked["room"].items() if m},
+    )
+
+
+# (period, room index) per session; ``None`` marks an unscheduled session
+Assignment = List[Optional[Tuple[int, Optional[int]]]]
+
+# called by the solvers with the fraction done and the best options found so far
+Progress = Callable[[float, List[Timetable]], None]
+
+
+def to_timetable(problem: Problem, assignment: Assignment, name: str, metadata: Dict[str, Any]) -> Timetable:
+    req = problem.req
+    slots: List[TimetableSlot] = []
+    for s, placed in zip(problem.sessions, assignment):
+        if placed is None:
+            continue
+        period, room = placed
+        start, end = problem.grid.times(period, s.duration)
+        if room is not None:
+            room_id = problem.room_ids[room]
+        else:
+            room_id = s.course.get("preferredRoomId", "AUTO")
+        slots.append(TimetableSlot(
+            id=s.slot_id,
+            day=problem.grid.days[problem.grid.day_of(period)],
+            startTime=start,
+            endTime=end,
+            courseCode=s.course["code"],
+            courseName=s.course["name"],
+            facultyId=s.course["facultyId"],
+            roomId=room_id,
+            batch=s.course.get("batch"),
+            resources=s.resources,
+        ))
+    slots.sort(key=lambda x: (problem.grid.day_index(x.day), x.startTime, x.roomId))
+    return Timetable(
+        name=name,
+        department=req.department,
+        semester=req.semester,
+        year=req.year,
+        slots=slots,
+        facultyIndex=sorted({x.facultyId for x in slots}),
+        batchIndex=sorted({x.batch for x in slots if x.batch}),
+        metadata=metadata,
+    )
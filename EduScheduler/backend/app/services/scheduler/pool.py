@@ -0,0 +1,33 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_workers = 0
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """The solvers' shared process pool, regrown when a caller needs more workers than it has.
+
+    Workers are spawned, not forked: the server's threads and event loop do not survive a fork."""
+    global _pool, _workers
+    with _lock:
+        if _pool is None or _workers < workers:
+            if _pool is not None:
+                # tasks already submitted still finish on the old pool
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes, if any were started; the next ``process_pool`` starts afresh."""
+    global _pool, _workers
+    with _lock:
+        pool, _pool, _workers = _pool, None, 0
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,27 @@
+import importlib
+from functools import lru_cache
+from typing import Any, Callable, Dict
+
+
+# generator name -> "module:function"; a backend's module (and its SDK) is imported on first use
+GENERATORS: Dict[str, str] = {
+    "constraint": "app.services.scheduler.constraint:generate",
+    "ilp": "app.services.scheduler.ilp:generate",
+    "evolution": "app.services.scheduler.evolution:generate",
+    "gemini": "app.services.scheduler.gemini:generate_with_gemini",
+    "campus": "app.services.scheduler.campus:generate_campus",
+}
+
+
+def register(name: str, target: str) -> None:
+    GENERATORS[name] = target
+    get_generator.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_generator(name: str) -> Callable[..., Any]:
+    try:
+        module, attr = GENERATORS[name].split(":")
+    except KeyError:
+        raise ValueError(f"Unknown generator: {name}")
+    return getattr(importlib.import_module(module), attr)
@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.services.metrics import timed
+from app.services.scheduler.model import Assignment, Problem, iter_bits
+
+
+def _match(adj: List[int], prefer: List[Optional[int]]) -> List[Optional[int]]:
+    """Maximum matching of sessions to rooms given as bitmask adjacency (Hopcroft-Karp).
+
+    A greedy pass seeds the matching with each session's cheapest room: its preferred room,
+    else the tightest fit (the lowest bit, rooms being sorted by capacity). The phases then
+    only reroute sessions where that is needed to room one more of them."""
+    n = len(adj)
+    match: List[Optional[int]] = [None] * n
+    owner: Dict[int, int] = {}
+    taken = 0
+    for u in sorted(range(n), key=lambda u: adj[u].bit_count()):
+        free = adj[u] & ~taken
+        if not free:
+            continue
+        p = prefer[u]
+        r = p if p is not None and free >> p & 1 else (free & -free).bit_length() - 1
+        match[u], owner[r] = r, u
+        taken |= 1 << r
+
+    while True:
+        roots = [u for u in range(n) if match[u] is None and adj[u]]
+        if not roots:
+            break
+        # BFS layers over matched sessions; every room is expanded at most once per phase
+        dist = {u: 0 for u in roots}
+        layer, seen, found = roots, 0, False
+        while layer and not found:
+            nxt = []
+            for u in layer:
+                rooms = adj[u] & ~seen
+                seen |= rooms
+                for r in iter_bits(rooms):
+                    v = owner.get(r)
+                    if v is None:
+                        found = True
+                    elif v not in dist:
+                        dist[v] = dist[u] + 1
+                        nxt.append(v)
+            layer = nxt
+        if not found:
+            break
+
+        used = 0
+
+        def augment(u: int) -> bool:
+            nonlocal used
+            rooms = adj[u] & ~used
+            # free rooms first: they end the path right here
+            for r in sorted(iter_bits(rooms), key=lambda r: r in owner):
+                v = owner.get(r)
+                # only rooms leading one layer down; each is explored once per phase
+                if used >> r & 1 or v is not None and dist.get(v) != dist[u] + 1:
+                    continue
+                used |= 1 << r
+                if v is None or augment(v):
+                    match[u], owner[r] = r, u
+                    return True
+            return False
+
+        if not sum(augment(u) for u in roots):
+            break
+    return match
+
+
+@timed("rooms")
+def assign_rooms(problem: Problem, periods: Sequence[Optional[int]], allowed: Optional[Sequence[int]] = None) -> List[Optional[int]]:
+    """Rooms for sessions whose start periods are already fixed.
+
+    Start periods are matched in time order, each as one bipartite matching against the rooms
+    still free over a session's whole span, so multi-period sessions keep a single room.
+    ``allowed`` narrows each session's compatible rooms (default ``Session.compat``). Sessions
+    that need no room, or for which none is left, get ``None``."""
+    grid = problem.grid
+    busy = [0] * grid.n_periods
+    for r, mask in problem.blocked_room.items():
+        for p in iter_bits(mask):
+            busy[p] |= 1 << r
+    by_start: Dict[int, List[int]] = {}
+    for s in problem.sessions:
+        p = periods[s.index]
+        if p is not None and s.needs_room and p + s.duration <= grid.n_periods:
+            by_start.setdefault(p, []).append(s.index)
+
+    rooms: List[Optional[int]] = [None] * len(problem.sessions)
+    for p in sorted(by_start):
+        members = by_start[p]
+        # sessions with the same compatibility and length share one candidate mask
+        spans: Dict[Tuple[int, int], int] = {}
+        adj: List[int] = []
+        for i in members:
+            s = problem.sessions[i]
+            compat = allowed[i] if allowed is not None else s.compat
+            free = spans.get((compat, s.duration))
+            if free is None:
+                free = compat
+                for q in range(p, p + s.duration):
+                    free &= ~busy[q]
+                spans[(compat, s.duration)] = free
+            adj.append(free)
+        prefer = [problem.sessions[i].preferred_room for i in members]
+        for i, r in zip(members, _match(adj, prefer)):
+            if r is None:
+                continue
+            rooms[i] = r
+            for q in range(p, p + problem.sessions[i].duration):
+                busy[q] |= 1 << r
+    return rooms
+
+
+def with_rooms(problem: Problem, periods: Sequence[Optional[int]], allowed: Optional[Sequence[int]] = None) -> Assignment:
+    """An assignment from fixed start periods; sessions left without a room are unscheduled."""
+    rooms = assign_rooms(problem, periods, allowed)
+    assignment: Assignment = [None] * len(problem.sessions)
+    for s in problem.sessions:
+        p = periods[s.index]
+        if p is None or p + s.duration > problem.grid.n_periods:
+            continue
+        if not s.needs_room:
+            assignment[s.index] = (p, None)
+        elif rooms[s.index] is not None:
+            assignment[s.index] = (p, rooms[s.index])
+    return assignment
@@ -0,0 +1,167 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.metrics import timed
+from app.services.scheduler.model import TimeGrid, iter_bits
+
+
+HARD = 1000.0
+WEIGHTS = {"gaps": 2.0, "backToBack": 1.0, "sameDay": 3.0, "dailyExcess": 50.0, "loadVariance": 1.0, "labSplit": 5.0}
+HARD_METRICS = ("clashes", "offGrid", "unknownCourse", "missing")
+
+
+class _Encoder:
+    """Interns distinct slots to codes; a code's row holds its dense faculty/batch/room/course
+    indexes and the periods it covers, so repeated slots across candidates are encoded once."""
+
+    def __init__(self, grid: TimeGrid, courses: Dict[Tuple[str, Optional[str]], int]) -> None:
+        self.grid = grid
+        self.courses = courses
+        self.faculty: Dict[str, int] = {}
+        self.batch: Dict[str, int] = {}
+        self.room: Dict[str, int] = {}
+        self.codes: Dict[Tuple[Any, ...], int] = {}
+        self.rows: List[Tuple[int, int, int, int, int, int]] = []
+
+    def code(self, s: Any) -> int:
+        key = (s.day, s.startTime, s.endTime, s.courseCode, s.facultyId, s.roomId, s.batch)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.rows)
+            periods = []
+            if self.grid.period_at(s.day, s.startTime) is not None:
+                periods = list(iter_bits(self.grid.interval_mask(s.day, s.startTime, s.endTime)))
+            self.rows.append((
+                self.faculty.setdefault(s.facultyId, len(self.faculty)),
+                self.batch.setdefault(s.batch, len(self.batch)) if s.batch else -1,
+                self.room.setdefault(s.roomId, len(self.room)) if s.roomId and s.roomId != "AUTO" else -1,
+                self.courses.get((s.courseCode, s.batch), -1),
+                periods[0] if periods else 0,
+                len(periods),
+            ))
+        return code
+
+
+def _bincount(keys: np.ndarray, size: int) -> np.ndarray:
+    return np.bincount(keys, minlength=size) if len(keys) else np.zeros(size, dtype=np.int64)
+
+
+@timed("score")
+def score_timetables(req: ScheduleRequest, options: Sequence[Timetable]) -> List[Dict[str, float]]:
+    """Per-metric breakdown and weighted ``score`` (lower is better) for each option.
+
+    All options are flattened into one set of arrays with a candidate column, so the metrics of
+    the whole batch come out of a handful of ``bincount``/reduction passes."""
+    grid = TimeGrid.from_constraints(req.constraints)
+    weights = {**WEIGHTS, **(req.solver_options.get("weights") or {})}
+    C, P, D, ppd = len(options), grid.n_periods, len(grid.days), grid.periods_per_day
+    courses: Dict[Tuple[str, Optional[str]], int] = {}
+    required: List[int] = []
+    lengths: List[int] = []
+    for c in req.courses:
+        courses.setdefault((c["code"], c.get("batch")), len(required))
+        required.append(int(c.get("perWeek", 2)))
+        lengths.append(max(1, int(c.get("duration", 1))))
+    K = len(required)
+
+    enc = _Encoder(grid, courses)
+    slot_cand: List[int] = []
+    slot_code: List[int] = []
+    for c, tt in enumerate(options):
+        for s in tt.slots:
+            slot_cand.append(c)
+            slot_code.append(enc.code(s))
+
+    table = np.array(enc.rows, dtype=np.int64).reshape(-1, 6)
+    codes = np.array(slot_code, dtype=np.int64)
+    slot_c = np.array(slot_cand, dtype=np.int64)
+    t_fac, t_batch, t_room, t_course, t_first, t_len = (table[codes, i] for i in range(6))
+    on_grid = t_len > 0
+    off_grid = _bincount(slot_c[~on_grid], C)
+    unknown = _bincount(slot_c[on_grid & (t_course < 0)], C)
+    continued = _bincount(np.repeat(slot_c, np.maximum(0, t_len - 1)), C)
+    # one row per occupied period; a slot's periods are consecutive within its day
+    rows = np.repeat(np.arange(len(codes)), t_len)
+    starts = np.cumsum(t_len) - t_len
+    period = t_first[rows] + np.arange(len(rows)) - starts[rows]
+    cand, fac, batch, room = slot_c[rows], t_fac[rows], t_batch[rows], t_room[rows]
+    F, B, R = max(1, len(enc.faculty)), max(1, len(enc.batch)), max(1, len(enc.room))
+
+    def occupancy(entity: np.ndarray, n: int) -> np.ndarray:
+        keep = entity >= 0
+        keys = (cand[keep] * n + entity[keep]) * P + period[keep]
+        return _bincount(keys, C * n * P).reshape(C, n, D, ppd)
+
+    fac_occ = occupancy(fac, F)
+    batch_occ = occupancy(batch, B)
+    room_occ = occupancy(room, R)
+    clashes = sum(np.maximum(0, occ - 1).sum(axis=(1, 2, 3)) for occ in (fac_occ, batch_occ, room_occ))
+
+    known = on_grid & (t_course >= 0)
+    sc, sk, sd, sl = slot_c[known], t_course[known], t_first[known] // ppd, t_len[known]
+    per_course = _bincount(sc * K + sk, C * K).reshape(C, K) if K else np.zeros((C, 0), dtype=np.int64)
+    missing = np.maximum(0, np.array(required, dtype=np.int64)[None, :] - per_course).sum(axis=1)
+    same_day = np.maximum(0, _bincount((sc * K + sk) * D + sd, C * K * D) - 1).reshape(C, -1).sum(axis=1) if K else np.zeros(C)
+    # a multi-period course booked as shorter pieces
+    lab_split = _bincount(sc[sl < np.array(lengths, dtype=np.int64)[sk]], C) if len(sk) else np.zeros(C)
+
+    busy = batch_occ > 0
+    if len(enc.batch):
+        idx = np.arange(ppd)
+        first = np.where(busy, idx, ppd).min(axis=3)
+        last = np.where(busy, idx, -1).max(axis=3)
+        count = busy.sum(axis=3)
+        gaps = np.where(count > 0, last - first + 1 - count, 0).sum(axis=(1, 2))
+    else:
+        gaps = np.zeros(C)
+
+    fac_busy = fac_occ > 0
+    back_to_back = (fac_busy[..., 1:] & fac_busy[..., :-1]).sum(axis=(1, 2, 3))
+    # continuing a multi-period session is not a back-to-back pair
+    back_to_back = back_to_back - continued
+    load = fac_busy.sum(axis=3)  # (C, F, D)
+    active = load.sum(axis=2) > 0
+    variance = np.where(active, load.var(axis=2), 0.0).sum(axis=1) / np.maximum(1, active.sum(axis=1))
+
+    limits = np.full(F, ppd, dtype=np.int64)
+    default_limit = req.constraints.get("maxDailyHours")
+    if default_limit is not None:
+        limits[:] = int(default_limit)
+    for f in req.faculty:
+        if f.get("id") in enc.faculty and f.get("maxDailyHours") is not None:
+            limits[enc.faculty[f["id"]]] = int(f["maxDailyHours"])
+    excess = np.maximum(0, load - limits[None, :, None]).sum(axis=(1, 2))
+
+    metrics = {
+        "clashes": clashes,
+        "offGrid": off_grid,
+        "unknownCourse": unknown,
+        "missing": missing,
+        "gaps": gaps,
+        "backToBack": np.maximum(0, back_to_back),
+        "sameDay": same_day,
+        "dailyExcess": excess,
+        "loadVariance": variance,
+        "labSplit": lab_split,
+    }
+    hard = sum(metrics[m] for m in HARD_METRICS)
+    total = HARD * hard + sum(weights[m] * metrics[m] for m in WEIGHTS)
+    out: List[Dict[str, float]] = []
+    for c in range(C):
+        row: Dict[str, Any] = {m: round(float(v[c]), 3) for m, v in metrics.items()}
+        row["hard"] = int(hard[c])
+        row["score"] = round(float(total[c]), 3)
+        out.append(row)
+    return out
+
+
+def rank(req: ScheduleRequest, options: List[Timetable]) -> List[Timetable]:
+    """Score ``options`` into ``metadata["score"]``/``["metrics"]`` and return them best first."""
+    if not options:
+        return options
+    for tt, row in zip(options, score_timetables(req, options)):
+        score = row.pop("score")
+        tt.metadata = {**tt.metadata, "score": score, "metrics": row}
+    return sorted(options, key=lambda tt: tt.metadata["score"])
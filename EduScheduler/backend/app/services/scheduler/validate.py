@@ -0,0 +1,65 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.schemas import Timetable
+from app.services.conflicts import detect_conflicts, slot_key
+from app.services.scheduler.model import Problem, _unavailable_mask
+
+
+def hard_violations(problem: Problem, tt: Timetable) -> List[Dict[str, Any]]:
+    """Hard-constraint breaches of a timetable produced outside the local solvers."""
+    req, grid = problem.req, problem.grid
+    slots = [s.model_dump() for s in tt.slots]
+    out: List[Dict[str, Any]] = [
+        {"type": "clash", "slotId": c["slotIds"][1], "detail": f"{c['type']} {c['resource']} on {c['day']}"}
+        for c in detect_conflicts(slots)
+    ]
+
+    courses: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {(c["code"], c.get("batch")): c for c in req.courses}
+    rooms = {r["id"]: r for r in req.rooms if r.get("id")}
+    batch_sizes = {b.get("id") or b.get("name"): b.get("size") for b in req.batches}
+    unavailable = {f["id"]: _unavailable_mask(grid, f.get("unavailable")) for f in req.faculty if f.get("id")}
+    limits = {f["id"]: f["maxDailyHours"] for f in req.faculty if f.get("id") and f.get("maxDailyHours") is not None}
+    default_limit = req.constraints.get("maxDailyHours")
+    occupied = {(kind, key): grid.bucket_mask(days) for kind, keys in req.occupied.items() for key, days in keys.items()}
+
+    counts: Dict[Tuple[str, Optional[str]], int] = {}
+    daily: Dict[Tuple[str, int], int] = {}
+    for i, s in enumerate(slots):
+        sid = slot_key(s, i)
+        course = courses.get((s["courseCode"], s.get("batch")))
+        if course is None:
+            out.append({"type": "unknownCourse", "slotId": sid, "detail": s["courseCode"]})
+            continue
+        counts[(s["courseCode"], s.get("batch"))] = counts.get((s["courseCode"], s.get("batch")), 0) + 1
+        if s["facultyId"] != course["facultyId"]:
+            out.append({"type": "wrongFaculty", "slotId": sid, "detail": s["facultyId"]})
+        day = grid.day_index(s["day"])
+        if day is None or grid.period_at(s["day"], s["startTime"]) is None:
+            out.append({"type": "offGrid", "slotId": sid, "detail": f"{s['day']} {s['startTime']}"})
+            continue
+        mask = grid.interval_mask(s["day"], s["startTime"], s["endTime"])
+        if mask & unavailable.get(s["facultyId"], 0):
+            out.append({"type": "facultyUnavailable", "slotId": sid, "detail": s["facultyId"]})
+        if any(mask & occupied.get((kind, s.get(field)), 0) for kind, field in (("faculty", "facultyId"), ("room", "roomId"), ("batch", "batch"))):
+            out.append({"type": "occupied", "slotId": sid, "detail": f"{s['day']} {s['startTime']}"})
+        key = (s["facultyId"], day)
+        daily[key] = daily.get(key, 0) + bin(mask).count("1")
+        if rooms:
+            room = rooms.get(s["roomId"])
+            if room is None:
+                out.append({"type": "unknownRoom", "slotId": sid, "detail": s["roomId"]})
+                continue
+            size = course.get("students", batch_sizes.get(s.get("batch")))
+            if size is not None and room.get("capacity") is not None and int(room["capacity"]) < int(size):
+                out.append({"type": "capacity", "slotId": sid, "detail": s["roomId"]})
+            if not set(course.get("resources") or []) <= set(room.get("resources") or []):
+                out.append({"type": "resources", "slotId": sid, "detail": s["roomId"]})
+
+    for (fid, day), hours in daily.items():
+        limit = limits.get(fid, default_limit)
+        if limit is not None and hours > int(limit):
+            out.append({"type": "dailyLimit", "slotId": None, "detail": f"{fid} {grid.days[day]}"})
+    for key, course in courses.items():
+        if counts.get(key, 0) < int(course.get("perWeek", 2)):
+            out.append({"type": "missing", "slotId": None, "detail": course["code"]})
+    return out
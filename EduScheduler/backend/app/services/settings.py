@@ -0,0 +1,22 @@
+import os
+from typing import Any, Dict
+
+from app.services.cache import TTLCache
+from app.services.repository import Repository
+
+
+SETTINGS_TTL = float(os.getenv("SETTINGS_TTL", "60"))
+
+_cache = TTLCache(maxsize=1, ttl=SETTINGS_TTL)
+
+
+async def load_settings(repo: Repository) -> Dict[str, Any]:
+    """``meta/settings`` as of at most ``SETTINGS_TTL`` seconds ago; ``put_settings`` invalidates it."""
+    async def load() -> Dict[str, Any]:
+        return await repo.get("meta", "settings") or {}
+
+    return await _cache.get_or_load_async("settings", load)
+
+
+def invalidate_settings() -> None:
+    _cache.invalidate("settings")
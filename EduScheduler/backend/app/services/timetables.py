@@ -0,0 +1,140 @@
+import asyncio
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.models.schemas import Timetable
+from app.services.encoding import dumps
+from app.services.repair import faculty_day_keys
+from app.services.repository import Repository
+
+
+COLLECTION = "timetables"
+SHARDS = "days"
+# timetables with more slots than this keep them in per-day sub-documents under a header
+SHARD_SLOTS = int(os.getenv("TIMETABLE_SHARD_SLOTS", "200"))
+BATCH_LIMIT = 500
+# Firestore caps a commit at 10 MiB; leave room for field names and overhead
+BATCH_BYTES = 8 * 1024 * 1024
+PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "8"))
+
+SLOT_DEFAULTS = {"id": None, "batch": None, "resources": None}
+
+# (path, data); ``None`` data deletes the document
+Write = Tuple[str, Optional[Dict[str, Any]]]
+
+
+def with_indexes(tt: Timetable) -> Dict[str, Any]:
+    # Build indexes for fast queries
+    for i, s in enumerate(tt.slots):
+        if not s.id:
+            s.id = f"{s.courseCode}-{i}"
+    data = tt.model_dump()
+    data["facultyIndex"] = sorted({s.facultyId for s in tt.slots})
+    data["batchIndex"] = sorted({s.batch for s in tt.slots if s.batch})
+    data["facultyDayIndex"] = sorted({k for s in tt.slots for k in faculty_day_keys(s.facultyId, [s.day])})
+    return data
+
+
+def shard_path(tt_id: str, day: str) -> str:
+    return f"{COLLECTION}/{tt_id}/{SHARDS}/{day}"
+
+
+def _compact(slot: Dict[str, Any]) -> Dict[str, Any]:
+    # the day lives on the shard and unset optional fields are left out
+    return {k: v for k, v in slot.items() if k != "day" and v is not None}
+
+
+def writes_for(tt_id: str, data: Dict[str, Any], old: Optional[Dict[str, Any]] = None) -> List[Write]:
+    """Documents to write for ``data``: one document, or a header plus one shard per day for
+    large timetables. Shards ``old`` had that ``data`` no longer needs are deleted."""
+    slots = data.get("slots") or []
+    stale = set((old or {}).get("shards") or [])
+    if len(slots) <= SHARD_SLOTS:
+        return [(f"{COLLECTION}/{tt_id}", data)] + [(shard_path(tt_id, d), None) for d in sorted(stale)]
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for s in slots:
+        by_day.setdefault(s["day"], []).append(_compact(s))
+    header = {k: v for k, v in data.items() if k != "slots"}
+    header["shards"] = list(by_day)
+    header["slotCount"] = len(slots)
+    out: List[Write] = [(f"{COLLECTION}/{tt_id}", header)]
+    out += [(shard_path(tt_id, day), {"day": day, "slots": rows}) for day, rows in by_day.items()]
+    out += [(shard_path(tt_id, d), None) for d in sorted(stale - set(by_day))]
+    return out
+
+
+def deletes_for(tt_id: str, old: Optional[Dict[str, Any]]) -> List[Write]:
+    return [(f"{COLLECTION}/{tt_id}", None)] + [(shard_path(tt_id, d), None) for d in (old or {}).get("shards") or []]
+
+
+def _chunks(groups: Sequence[List[Write]]) -> List[List[Write]]:
+    """Pack write groups into batches under Firestore's operation and size limits; a group (one
+    timetable's documents) is never split, so each timetable lands atomically."""
+    out: List[List[Write]] = []
+    ops, size = 0, 0
+    for group in groups:
+        group_size = sum(len(dumps(data)) if data is not None else 0 for _, data in group)
+        if out and ops + len(group) <= BATCH_LIMIT and size + group_size <= BATCH_BYTES:
+            out[-1].extend(group)
+            ops, size = ops + len(group), size + group_size
+        else:
+            out.append(list(group))
+            ops, size = len(group), group_size
+    return out
+
+
+async def commit(repo: Repository, groups: Sequence[List[Write]]) -> int:
+    """Commit write groups as chunked WriteBatches, up to ``PUBLISH_CONCURRENCY`` at a time."""
+    gate = asyncio.Semaphore(PUBLISH_CONCURRENCY)
+
+    async def run(chunk: List[Write]) -> None:
+        batch = repo.batch()
+        for path, data in chunk:
+            if data is None:
+                batch.delete(repo.document(path))
+            else:
+                batch.set(repo.document(path), data)
+        async with gate:
+            await batch.commit()
+
+    chunks = _chunks(groups)
+    await asyncio.gather(*(run(c) for c in chunks))
+    return len(chunks)
+
+
+def _expand(day: str, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**SLOT_DEFAULTS, "day": day, **r} for r in rows]
+
+
+async def load_slots(repo: Repository, docs: List[Dict[str, Any]], days: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """Fill ``slots`` on sharded headers in place (only ``days``, when given); returns ``docs``.
+
+    Slots of a sharded timetable come back grouped by day, in the header's shard order."""
+    wanted = set(days) if days is not None else None
+
+    async def fill(doc: Dict[str, Any]) -> None:
+        shards = [d for d in doc["shards"] if wanted is None or d in wanted]
+        found = await repo.get_many(f"{COLLECTION}/{doc['id']}/{SHARDS}", shards)
+        doc["slots"] = [s for d in shards for s in _expand(d, (found.get(d) or {}).get("slots") or [])]
+
+    await asyncio.gather(*(fill(d) for d in docs if d.get("shards")))
+    return docs
+
+
+async def read_timetable(repo: Repository, tt_id: str) -> Optional[Dict[str, Any]]:
+    data = await repo.get(COLLECTION, tt_id)
+    if data is not None and data.get("shards"):
+        data["id"] = tt_id
+        await load_slots(repo, [data])
+    return data
+
+
+async def read_day(repo: Repository, tt_id: str, day: str) -> Optional[List[Dict[str, Any]]]:
+    """One day's slots: a single shard read for sharded timetables."""
+    data = await repo.get(COLLECTION, tt_id)
+    if data is None:
+        return None
+    if not data.get("shards"):
+        return [s for s in data.get("slots") or [] if s.get("day") == day]
+    shard = await repo.get(f"{COLLECTION}/{tt_id}/{SHARDS}", day) if day in data["shards"] else None
+    return _expand(day, (shard or {}).get("slots") or [])
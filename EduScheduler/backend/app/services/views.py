@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.cache import TTLCache
+from app.services.repository import Repository, delete_field, field_path
+from app.services.timetables import load_slots
+
+
+VIEW_COLLECTIONS = {"faculty": "facultyViews", "batch": "batchViews"}
+INDEX_FIELDS = {"faculty": "facultyIndex", "batch": "batchIndex"}
+SLOT_FIELDS = {"faculty": "facultyId", "batch": "batch"}
+SUMMARY_FIELDS = ("id", "name", "department", "semester", "year")
+BATCH_LIMIT = 500
+
+view_cache = TTLCache(maxsize=int(os.getenv("VIEW_CACHE_SIZE", "20000")), ttl=float(os.getenv("VIEW_CACHE_TTL", "30")))
+
+
+def view_version(timetables: List[Dict[str, Any]]) -> str:
+    raw = json.dumps(timetables, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _make_view(key: str, timetables: List[Dict[str, Any]]) -> Dict[str, Any]:
+    timetables = sorted(timetables, key=lambda t: t.get("id") or "")
+    return {"key": key, "timetables": timetables, "version": view_version(timetables)}
+
+
+def view_entries(kind: str, tt: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """The slice of one timetable seen by each faculty (or batch): its summary plus only their
+    slots and the leave adjustments that concern them."""
+    if not tt:
+        return {}
+    field = SLOT_FIELDS[kind]
+    slots: Dict[str, List[Dict[str, Any]]] = {}
+    for s in tt.get("slots") or []:
+        if s.get(field):
+            slots.setdefault(s[field], []).append(s)
+    # leave adjustments reach whoever held the original slot and whoever takes it over
+    adjustments: Dict[str, List[Dict[str, Any]]] = {}
+    for on, overrides in sorted((tt.get("adjustments") or {}).items()):
+        for slot_id, o in sorted(overrides.items()):
+            for key in sorted({(o.get("before") or {}).get(field), (o.get("slot") or {}).get(field)} - {None}):
+                adjustments.setdefault(key, []).append({"date": on, "slotId": slot_id, **o})
+    summary = {k: tt.get(k) for k in SUMMARY_FIELDS}
+    out = {key: {**summary, "slots": own} for key, own in slots.items()}
+    for key, rows in adjustments.items():
+        out.setdefault(key, {**summary, "slots": []})["adjustments"] = rows
+    return out
+
+
+async def refresh_views(repo: Repository, tt_id: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+    """Patch the faculty and batch views touched by a timetable write; ``None`` means absent."""
+    await refresh_views_many(repo, [(tt_id, old, new)])
+
+
+async def refresh_views_many(repo: Repository, changes: List[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    """``refresh_views`` for many timetable writes, each view written once.
+
+    A view document keeps one ``entries.<timetable id>`` field per timetable; only the changed
+    ones are replaced (a merge on those field paths, no read), so concurrent writers on other
+    workers keep each other's entries. The list and version are derived when the view is read."""
+    writes: List[Tuple[str, str, Dict[str, Optional[Dict[str, Any]]]]] = []
+    for kind in VIEW_COLLECTIONS:
+        # view key -> timetable id -> its new entry (``None`` when it drops out)
+        touched: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        for tt_id, old, new in changes:
+            before, after = view_entries(kind, old), view_entries(kind, new)
+            for k in set(before) | set(after):
+                if before.get(k) != after.get(k):
+                    touched.setdefault(k, {})[tt_id] = after.get(k)
+        writes += [(kind, key, touched[key]) for key in sorted(touched)]
+    for i in range(0, len(writes), BATCH_LIMIT):
+        batch = repo.batch()
+        for kind, key, entries in writes[i:i + BATCH_LIMIT]:
+            _merge_entries(batch, repo, kind, key, entries)
+        await batch.commit()
+    for kind, key, _ in writes:
+        view_cache.invalidate((kind, key))
+
+
+def _merge_entries(batch: Any, repo: Repository, kind: str, key: str, entries: Dict[str, Optional[Dict[str, Any]]], complete: bool = False) -> None:
+    # every merged path must be in the data; timetables that left the view are deleted
+    data: Dict[str, Any] = {"key": key, "entries": {t: delete_field() if e is None else e for t, e in entries.items()}}
+    fields = ["key"] + [field_path("entries", t) for t in entries]
+    if complete:
+        # and so are the list-shaped fields of views written before entries were kept per timetable
+        data.update({"complete": True, "timetables": delete_field(), "version": delete_field()})
+        fields += ["complete", "timetables", "version"]
+    batch.set(repo.collection(VIEW_COLLECTIONS[kind]).document(key), data, merge=fields)
+
+
+async def _query_entries(repo: Repository, kind: str, key: str) -> Dict[str, Dict[str, Any]]:
+    docs = await load_slots(repo, await repo.query("timetables", [(INDEX_FIELDS[kind], "array_contains", key)], id_field="id"))
+    entries = {tt["id"]: view_entries(kind, tt).get(key) for tt in docs}
+    return {tt_id: e for tt_id, e in entries.items() if e}
+
+
+async def get_view(repo: Repository, kind: str, key: str) -> Dict[str, Any]:
+    async def load() -> Dict[str, Any]:
+        doc = await repo.get(VIEW_COLLECTIONS[kind], key)
+        if not (doc or {}).get("complete"):
+            # timetables written before this view existed: backfill their entries once, merged
+            # in so entries other writers added meanwhile are kept
+            found = await _query_entries(repo, kind, key)
+            batch = repo.batch()
+            _merge_entries(batch, repo, kind, key, found, complete=True)
+            await batch.commit()
+            doc = {**(doc or {}), "entries": {**((doc or {}).get("entries") or {}), **found}}
+        return _make_view(key, list((doc.get("entries") or {}).values()))
+
+    return await view_cache.get_or_load_async((kind, key), load)
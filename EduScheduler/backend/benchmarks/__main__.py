@@ -0,0 +1,238 @@
+"""Synthetic-campus benchmarks for the scheduler, conflict and API hot paths.
+
+    python -m benchmarks --scale small --out results.json
+    python -m benchmarks --scale medium --compare results.json --threshold 0.2
+
+Results are JSON (milliseconds per call) so runs from different commits can be compared;
+``--compare`` exits non-zero when a benchmark got slower than ``--threshold``."""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.models.schemas import CampusRequest, ConflictResolutionRequest, ScheduleResult, Timetable
+from app.services.conflicts import detect_conflicts, resolve_conflicts
+from app.services.encoding import dumps
+from app.services.scheduler.campus import generate_campus
+from app.services.scheduler.engine import generate_timetables, generate_timetables_async
+from app.services.scheduler.score import rank
+from benchmarks.campus import SCALES, make_campus
+from benchmarks.imports import measure
+from benchmarks.stubs import ADMIN, fake_app, stub_auth, stub_gemini, token
+
+
+Result = Dict[str, float]
+
+
+def _summary(samples: List[float]) -> Result:
+    return {
+        "min": round(min(samples), 3),
+        "median": round(statistics.median(samples), 3),
+        "mean": round(statistics.fmean(samples), 3),
+        "runs": len(samples),
+    }
+
+
+def timed(fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> Result:
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return _summary(samples)
+
+
+async def atimed(fn: Callable[[], Awaitable[Any]], repeat: int, setup: Optional[Callable[[], None]] = None) -> Result:
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return _summary(samples)
+
+
+def bench_scheduler(reqs, solvers: List[str], repeat: int, time_limit: float, gemini_latency: float) -> Dict[str, Result]:
+    out: Dict[str, Result] = {}
+    req = reqs[0]
+    for solver in solvers:
+        r = req.model_copy(update={"solver": solver, "time_limit": time_limit})
+        out[f"generate/{solver}"] = timed(lambda: generate_timetables(r), repeat)
+
+    from app.services.scheduler import gemini
+
+    stub_gemini(gemini_latency)
+    hedged = req.model_copy(update={"solver": "auto", "use_gemini": True, "budget": max(1.0, 4 * gemini_latency)})
+    out["generate/hedged"] = timed(lambda: asyncio.run(generate_timetables_async(hedged)), repeat, setup=gemini._cache.clear)
+
+    campus = CampusRequest(departments=reqs, solver="constraint", time_limit=time_limit * len(reqs))
+    out["campus/generate"] = timed(lambda: generate_campus(campus), max(1, repeat // 2))
+    return out
+
+
+def bench_conflicts(reqs, timetables: List[Timetable], repeat: int) -> Dict[str, Result]:
+    # departments generated one by one share rooms, so their union is full of clashes
+    slots = [s.model_dump() for tt in timetables for s in tt.slots]
+    merged = {"id": "bench", "slots": slots}
+    resolve = ConflictResolutionRequest(timetableId="bench", rooms=reqs[0].rooms, batches=[b for r in reqs for b in r.batches])
+    options = [tt.model_copy(deep=True) for tt in timetables if tt.department == reqs[0].department]
+    return {
+        "conflicts/detect": timed(lambda: detect_conflicts(slots), repeat),
+        "conflicts/resolve": timed(lambda: resolve_conflicts(resolve, merged), repeat),
+        "score/rank": timed(lambda: rank(reqs[0], options), repeat),
+    }
+
+
+def bench_serialize(timetables: List[Timetable], repeat: int) -> Dict[str, Result]:
+    from fastapi.encoders import jsonable_encoder
+
+    dumped = [tt.model_dump() for tt in timetables]
+    encoded = [json.dumps(d, default=str) for d in dumped]
+    # what FastAPI did for a response_model=ScheduleResult endpoint: dump, re-validate, encode
+    response_model = lambda: json.dumps(ScheduleResult.model_validate({"options": [tt.model_dump() for tt in timetables]}).model_dump(mode="json"))
+    return {
+        "serialize/dump": timed(lambda: [json.dumps(tt.model_dump(), default=str) for tt in timetables], repeat),
+        "serialize/validate": timed(lambda: [Timetable.model_validate_json(e) for e in encoded], repeat),
+        "serialize/result-revalidated": timed(response_model, repeat),
+        "serialize/result-dump-json": timed(lambda: ScheduleResult.model_construct(options=timetables).model_dump_json(), repeat),
+        "serialize/document-jsonable": timed(lambda: json.dumps(jsonable_encoder(dumped)), repeat),
+        "serialize/document-orjson": timed(lambda: dumps(dumped), repeat),
+    }
+
+
+async def bench_api(reqs, timetables: List[Timetable], repeat: int) -> Dict[str, Result]:
+    try:
+        import httpx
+    except ImportError:
+        print("httpx is not installed; skipping endpoint benchmarks", file=sys.stderr)
+        return {}
+    from app.main import app
+
+    stub_auth()
+    repo = await fake_app(reqs, [tt.model_copy(deep=True) for tt in timetables])
+    tt_id = (await repo.query("timetables", [], id_field="id"))[0]["id"]
+    faculty = reqs[0].courses[0]["facultyId"]
+    admin, teacher = token(ADMIN), token(faculty)
+    body = timetables[0].model_dump(mode="json")
+    leave = {"facultyId": "SELF", "dates": ["2024-01-08"], "reason": "benchmark"}
+
+    out: Dict[str, Result] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def call(method: str, url: str, headers: Dict[str, str], **kwargs: Any) -> None:
+            res = await client.request(method, url, headers=headers, **kwargs)
+            res.raise_for_status()
+
+        cases = [
+            ("api/auth/me", "GET", "/auth/me", admin, {}),
+            ("api/timetable/list", "GET", "/admin/timetable", admin, {}),
+            ("api/timetable/summary", "GET", "/admin/timetable?fields=summary", admin, {}),
+            ("api/timetable/get", "GET", f"/admin/timetable/{tt_id}", admin, {}),
+            ("api/timetable/faculty", "GET", "/faculty/timetable", teacher, {}),
+            ("api/timetable/create", "POST", "/admin/timetable", admin, {"json": body}),
+            ("api/timetable/day", "GET", f"/admin/timetable/{tt_id}/days/Mon", admin, {}),
+            ("api/timetable/publish", "POST", "/admin/timetable/publish", admin, {"json": {"timetables": [tt.model_dump(mode="json") for tt in timetables]}}),
+            ("api/leave", "POST", "/leave", teacher, {"json": leave}),
+        ]
+        for name, method, url, headers, kwargs in cases:
+            # one warm-up call fills the token, user and view caches the way live traffic would
+            await call(method, url, headers, **kwargs)
+            out[name] = await atimed(lambda: call(method, url, headers, **kwargs), repeat)
+    return out
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Result], baseline_path: str, threshold: float) -> List[str]:
+    """Benchmarks whose median grew by more than ``threshold`` against the baseline file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    slower = []
+    for name, now in sorted(results.items()):
+        before = baseline.get(name)
+        if before and before["median"] > 0:
+            change = now["median"] / before["median"] - 1
+            mark = "  SLOWER" if change > threshold else ""
+            print(f"{name:28} {before['median']:10.2f} -> {now['median']:10.2f} ms  {change:+7.1%}{mark}")
+            if mark:
+                slower.append(name)
+    return slower
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--solvers", default="constraint,evolution", help="comma-separated solvers to time")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="per-solve time limit in seconds")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="seconds the stubbed Gemini takes")
+    parser.add_argument("--groups", default="startup,scheduler,conflicts,serialize,api")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before --compare fails")
+    args = parser.parse_args(argv)
+
+    groups = set(args.groups.split(","))
+    reqs = make_campus(args.scale, args.seed)
+    # one stored timetable per department, generated independently
+    timetables = [generate_timetables(r.model_copy(update={"options": 1}))[0] for r in reqs]
+    for r, tt in zip(reqs, timetables):
+        tt.department, tt.semester, tt.year = r.department, r.semester, r.year
+
+    results: Dict[str, Result] = {}
+    if "startup" in groups:
+        # the app's own import time, on top of the framework's
+        startup = measure("app.main", args.repeat)
+        startup.pop("eager")
+        startup.pop("framework")
+        results["startup/import"] = startup
+    if "scheduler" in groups:
+        results.update(bench_scheduler(reqs, [s for s in args.solvers.split(",") if s], args.repeat, args.time_limit, args.gemini_latency))
+    if "conflicts" in groups:
+        results.update(bench_conflicts(reqs, timetables, args.repeat))
+    if "serialize" in groups:
+        results.update(bench_serialize(timetables, args.repeat))
+    if "api" in groups:
+        results.update(asyncio.run(bench_api(reqs, timetables, args.repeat)))
+
+    for name, r in results.items():
+        print(f"{name:28} median {r['median']:10.2f} ms  min {r['min']:10.2f} ms")
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "courses": sum(len(r.courses) for r in reqs),
+            "slots": sum(len(tt.slots) for tt in timetables),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import random
+from typing import Any, Dict, List
+
+from app.models.schemas import ScheduleRequest
+
+
+SCALES: Dict[str, Dict[str, Any]] = {
+    "small": {"departments": 2, "courses": 20, "rooms": 16, "batches": 3},
+    "medium": {"departments": 6, "courses": 60, "rooms": 80, "batches": 6},
+    "large": {"departments": 15, "courses": 120, "rooms": 300, "batches": 10},
+}
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+
+
+def make_rooms(rng: random.Random, n: int) -> List[Dict[str, Any]]:
+    rooms = []
+    for i in range(n):
+        resources = ["projector"] if rng.random() < 0.6 else []
+        if i % 8 == 0:
+            resources.append("lab")
+        rooms.append({"id": f"R{i:03d}", "capacity": rng.choice([30, 40, 60, 80, 120]), "resources": resources})
+    return rooms
+
+
+def make_department(
+    rng: random.Random,
+    name: str,
+    rooms: List[Dict[str, Any]],
+    courses: int,
+    batches: int,
+    shared_faculty: List[str],
+) -> ScheduleRequest:
+    n_faculty = max(2, courses // 3)
+    faculty = []
+    for i in range(n_faculty):
+        fid = f"{name}-F{i:02d}"
+        entry: Dict[str, Any] = {"id": fid, "maxDailyHours": rng.choice([None, 4, 5, 6])}
+        if rng.random() < 0.2:
+            entry["unavailable"] = [{"day": rng.choice(DAYS)}]
+        faculty.append(entry)
+    faculty += [{"id": fid} for fid in shared_faculty]
+    batch_list = [{"id": f"{name}-B{i}", "size": rng.choice([25, 35, 55, 70])} for i in range(batches)]
+    lab_rooms = [r["id"] for r in rooms if "lab" in r["resources"]]
+    course_list = []
+    for i in range(courses):
+        lab = i % 10 == 0
+        if shared_faculty and rng.random() < 0.05:
+            teacher = rng.choice(shared_faculty)
+        else:
+            teacher = faculty[rng.randrange(n_faculty)]["id"]
+        course: Dict[str, Any] = {
+            "code": f"{name}{i:03d}",
+            "name": f"{name} course {i}",
+            "facultyId": teacher,
+            "batch": batch_list[i % batches]["id"],
+            "perWeek": 1 if lab else rng.choice([2, 3, 3, 4]),
+            "duration": 2 if lab else 1,
+            "resources": ["lab"] if lab else (["projector"] if rng.random() < 0.3 else []),
+        }
+        if lab and lab_rooms and rng.random() < 0.5:
+            course["preferredRoomId"] = rng.choice(lab_rooms)
+        course_list.append(course)
+    return ScheduleRequest(
+        department=name,
+        semester="S1",
+        year=1,
+        constraints={"maxDailyHours": 6},
+        courses=course_list,
+        rooms=rooms,
+        faculty=faculty,
+        batches=batch_list,
+        use_gemini=False,
+        solver="constraint",
+        options=2,
+    )
+
+
+def make_campus(scale: str = "small", seed: int = 0, **overrides: Any) -> List[ScheduleRequest]:
+    """A seeded synthetic campus: one ``ScheduleRequest`` per department, all sharing the room
+    catalogue and a few faculty members who teach in more than one department."""
+    params = {**SCALES[scale], **overrides}
+    rng = random.Random(seed)
+    rooms = make_rooms(rng, params["rooms"])
+    shared = [f"SHARED-F{i}" for i in range(max(1, params["departments"] // 3))]
+    return [
+        make_department(rng, f"D{d:02d}", rooms, params["courses"], params["batches"], shared)
+        for d in range(params["departments"])
+    ]
@@ -0,0 +1,357 @@
+import copy
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+_MISSING = object()
+
+
+def _parts(path: str) -> List[str]:
+    """Split a dotted field path, honouring `backquoted` parts."""
+    parts, part, quoted, i = [], "", False, 0
+    while i < len(path):
+        c = path[i]
+        if quoted and c == "\\":
+            i += 1
+            part += path[i]
+        elif c == "`":
+            quoted = not quoted
+        elif c == "." and not quoted:
+            parts.append(part)
+            part = ""
+        else:
+            part += c
+        i += 1
+    return parts + [part]
+
+
+def _is_delete(value: Any) -> bool:
+    from google.cloud.firestore_v1 import DELETE_FIELD
+
+    return value is DELETE_FIELD
+
+
+def _field(data: Dict[str, Any], path: str) -> Any:
+    value: Any = data
+    for part in _parts(path):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _put(doc: Dict[str, Any], parts: List[str], value: Any) -> None:
+    *parents, leaf = parts
+    target = doc
+    for p in parents:
+        if not isinstance(target.get(p), dict):
+            target[p] = {}
+        target = target[p]
+    if value is _MISSING or _is_delete(value):
+        target.pop(leaf, None)
+    else:
+        target[leaf] = copy.deepcopy(value)
+
+
+def _deleted(data: Dict[str, Any], prefix: Tuple[str, ...] = ()) -> Iterable[Tuple[str, ...]]:
+    for k, v in data.items():
+        if isinstance(v, dict):
+            yield from _deleted(v, prefix + (k,))
+        elif _is_delete(v):
+            yield prefix + (k,)
+
+
+def _check_merge(data: Dict[str, Any], merge: List[str]) -> None:
+    """Reject what the SDK rejects: merge paths absent from ``data``, and deletes not merged."""
+    for path in merge:
+        if _field(data, path) is _MISSING:
+            raise ValueError(f"Invalid merge path: {path}")
+    listed = {tuple(_parts(path)) for path in merge}
+    unmerged = [p for p in _deleted(data) if p not in listed]
+    if unmerged:
+        raise ValueError(f"Cannot delete unmerged fields: {unmerged}")
+
+
+def _merge(target: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    for k, v in update.items():
+        if isinstance(v, dict) and isinstance(target.get(k), dict):
+            _merge(target[k], v)
+        else:
+            _put(target, [k], v)
+    return target
+
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return value == expected
+    if op == "!=":
+        return value != expected
+    if op == "in":
+        return value in expected
+    if op == "not-in":
+        return value not in expected
+    if op == "array_contains":
+        return isinstance(value, list) and expected in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(e in value for e in expected)
+    try:
+        return {"<": value < expected, "<=": value <= expected, ">": value > expected, ">=": value >= expected}[op]
+    except (KeyError, TypeError):
+        return False
+
+
+def _order_value(path: str, data: Dict[str, Any], field: str) -> Any:
+    if field == "__name__":
+        return path.rsplit("/", 1)[-1]
+    return _field(data, field)
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Optional[Dict[str, Any]], fields: Optional[List[str]] = None) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and fields is not None:
+            data = {k: data[k] for k in fields if k in data}
+        self._data = data
+
+    def get(self, path: str) -> Any:
+        value = _field(self._data or {}, path)
+        return None if value is _MISSING else value
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store: "FakeFirestore", path: str) -> None:
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+    def _set(self, data: Dict[str, Any], merge: Any = False) -> None:
+        docs = self._store.docs
+        if isinstance(merge, list):
+            _check_merge(data, merge)
+            # only the listed fields are replaced
+            doc = docs.setdefault(self.path, {})
+            for path in merge:
+                _put(doc, _parts(path), _field(data, path))
+        elif merge:
+            _merge(docs.setdefault(self.path, {}), data)
+        else:
+            docs[self.path] = copy.deepcopy(data)
+        self._store.writes += 1
+
+    def _update(self, data: Dict[str, Any]) -> None:
+        if self.path not in self._store.docs:
+            raise KeyError(f"No document to update: {self.path}")
+        doc = self._store.docs[self.path]
+        for key, value in data.items():
+            _put(doc, _parts(key), value)
+        self._store.writes += 1
+
+    def _delete(self) -> None:
+        self._store.docs.pop(self.path, None)
+        self._store.writes += 1
+
+    def _snapshot(self, fields: Optional[List[str]] = None) -> FakeSnapshot:
+        self._store.reads += 1
+        return FakeSnapshot(self, self._store.docs.get(self.path), fields)
+
+    async def get(self, field_paths: Optional[Iterable[str]] = None, transaction: Any = None) -> FakeSnapshot:
+        return self._snapshot(list(field_paths) if field_paths is not None else None)
+
+    async def set(self, data: Dict[str, Any], merge: Any = False) -> None:
+        self._set(data, merge)
+
+    async def update(self, data: Dict[str, Any]) -> None:
+        self._update(data)
+
+    async def delete(self) -> None:
+        self._delete()
+
+
+class FakeQuery:
+    def __init__(self, store: "FakeFirestore", path: str) -> None:
+        self._store = store
+        self._path = path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+        self._cursor: Any = None
+        self._fields: Optional[List[str]] = None
+
+    def _copy(self) -> "FakeQuery":
+        q = copy.copy(self)
+        q._filters = list(self._filters)
+        q._order = list(self._order)
+        return q
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter: Any = None) -> "FakeQuery":
+        q = self._copy()
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        q._filters.append((field_path, op_string, value))
+        return q
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        q = self._copy()
+        q._order.append((field_path, direction == "DESCENDING"))
+        return q
+
+    def limit(self, count: int) -> "FakeQuery":
+        q = self._copy()
+        q._limit = count
+        return q
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        q = self._copy()
+        q._cursor = document_fields_or_snapshot
+        return q
+
+    def select(self, field_paths: Iterable[str]) -> "FakeQuery":
+        q = self._copy()
+        q._fields = list(field_paths)
+        return q
+
+    def _results(self) -> List[FakeSnapshot]:
+        prefix = self._path + "/"
+        rows = []
+        for path, data in self._store.docs.items():
+            if not path.startswith(prefix) or "/" in path[len(prefix):]:
+                continue
+            if all(_matches(_field(data, f), op, v) for f, op, v in self._filters):
+                # like Firestore, documents missing an ordered field are left out
+                if all(_order_value(path, data, f) is not _MISSING for f, _ in self._order):
+                    rows.append((path, data))
+        for i in reversed(range(len(self._order) + 1)):
+            if i == len(self._order):
+                rows.sort(key=lambda r: r[0])
+            else:
+                f, desc = self._order[i]
+                rows.sort(key=lambda r: _order_value(r[0], r[1], f), reverse=desc)
+        if self._cursor is not None:
+            rows = rows[self._cursor_position(rows):]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        out = []
+        for path, _ in rows:
+            out.append(FakeDocument(self._store, path)._snapshot(self._fields))
+        return out
+
+    def _cursor_position(self, rows: List[Tuple[str, Dict[str, Any]]]) -> int:
+        cursor = self._cursor
+        if isinstance(cursor, FakeSnapshot):
+            for i, (path, _) in enumerate(rows):
+                if path == cursor.reference.path:
+                    return i + 1
+            data = cursor.to_dict() or {}
+        else:
+            data = cursor
+        values = tuple(getattr(v, "id", v) for v in (_field(data, f) for f, _ in self._order))
+        for i, (path, row) in enumerate(rows):
+            ahead = False
+            for (f, desc), v in zip(self._order, values):
+                rv = _order_value(path, row, f)
+                if rv != v:
+                    ahead = rv < v if desc else rv > v
+                    break
+            if ahead:
+                return i
+        return len(rows)
+
+    async def stream(self) -> AsyncIterator[FakeSnapshot]:
+        for snap in self._results():
+            yield snap
+
+    async def get(self) -> List[FakeSnapshot]:
+        return self._results()
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store: "FakeFirestore", path: str) -> None:
+        super().__init__(store, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._store, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    async def add(self, data: Dict[str, Any], document_id: Optional[str] = None) -> Tuple[None, FakeDocument]:
+        ref = self.document(document_id)
+        ref._set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    def __init__(self) -> None:
+        self._ops: List[Tuple[str, FakeDocument, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def set(self, reference: FakeDocument, document_data: Dict[str, Any], merge: Any = False) -> None:
+        self._ops.append(("set", reference, (document_data, merge)))
+
+    def update(self, reference: FakeDocument, field_updates: Dict[str, Any]) -> None:
+        self._ops.append(("update", reference, field_updates))
+
+    def delete(self, reference: FakeDocument) -> None:
+        self._ops.append(("delete", reference, None))
+
+    async def commit(self) -> List[None]:
+        for op, ref, data in self._ops:
+            if op == "delete":
+                ref._delete()
+            elif op == "update":
+                ref._update(data)
+            else:
+                ref._set(*data)
+        return [None] * len(self._ops)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Writes are buffered and applied on commit; with one event loop and no awaits between a
+    step's reads and its commit, a step runs as if isolated."""
+
+
+class FakeFirestore:
+    """In-memory stand-in for ``google.cloud.firestore.AsyncClient`` covering the calls this app
+    makes. Counts document reads and writes so callers can assert on round trips."""
+
+    def __init__(self) -> None:
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch()
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction()
+
+    def transactional(self, step: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Stand-in for ``async_transactional``: run ``step`` once and commit its writes."""
+
+        async def run(transaction: FakeTransaction, *args: Any, **kwargs: Any) -> Any:
+            result = await step(transaction, *args, **kwargs)
+            await transaction.commit()
+            return result
+
+        return run
+
+    async def get_all(self, references: Iterable[FakeDocument], field_paths: Optional[Iterable[str]] = None) -> AsyncIterator[FakeSnapshot]:
+        fields = list(field_paths) if field_paths is not None else None
+        for ref in references:
+            yield ref._snapshot(fields)
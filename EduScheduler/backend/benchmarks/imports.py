@@ -0,0 +1,57 @@
+"""Import cost of the API module, measured in fresh interpreters.
+
+The framework (FastAPI, Pydantic, ...) is imported first and timed on its own, so what is
+reported for ``app.main`` is the app's own share: comparable across hosts as a ratio."""
+
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+
+# what every FastAPI app pays; the app's own import time is compared against it
+FRAMEWORK = ("fastapi", "fastapi.security", "fastapi.responses", "pydantic", "email_validator", "orjson")
+# loaded on first use (registry, startup hooks), never by importing the app
+LAZY_MODULES = (
+    "google.generativeai",
+    "google.cloud.firestore_v1",
+    "firebase_admin.firestore",
+    "firebase_admin.auth",
+    "networkx",
+    "pulp",
+    "deap",
+)
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {framework}
+framework = (time.perf_counter() - t) * 1000
+t = time.perf_counter()
+import {module}
+own = (time.perf_counter() - t) * 1000
+print(json.dumps([framework, own, sorted(sys.modules)]))
+"""
+
+
+def measure(module: str = "app.main", runs: int = 5) -> Dict[str, Any]:
+    """Median time ``module`` adds on top of the framework imports, the framework's own median,
+    and the lazily-loaded modules that were imported anyway."""
+    own: List[float] = []
+    framework: List[float] = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        probe = _PROBE.format(framework=", ".join(FRAMEWORK), module=module)
+        out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+        base, ms, loaded = json.loads(out.stdout.strip().splitlines()[-1])
+        framework.append(base)
+        own.append(ms)
+    return {
+        "min": round(min(own), 3),
+        "median": round(statistics.median(own), 3),
+        "mean": round(statistics.fmean(own), 3),
+        "runs": runs,
+        "framework": round(statistics.median(framework), 3),
+        "eager": [m for m in LAZY_MODULES if m in loaded],
+    }
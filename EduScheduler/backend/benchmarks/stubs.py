@@ -0,0 +1,66 @@
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from app.deps import auth
+from app.deps.firebase import set_repository
+from app.models.schemas import ScheduleRequest, Timetable
+from app.services.occupancy import occupancy_cache, refresh_occupancy_many
+from app.services.repository import Repository
+from app.services.scheduler import constraint, gemini
+from app.services.timetables import COLLECTION, commit, with_indexes, writes_for
+from app.services.views import refresh_views_many
+from benchmarks.fake_firestore import FakeFirestore
+
+
+ADMIN = "bench-admin"
+
+
+def stub_gemini(latency: float = 0.2) -> None:
+    """Answer Gemini calls locally, after ``latency`` seconds, with constraint-engine options."""
+
+    def call(req: ScheduleRequest, api_key: str, timeout: Optional[float]) -> List[Dict[str, Any]]:
+        time.sleep(latency)
+        options = constraint.generate(req.model_copy(update={"options": 1}))
+        return [{**o.model_dump(), "metadata": {"generator": "gemini"}} for o in options]
+
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    gemini.CACHE_DIR = None
+    gemini._call = call
+    gemini._cache.clear()
+
+
+def stub_auth() -> None:
+    """Accept ``bench:<uid>`` bearer tokens without Firebase."""
+
+    def verify(id_token: str) -> Dict[str, Any]:
+        uid = id_token.split(":", 1)[1]
+        return {"uid": uid, "email": f"{uid}@gmail.com", "email_verified": True, "exp": time.time() + 3600}
+
+    auth.verify_firebase_token = verify
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+
+
+def token(uid: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer bench:{uid}"}
+
+
+async def fake_app(reqs: List[ScheduleRequest], timetables: List[Timetable]) -> Repository:
+    """Point the app at a FakeFirestore holding the campus users and stored timetables,
+    with views and the occupancy index built the way the write endpoints build them."""
+    repo = Repository(FakeFirestore())
+    await repo.set("users", ADMIN, {"uid": ADMIN, "email": f"{ADMIN}@gmail.com", "role": "admin"})
+    for fid in sorted({f["id"] for r in reqs for f in r.faculty}):
+        await repo.set("users", fid, {"uid": fid, "email": f"{fid.lower()}@gmail.com", "role": "faculty", "facultyId": fid})
+    occupancy_cache.clear()
+    datas = []
+    for tt in timetables:
+        tt.id = repo.new_id(COLLECTION)
+        datas.append(with_indexes(tt))
+    await commit(repo, [writes_for(d["id"], d) for d in datas])
+    changes = [(d["id"], None, d) for d in datas]
+    await refresh_views_many(repo, changes)
+    await refresh_occupancy_many(repo, changes)
+    set_repository(repo)
+    return repo
@@ -0,0 +1,13 @@
+import pytest
+
+from app.services.repository import Repository
+
+
+@pytest.fixture
+def sdk_repo() -> Repository:
+    """A Repository over the real Firestore client; batches validate writes as they are added,
+    without reaching the server."""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore
+
+    return Repository(firestore.AsyncClient(project="test", credentials=AnonymousCredentials()))
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.services import notifications
+from app.services.bus import PRESENCE_PREFIX, InMemoryBus, RedisBus
+from app.services.notifications import ConnectionManager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class Inbox:
+    def __init__(self) -> None:
+        self.batches = []
+
+    async def __call__(self, batch) -> None:
+        self.batches.append(batch)
+
+
+async def _wait(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _envelope(n: int) -> dict:
+    return {"t": [f"user:u{n}"], "m": f"message {n}", "k": None}
+
+
+def test_in_memory_bus_batches_publishes():
+    async def run():
+        bus, inbox = InMemoryBus(), Inbox()
+        await bus.start(inbox)
+        for n in range(3):
+            await bus.publish(_envelope(n))
+        await _wait(lambda: inbox.batches)
+        await bus.set_presence({"u1": 2}, ttl=30)
+        seen = await bus.presence()
+        await bus.clear_presence()
+        return bus, inbox, seen, await bus.presence()
+
+    bus, inbox, seen, cleared = asyncio.run(run())
+    assert inbox.batches == [[_envelope(n) for n in range(3)]]
+    assert (bus.published, bus.batches) == (3, 1)
+    assert seen == {bus.node: {"u1": 2}} and cleared == {}
+
+
+def test_redis_bus_fans_out_to_every_node_and_shares_presence():
+    async def run():
+        server = fakeredis.FakeServer()
+        nodes = [RedisBus("redis://fake", client=fakeredis.FakeAsyncRedis(server=server)) for _ in range(2)]
+        inboxes = [Inbox(), Inbox()]
+        for bus, inbox in zip(nodes, inboxes):
+            await bus.start(inbox)
+        try:
+            await nodes[0].publish(_envelope(1))
+            await nodes[0].publish(_envelope(2))
+            await _wait(lambda: all(inbox.batches for inbox in inboxes))
+            await nodes[0].set_presence({"u1": 1}, ttl=30)
+            await nodes[1].set_presence({"u1": 2, "u2": 1}, ttl=30)
+            presence = await nodes[0].presence()
+            ttl = await nodes[0].redis.ttl(PRESENCE_PREFIX + nodes[0].node)
+            await nodes[1].clear_presence()
+            after = await nodes[0].presence()
+        finally:
+            for bus in nodes:
+                await bus.close()
+        return nodes, inboxes, presence, ttl, after
+
+    nodes, inboxes, presence, ttl, after = asyncio.run(run())
+    # the sender receives its own batch too, once
+    assert [inbox.batches for inbox in inboxes] == [[[_envelope(1), _envelope(2)]]] * 2
+    assert presence == {nodes[0].node: {"u1": 1}, nodes[1].node: {"u1": 2, "u2": 1}}
+    assert 0 < ttl <= 30
+    assert after == {nodes[0].node: {"u1": 1}}
+
+
+def test_redis_listener_logs_a_failing_handler_and_keeps_going(caplog):
+    async def run():
+        server = fakeredis.FakeServer()
+        bus = RedisBus("redis://fake", client=fakeredis.FakeAsyncRedis(server=server))
+        inbox = Inbox()
+
+        async def handler(batch):
+            if batch[0]["m"] == "message 1":
+                raise RuntimeError("bad batch")
+            await inbox(batch)
+
+        await bus.start(handler)
+        try:
+            await bus.publish(_envelope(1))
+            await bus.flush()
+            await bus.publish(_envelope(2))
+            await _wait(lambda: inbox.batches)
+        finally:
+            await bus.close()
+        return inbox
+
+    with caplog.at_level(logging.ERROR, logger="app.services.bus"):
+        inbox = asyncio.run(run())
+    assert inbox.batches == [[_envelope(2)]]
+    assert "Notification batch handler failed" in caplog.text
+
+
+def test_failed_presence_refresh_is_logged(caplog, monkeypatch):
+    monkeypatch.setattr(notifications, "PRESENCE_INTERVAL", 0.05)
+    monkeypatch.setattr(notifications, "PRESENCE_DEBOUNCE", 0.01)
+
+    class Unreachable(InMemoryBus):
+        async def set_presence(self, counts, ttl):
+            raise ConnectionError("broker down")
+
+    async def run():
+        manager = ConnectionManager()
+        await manager.start(Unreachable())
+        await _wait(lambda: "Presence refresh failed" in caplog.text)
+        await manager.stop()
+
+    with caplog.at_level(logging.WARNING, logger="app.services.notifications"):
+        asyncio.run(run())
+    assert "broker down" in caplog.text
@@ -0,0 +1,20 @@
+from app.models.schemas import CampusRequest
+from app.services.scheduler.campus import generate_campus
+from benchmarks.campus import make_campus
+
+
+def test_departments_sharing_a_course_code_keep_their_own_slots():
+    deps = make_campus("small")
+    # both departments teach a GEN101 with no batch, each with its own faculty member
+    for d in deps:
+        d.courses[1] = {**d.courses[1], "code": "GEN101", "name": "General studies", "perWeek": 2}
+        d.courses[1].pop("batch", None)
+        d.time_limit = 0.5
+    result = generate_campus(CampusRequest(departments=deps, workers=1, time_limit=1.0))
+
+    assert result["components"] == [[deps[0].department], [deps[1].department]]
+    for d, tt in zip(deps, result["timetables"]):
+        faculty = {c["facultyId"] for c in d.courses}
+        assert {s.facultyId for s in tt.slots} <= faculty
+        general = [s for s in tt.slots if s.courseCode == "GEN101"]
+        assert [s.facultyId for s in general] == [d.courses[1]["facultyId"]] * 2
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import gemini
+from app.services.scheduler.engine import generate_timetables
+from benchmarks.campus import make_campus
+from benchmarks.stubs import stub_gemini
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    monkeypatch.setattr(gemini, "_call", gemini._call)
+    monkeypatch.setattr(gemini, "CACHE_DIR", gemini.CACHE_DIR)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    stub_gemini(latency=0.05)
+    yield make_campus("small")[0].model_copy(update={"solver": "auto", "use_gemini": True, "options": 1, "budget": 5})
+    gemini._cache.clear()
+
+
+def test_sync_callers_get_the_hedge_and_progress(hedged):
+    reports = []
+    options = generate_timetables(hedged, {"geminiEnabled": True}, progress=lambda f, o: reports.append(f))
+    assert options[0].metadata["hedge"]["winner"] in ("gemini", "constraint")
+    assert reports and reports[-1] == 1.0
+
+
+def test_sync_hedge_runs_inside_an_event_loop(hedged):
+    async def run():
+        return generate_timetables(hedged, {"geminiEnabled": True})
+
+    assert "hedge" in asyncio.run(run())[0].metadata
+
+
+def test_disabled_gemini_uses_the_constraint_engine(hedged):
+    options = generate_timetables(hedged, {"geminiEnabled": False})
+    assert "hedge" not in options[0].metadata
@@ -0,0 +1,26 @@
+import time
+
+from app.services.scheduler import constraint, evolution
+from benchmarks.campus import make_campus
+
+
+def test_many_islands_stay_within_the_time_limit(monkeypatch):
+    solve = constraint.solve
+
+    def slow_solve(problem, **kwargs):
+        # a campus too big to solve before the seeding deadline
+        time.sleep(max(0.0, kwargs["deadline"] - time.perf_counter()))
+        return solve(problem, **kwargs)
+
+    monkeypatch.setattr(constraint, "solve", slow_solve)
+    req = make_campus("small")[0].model_copy(update={
+        "solver": "evolution",
+        "options": 2,
+        "time_limit": 1.0,
+        "solver_options": {"islands": 16, "population": 8},
+    })
+    started = time.perf_counter()
+    options = evolution.generate(req)
+    assert time.perf_counter() - started < 3.0
+    assert len(options) == 2
+    assert all(o.metadata["generator"] == "evolution" for o in options)
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.deps import auth
+from app.deps.firebase import set_repository
+from app.models.schemas import Timetable
+from app.services.notifications import user_topics
+from app.services.repository import Repository
+from app.services.timetables import COLLECTION, commit, with_indexes, writes_for
+from app.services.views import refresh_views, view_cache
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.stubs import stub_auth, token
+
+httpx = pytest.importorskip("httpx")
+
+# a faculty member whose profile facultyId is not their login uid
+USER = {"uid": "login-123", "email": "teacher@gmail.com", "role": "faculty", "facultyId": "F1"}
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    monkeypatch.setattr(auth, "verify_firebase_token", auth.verify_firebase_token)
+    stub_auth()
+    repo = Repository(FakeFirestore())
+    tt = Timetable(name="CSE", department="CSE", semester="S1", year=1, slots=[{
+        "id": "s1", "day": "Mon", "startTime": "09:00", "endTime": "10:00", "courseCode": "CS101",
+        "courseName": "Programming", "facultyId": "F1", "roomId": "R1", "batch": "B1",
+    }])
+
+    async def setup():
+        await repo.set("users", USER["uid"], USER)
+        tt.id = "tt1"
+        data = with_indexes(tt)
+        await commit(repo, [writes_for("tt1", data)])
+        await refresh_views(repo, "tt1", None, data)
+
+    asyncio.run(setup())
+    view_cache.clear()
+    set_repository(repo)
+    yield repo
+    set_repository(None)
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+
+
+def test_view_leave_and_topics_use_the_same_faculty_id(repo):
+    from app.main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            view = await client.get("/faculty/timetable", headers=token(USER["uid"]))
+            # 2024-01-08 is a Monday
+            leave = await client.post("/leave", headers=token(USER["uid"]), json={"facultyId": "SELF", "dates": ["2024-01-08"]})
+        return view, leave
+
+    view, leave = asyncio.run(run())
+    assert view.status_code == 200 and [t["id"] for t in view.json()] == ["tt1"]
+    assert leave.status_code == 200
+    assert [c["before"]["facultyId"] for c in leave.json()["adjustments"]] == ["F1"]
+    assert repo.client.docs[f"leaves/{leave.json()['leaveId']}"]["facultyId"] == "F1"
+    assert "2024-01-08" in repo.client.docs[f"{COLLECTION}/tt1"]["adjustments"]
+    assert "faculty:F1" in user_topics(USER)
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.models.schemas import ScheduleRequest
+from app.services.scheduler import gemini
+
+
+ANSWER = {"options": [{
+    "name": "Option A",
+    "slots": [{
+        "day": "Mon", "startTime": "09:00", "endTime": "10:00", "courseCode": "CS101",
+        "courseName": "Programming", "facultyId": "F1", "roomId": "R1", "batch": "B1",
+    }],
+}]}
+
+
+class Response:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class Model:
+    """Stands in for ``GenerativeModel``: counts calls and can hold them until released."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.answer = ANSWER
+        self.release = threading.Event()
+        self.release.set()
+
+    def generate_content(self, contents, request_options=None):
+        self.calls += 1
+        self.release.wait(5)
+        return Response("```json\n" + json.dumps(self.answer) + "\n```")
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = Model()
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(gemini, "CACHE_DIR", None)
+    monkeypatch.setattr(gemini, "_model", lambda api_key: fake)
+    gemini._cache.clear()
+    yield fake
+    gemini._cache.clear()
+
+
+def _request(**overrides) -> ScheduleRequest:
+    data = {
+        "department": "CSE",
+        "semester": "S1",
+        "year": 1,
+        "courses": [{"code": "CS101", "name": "Programming"}, {"code": "CS102", "name": "Data Structures"}],
+        "rooms": [{"id": "R1", "capacity": 60}, {"id": "R2", "capacity": 40}],
+        "faculty": [{"id": "F1"}, {"id": "F2"}],
+        "batches": [{"id": "B1"}],
+    }
+    return ScheduleRequest(**{**data, **overrides})
+
+
+def test_second_request_is_served_from_cache(model):
+    first = gemini.generate_with_gemini(_request())
+    second = gemini.generate_with_gemini(_request())
+    assert model.calls == 1
+    assert [o.metadata["cacheHit"] for o in first + second] == [False, True]
+    assert second[0].slots == first[0].slots
+    # callers get copies, so mutating one answer leaves the cached entry alone
+    second[0].slots.clear()
+    assert gemini.generate_with_gemini(_request())[0].slots == first[0].slots
+
+
+def test_key_ignores_list_order_but_not_content(model):
+    req = _request()
+    shuffled = _request(courses=req.courses[::-1], rooms=req.rooms[::-1], faculty=req.faculty[::-1])
+    assert gemini.request_key(shuffled) == gemini.request_key(req)
+    assert gemini.request_key(_request(rooms=req.rooms[:1])) != gemini.request_key(req)
+    gemini.generate_with_gemini(req)
+    gemini.generate_with_gemini(shuffled)
+    assert model.calls == 1
+
+
+def test_concurrent_misses_share_one_call(model):
+    model.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gemini.generate_with_gemini(_request()))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while gemini._cache.coalesced < 3:
+        assert time.monotonic() < deadline, "requests were not coalesced"
+        time.sleep(0.01)
+    model.release.set()
+    for t in threads:
+        t.join(5)
+    assert model.calls == 1
+    assert len(results) == 4
+    assert sorted(r[0].metadata["cacheHit"] for r in results) == [False, True, True, True]
+
+
+def test_empty_answer_is_not_cached(model):
+    model.answer = {"options": []}
+    assert gemini.generate_with_gemini(_request()) == []
+    assert gemini.generate_with_gemini(_request()) == []
+    assert model.calls == 2
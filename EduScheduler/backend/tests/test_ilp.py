@@ -0,0 +1,17 @@
+import time
+
+from app.services.scheduler import ilp
+from benchmarks.campus import make_campus
+
+
+def test_cbc_improves_the_warm_start_within_the_time_limit():
+    req = make_campus("small")[0].model_copy(update={
+        "solver": "ilp", "time_limit": 6, "options": 1, "solver_options": {"gapRel": 0.5, "threads": 1},
+    })
+    started = time.perf_counter()
+    out = ilp.generate(req)
+    elapsed = time.perf_counter() - started
+    md = out[0].metadata
+    assert elapsed < req.time_limit + 2
+    assert md["objective"] is not None and md["objective"] <= md["warmStartObjective"]
+    assert out[0].slots
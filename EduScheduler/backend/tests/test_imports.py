@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from benchmarks.imports import measure
+
+
+# the app's own import may cost at most this share of the framework's (it was ~1.5 with the
+# SDKs imported eagerly, ~0.3 without)
+MAX_RATIO = float(os.getenv("IMPORT_MAX_RATIO", "1.0"))
+
+
+@pytest.fixture(scope="module")
+def startup():
+    return measure("app.main", runs=3)
+
+
+def test_backend_sdks_are_not_imported_with_the_app(startup):
+    assert startup["eager"] == []
+
+
+def test_app_import_time_relative_to_framework(startup):
+    assert startup["median"] <= MAX_RATIO * startup["framework"], startup
@@ -0,0 +1,37 @@
+import asyncio
+
+from app.services.occupancy import COLLECTION, _merge_bookings, refresh_occupancy
+from app.services.repository import Repository
+from benchmarks.fake_firestore import FakeFirestore
+
+
+def _timetable(tt_id: str, room: str) -> dict:
+    slot = {"id": f"{tt_id}-1", "day": "Mon", "startTime": "09:00", "endTime": "10:00", "courseCode": "CS101",
+            "courseName": "Programming", "facultyId": "F1", "roomId": room, "batch": "B1"}
+    return {"id": tt_id, "department": "CSE", "semester": "S1", "slots": [slot]}
+
+
+def test_booking_writes_are_valid_sdk_merges(sdk_repo):
+    batch = sdk_repo.batch()
+    # raises ValueError for a merge path missing from the data
+    _merge_bookings(batch, sdk_repo, "room", "R1", {"tt1": None, "tt2": {"department": "CSE", "days": {"Mon": "f"}}})
+    assert len(batch) == 1
+
+
+def test_moved_and_deleted_timetables_release_their_bookings():
+    async def run():
+        fs = FakeFirestore()
+        repo = Repository(fs)
+        first, moved = _timetable("tt1", "R1"), _timetable("tt1", "R2")
+        await refresh_occupancy(repo, "tt1", None, first)
+        await refresh_occupancy(repo, "tt2", None, _timetable("tt2", "R1"))
+        await refresh_occupancy(repo, "tt1", first, moved)
+        after_move = {k: dict(v["timetables"]) for k, v in fs.docs.items()}
+        await refresh_occupancy(repo, "tt1", moved, None)
+        return after_move, fs.docs
+
+    after_move, docs = asyncio.run(run())
+    assert sorted(after_move[f"{COLLECTION}/room:R1"]) == ["tt2"]
+    assert sorted(after_move[f"{COLLECTION}/room:R2"]) == ["tt1"]
+    assert docs[f"{COLLECTION}/room:R2"]["timetables"] == {}
+    assert sorted(docs[f"{COLLECTION}/faculty:F1"]["timetables"]) == ["tt2"]
@@ -0,0 +1,153 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from app.services import outbox as outbox_module
+from app.services.outbox import COLLECTION, Outbox
+from app.services.repository import Repository
+from benchmarks.fake_firestore import FakeFirestore
+
+
+class Inbox:
+    def __init__(self) -> None:
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    inbox = Inbox()
+    port = _free_port()
+    controller = Controller(
+        inbox,
+        hostname="127.0.0.1",
+        port=port,
+        authenticator=lambda server, session, envelope, mechanism, auth_data: AuthResult(success=True),
+        auth_require_tls=False,
+    )
+    controller.start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_USER", "mailer@example.com")
+    monkeypatch.setenv("SMTP_PASS", "secret")
+    monkeypatch.setenv("SMTP_STARTTLS", "0")
+    yield inbox
+    controller.stop()
+
+
+async def _wait(predicate, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+def _pending(doc_id: str, node: str, lease_until: float) -> dict:
+    return {
+        "to": "student@example.com",
+        "subject": f"left behind {doc_id}",
+        "body": "hello",
+        "status": "pending",
+        "attempts": 0,
+        "createdAt": time.time(),
+        "node": node,
+        "leaseUntil": lease_until,
+    }
+
+
+def test_enqueued_mail_is_delivered(smtp):
+    async def run():
+        fs = FakeFirestore()
+        repo = Repository(fs)
+        box = Outbox()
+        await box.start(repo)
+        try:
+            doc_id = await box.enqueue(repo, "student@example.com", "Timetable updated", "See the new week.")
+            await _wait(lambda: fs.docs[f"{COLLECTION}/{doc_id}"]["status"] == "sent")
+        finally:
+            await box.stop()
+        return fs.docs[f"{COLLECTION}/{doc_id}"]
+
+    doc = asyncio.run(run())
+    assert doc["attempts"] == 1
+    assert len(smtp.messages) == 1
+    assert smtp.messages[0].rcpt_tos == ["student@example.com"]
+    assert b"Timetable updated" in smtp.messages[0].original_content
+
+
+def test_mail_of_a_stopped_node_is_recovered_by_the_sweep(smtp, monkeypatch):
+    monkeypatch.setattr(outbox_module, "SWEEP_SECONDS", 0.2)
+
+    async def run():
+        fs = FakeFirestore()
+        repo = Repository(fs)
+        now = time.time()
+        # queued just before its node crashed: the lease is still running when we start
+        await repo.set(COLLECTION, "fresh", _pending("fresh", "crashed-node", now + 0.5))
+        await repo.set(COLLECTION, "stale", _pending("stale", "crashed-node", now - 1))
+        # held by a live node: never taken over
+        await repo.set(COLLECTION, "owned", _pending("owned", "live-node", now + 600))
+        box = Outbox()
+        await box.start(repo)
+        try:
+            await _wait(lambda: fs.docs[f"{COLLECTION}/stale"]["status"] == "sent")
+            assert fs.docs[f"{COLLECTION}/fresh"]["status"] == "pending"
+            await _wait(lambda: fs.docs[f"{COLLECTION}/fresh"]["status"] == "sent")
+            await asyncio.sleep(0.5)
+        finally:
+            await box.stop()
+        return fs.docs
+
+    docs = asyncio.run(run())
+    assert docs[f"{COLLECTION}/owned"]["status"] == "pending"
+    assert sorted(m.original_content.count(b"left behind") for m in smtp.messages) == [1, 1]
+
+
+def test_status_write_is_retried(smtp, monkeypatch):
+    async def run():
+        fs = FakeFirestore()
+        repo = Repository(fs)
+        box = Outbox()
+        failures = [1]
+        batch = repo.batch
+
+        def flaky_batch():
+            writer = batch()
+            commit = writer.commit
+
+            # batches here only record delivery results
+            async def fail_once():
+                if failures[0]:
+                    failures[0] -= 1
+                    raise OSError("firestore unavailable")
+                return await commit()
+
+            writer.commit = fail_once
+            return writer
+
+        monkeypatch.setattr(repo, "batch", flaky_batch)
+        await box.start(repo)
+        try:
+            doc_id = await box.enqueue(repo, "student@example.com", "Retry", "body")
+            await _wait(lambda: fs.docs[f"{COLLECTION}/{doc_id}"]["status"] == "sent")
+        finally:
+            await box.stop()
+        return failures[0]
+
+    assert asyncio.run(run()) == 0
+    assert len(smtp.messages) == 1
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services.repository import DOCUMENT_ID, Repository, delete_field, field_path
+from benchmarks.fake_firestore import FakeFirestore
+
+
+@pytest.fixture
+def store():
+    fs = FakeFirestore()
+    for i in range(7):
+        fs.docs[f"timetables/tt{i}"] = {"name": f"TT {i}", "department": "CSE" if i % 2 else "ECE", "semester": str(i % 3)}
+    fs.docs["timetables/tt0/days/Mon"] = {"slots": []}
+    return fs
+
+
+def test_get_returns_the_document_or_none(store):
+    repo = Repository(store)
+    assert asyncio.run(repo.get("timetables", "tt3")) == {"name": "TT 3", "department": "CSE", "semester": "0"}
+    assert asyncio.run(repo.get("timetables", "missing")) is None
+
+
+def test_query_filters_selects_and_skips_subcollections(store):
+    repo = Repository(store)
+    docs = asyncio.run(repo.query(
+        "timetables",
+        [("department", "==", "CSE"), ("semester", "in", ["0", "1"])],
+        select=["name"],
+        id_field="id",
+    ))
+    assert sorted(d["id"] for d in docs) == ["tt1", "tt3"]
+    assert all(set(d) == {"name", "id"} for d in docs)
+
+
+def test_query_pages_by_document_id(store):
+    repo = Repository(store)
+    pages, cursor = [], None
+    while True:
+        page = asyncio.run(repo.query(
+            "timetables",
+            order_by=DOCUMENT_ID,
+            limit=3,
+            start_after={DOCUMENT_ID: cursor} if cursor else None,
+            id_field="id",
+        ))
+        pages.append([d["id"] for d in page])
+        if len(page) < 3:
+            break
+        cursor = page[-1]["id"]
+    assert pages == [["tt0", "tt1", "tt2"], ["tt3", "tt4", "tt5"], ["tt6"]]
+
+
+def test_get_many_chunks_dedupes_and_skips_missing(store):
+    repo = Repository(store)
+    docs = asyncio.run(repo.get_many("timetables", ["tt1", "tt5", "nope", "tt1", "tt6"], chunk=2))
+    assert sorted(docs) == ["tt1", "tt5", "tt6"]
+    assert docs["tt5"]["name"] == "TT 5"
+    assert store.reads == 4
+
+
+def test_merge_by_field_path_keeps_other_entries(store):
+    repo = Repository(store)
+    asyncio.run(repo.set("views", "v", {"entries": {"1a": {"n": 1}, "b": {"n": 2}, "c": {"n": 4}}}))
+    fields = [field_path("entries", "1a"), field_path("entries", "b")]
+    asyncio.run(repo.set("views", "v", {"entries": {"1a": {"n": 3}, "b": delete_field()}}, merge=fields))
+    assert store.docs["views/v"] == {"entries": {"1a": {"n": 3}, "c": {"n": 4}}}
+
+
+def test_merge_paths_must_be_in_the_data(store):
+    repo = Repository(store)
+    # as in the SDK: a listed path with no value is an error, not a delete
+    with pytest.raises(ValueError, match="Invalid merge path"):
+        asyncio.run(repo.set("views", "v", {"entries": {"1a": {"n": 3}}}, merge=[field_path("entries", "b")]))
+    with pytest.raises(ValueError, match="Cannot delete unmerged"):
+        asyncio.run(repo.set("views", "v", {"key": "v", "entries": {"b": delete_field()}}, merge=["key"]))
+
+
+def test_update_if_writes_only_when_the_change_applies(store):
+    repo = Repository(store)
+
+    def claim(current):
+        return None if current.get("node") else {"node": "a"}
+
+    assert asyncio.run(repo.update_if("timetables", "tt2", claim))["node"] == "a"
+    assert asyncio.run(repo.update_if("timetables", "tt2", claim)) is None
+    assert store.docs["timetables/tt2"]["node"] == "a"
@@ -0,0 +1,38 @@
+import asyncio
+
+from app.services.repository import Repository
+from app.services.views import _merge_entries, get_view, refresh_views, view_cache
+from benchmarks.fake_firestore import FakeFirestore
+
+
+def _timetable(tt_id: str, faculty: str) -> dict:
+    slot = {"id": f"{tt_id}-1", "day": "Mon", "startTime": "09:00", "endTime": "10:00", "courseCode": "CS101",
+            "courseName": "Programming", "facultyId": faculty, "roomId": "R1", "batch": "B1"}
+    return {"id": tt_id, "name": tt_id, "department": "CSE", "semester": "S1", "year": 1, "slots": [slot],
+            "facultyIndex": [faculty], "batchIndex": ["B1"]}
+
+
+def test_view_writes_are_valid_sdk_merges(sdk_repo):
+    batch = sdk_repo.batch()
+    # raises ValueError for a merge path missing from the data
+    _merge_entries(batch, sdk_repo, "faculty", "F1", {"tt1": None, "2b": {"id": "2b"}}, complete=True)
+    assert len(batch) == 1
+
+
+def test_backfill_and_removal_update_the_view():
+    async def run():
+        fs = FakeFirestore()
+        repo = Repository(fs)
+        fs.docs["timetables/tt1"] = _timetable("tt1", "F1")
+        # a view in the list shape written before entries were kept per timetable
+        fs.docs["facultyViews/F1"] = {"key": "F1", "timetables": [], "version": "old"}
+        view_cache.clear()
+        first = await get_view(repo, "faculty", "F1")
+        await refresh_views(repo, "tt1", fs.docs["timetables/tt1"], None)
+        second = await get_view(repo, "faculty", "F1")
+        return fs.docs["facultyViews/F1"], first, second
+
+    doc, first, second = asyncio.run(run())
+    assert [t["id"] for t in first["timetables"]] == ["tt1"]
+    assert second["timetables"] == [] and second["version"] != first["version"]
+    assert doc == {"key": "F1", "entries": {}, "complete": True}